@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Offline Backtester for the v2 Trading Bot
+Replays historical bars through the bot's own signal scoring and risk rules
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bar_store import read_bars
+from standalone_trading_bot_v2 import (
+    CONFIG, CorrelationTracker, IndicatorEngine, PortfolioAllocator, RiskManager, SignalGenerator,
+    TechnicalAnalyzer, bar_times, trend_codes
+)
+
+# ============================================================================
+# HISTORY LOADING
+# ============================================================================
+
+def load_history(path: str) -> pd.DataFrame:
+    """Load OHLCV history from a CSV, Parquet, NumPy (.npy rates) or bar store (.bars) file
+
+    Columns follow copy_rates_from_pos: time, open, high, low, close,
+    tick_volume and optionally spread.  `time` may be epoch seconds or any
+    string pandas can parse.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        df = pd.DataFrame(np.load(path))
+    elif ext == '.bars':
+        df = pd.DataFrame(read_bars(path))
+    elif ext in ('.parquet', '.pq'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+
+    df.columns = [str(c).lower() for c in df.columns]
+    if 'tick_volume' not in df.columns:
+        df['tick_volume'] = df['volume'] if 'volume' in df.columns else 0.0
+
+    if np.issubdtype(df['time'].dtype, np.number):
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+    else:
+        df['time'] = pd.to_datetime(df['time'])
+
+    df = df.sort_values('time').drop_duplicates('time', keep='last')
+    return df.reset_index(drop=True)
+
+
+def find_history(data_dir: str, symbols: List[str]) -> Dict[str, str]:
+    """Map each symbol to the first history file in `data_dir` named after it"""
+    files = sorted(os.listdir(data_dir))
+    found = {}
+    for symbol in symbols:
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in ('.csv', '.parquet', '.pq', '.npy', '.bars') and stem.upper().startswith(symbol.upper()):
+                found[symbol] = os.path.join(data_dir, name)
+                break
+    return found
+
+# ============================================================================
+# BACKTESTER
+# ============================================================================
+
+class Backtester:
+    """Replay bars through SignalGenerator / RiskManager and simulate fills
+
+    Indicators are computed once per symbol over the whole history (the same
+    values the incremental engine produces bar by bar), every closed bar is
+    scored with the SignalGenerator rules, and qualifying signals enter at
+    the next bar's open.  Stops and targets are checked intrabar against
+    bid/ask highs and lows; when both are touched in one bar the stop wins.
+
+    Signals entering at the same bar form one cycle.  With the default
+    'portfolio' allocation the cycle goes through the bot's
+    PortfolioAllocator (ranking, per-symbol limit, total-risk budget and,
+    with `correlation_window`, the correlation gate on the returns up to the
+    signal bar); with 'sequential' each signal is checked in turn.
+    """
+
+    # generate_signal needs at least this many bars
+    WARMUP_BARS = 50
+
+    def __init__(self, config: Dict, initial_balance: float = 10000.0,
+                 spreads: Optional[Dict[str, float]] = None,
+                 points: Optional[Dict[str, float]] = None,
+                 contract_sizes: Optional[Dict[str, float]] = None):
+        self.config = config
+        self.initial_balance = initial_balance
+        self.spreads = spreads or {}
+        self.points = points or {}
+        self.contract_sizes = contract_sizes or {}
+        self.signal_generator = SignalGenerator(config['min_confidence'], config.get('score_weights'))
+
+    def sizing_spec(self, symbol: str) -> Dict[str, float]:
+        """Lot sizing spec from the contract size (quote currency = account currency)"""
+        return {
+            'tick_value': self.contract_sizes.get(symbol, 1.0),
+            'tick_size': 1.0,
+            'volume_min': 0.01,
+            'volume_step': 0.01,
+            'volume_max': np.inf
+        }
+
+    def new_risk_manager(self) -> RiskManager:
+        return RiskManager(
+            self.config['risk_per_trade'],
+            self.config['max_daily_loss'],
+            self.config['max_open_trades'],
+            sl_atr_multiplier=self.config.get('sl_atr_multiplier', 2.0),
+            tp_atr_multiplier=self.config.get('tp_atr_multiplier', 3.0)
+        )
+
+    def sizing_arrays(self, symbols: List[str]) -> Dict[str, np.ndarray]:
+        """sizing_spec for many symbols as column arrays (the SymbolRegistry interface the allocator uses)"""
+        specs = [self.sizing_spec(symbol) for symbol in symbols]
+        columns = ('tick_value', 'tick_size', 'volume_min', 'volume_step', 'volume_max')
+        return {c: np.array([spec[c] for spec in specs], dtype=np.float64) for c in columns}
+
+    def new_allocator(self, risk_manager: RiskManager, symbols: List[str]) -> Optional[PortfolioAllocator]:
+        """The live bot's allocator (None for 'sequential' allocation)"""
+        if self.config.get('allocation', 'portfolio') != 'portfolio':
+            return None
+        correlations = None
+        if self.config.get('correlation_window'):
+            correlations = CorrelationTracker(symbols, self.config['correlation_window'])
+        return PortfolioAllocator(
+            risk_manager,
+            self,
+            max_total_risk=self.config.get('max_total_risk', 0.06),
+            max_per_symbol=self.config.get('max_positions_per_symbol', 1),
+            correlations=correlations,
+            correlation_soft=self.config.get('correlation_soft', 0.5),
+            correlation_limit=self.config.get('correlation_limit', 0.8),
+            verbose=False
+        )
+
+    @staticmethod
+    def bar_returns(prepared: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """(times, log returns) on the union of all symbols' bar times
+
+        A symbol has no return (NaN) at a time it has no bar for, nor at its
+        next bar, as in CorrelationTracker.advance.
+        """
+        times = np.unique(np.concatenate([p['time'] for p in prepared]))
+        closes = np.full((len(times), len(prepared)), np.nan)
+        for j, p in enumerate(prepared):
+            closes[np.searchsorted(times, p['time']), j] = p['close']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(np.log(closes), axis=0, prepend=np.nan)
+        return times, np.where(np.isfinite(returns), returns, np.nan)
+
+    def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Indicator columns over the full history, matching the live engine"""
+        ind = TechnicalAnalyzer.calculate_indicators(df.copy())
+        # The live engine caps the long SMA at the lookback window
+        long_window = min(200, self.config['lookback_periods'])
+        ind['sma_200'] = ind['close'].rolling(window=long_window).mean()
+        return ind
+
+    def prepare(self, symbol: str, df: pd.DataFrame) -> Dict:
+        """Prices, per-bar spreads and every qualifying signal for one symbol"""
+        ind = self.calculate_indicators(df)
+        prepared = self.price_arrays(symbol, ind)
+        prepared['signals'] = self.score_bars(symbol, ind)
+        return prepared
+
+    def price_arrays(self, symbol: str, ind: pd.DataFrame) -> Dict:
+        """Bar times, OHLC and the spread in price units the simulation needs"""
+        n = len(ind)
+        if symbol in self.spreads:
+            spread = np.full(n, self.spreads[symbol])
+        elif 'spread' in ind.columns and symbol in self.points:
+            spread = ind['spread'].to_numpy(dtype=np.float64) * self.points[symbol]
+        else:
+            spread = np.zeros(n)
+
+        return {
+            'symbol': symbol,
+            'time': bar_times(ind),
+            'open': ind['open'].to_numpy(dtype=np.float64),
+            'high': ind['high'].to_numpy(dtype=np.float64),
+            'low': ind['low'].to_numpy(dtype=np.float64),
+            'close': ind['close'].to_numpy(dtype=np.float64),
+            'spread': spread
+        }
+
+    def score_bars(self, symbol: str, ind: pd.DataFrame) -> List[Tuple[int, Dict]]:
+        """Score every closed bar; keep (bar index, signal) for actionable ones
+
+        All bars are scored in one vectorized pass; the signal dict (with
+        reasons) is only built for bars that would trade.
+        """
+        columns = ('close',) + IndicatorEngine.COLUMNS
+        arrays = {c: ind[c].to_numpy(dtype=np.float64) for c in columns}
+        arrays['trend'] = trend_codes(arrays['close'], arrays['sma_50'], arrays['sma_200'])
+        generator = self.signal_generator
+        buy, sell, codes = generator.evaluate(arrays)
+        action, _ = generator.decide(buy, sell)
+        candidates = np.flatnonzero(action != 0)
+        candidates = candidates[candidates >= self.WARMUP_BARS - 1]
+
+        signals = []
+        for i in candidates.tolist():
+            last = {c: arrays[c][i] for c in columns}
+            reasons = generator.reasons(codes, i, last)
+            signals.append((i, generator.build_signal(symbol, last, buy[i].item(), sell[i].item(), reasons)))
+        return signals
+
+    @staticmethod
+    def find_exit(data: Dict, start: int, action: str, sl: float, tp: float) -> Tuple[int, float, str]:
+        """First bar from `start` whose range touches SL or TP: (index, fill price, reason)
+
+        Buys exit on the bid, sells on the ask (bid + spread).  A bar that
+        gaps through a level fills at its open.  The scan widens geometrically
+        so short trades only look at a few bars.
+        """
+        high, low, opn, spread = data['high'], data['low'], data['open'], data['spread']
+        n = len(high)
+        k, chunk = start, 64
+        while k < n:
+            end = min(n, k + chunk)
+            if action == 'buy':
+                sl_hit = low[k:end] <= sl
+                tp_hit = high[k:end] >= tp
+            else:
+                sl_hit = high[k:end] + spread[k:end] >= sl
+                tp_hit = low[k:end] + spread[k:end] <= tp
+            hit = sl_hit | tp_hit
+            if hit.any():
+                j = int(np.argmax(hit))
+                i = k + j
+                if action == 'buy':
+                    if sl_hit[j]:
+                        return i, min(sl, opn[i]), 'sl'
+                    return i, max(tp, opn[i]), 'tp'
+                ask_open = opn[i] + spread[i]
+                if sl_hit[j]:
+                    return i, max(sl, ask_open), 'sl'
+                return i, min(tp, ask_open), 'tp'
+            k, chunk = end, chunk * 2
+
+        last_price = data['close'][-1] + (spread[-1] if action == 'sell' else 0.0)
+        return n - 1, last_price, 'end'
+
+    def simulate(self, prepared: List[Dict]) -> Dict:
+        """Walk all symbols' entries in time order under the shared risk limits"""
+        risk_manager = self.new_risk_manager()
+        symbols = [p['symbol'] for p in prepared]
+        allocator = self.new_allocator(risk_manager, symbols)
+        by_symbol = {p['symbol']: p for p in prepared}
+        if allocator is not None and allocator.correlations is not None:
+            return_times, returns = self.bar_returns(prepared)
+
+        entries = []
+        for p in prepared:
+            n = len(p['time'])
+            for i, signal in p['signals']:
+                if i + 1 < n:
+                    entries.append((int(p['time'][i + 1]), p['symbol'], i + 1, signal))
+        entries.sort(key=lambda e: (e[0], e[1]))
+
+        balance = self.initial_balance
+        peak = balance
+        max_drawdown = 0.0
+        open_positions: List[Dict] = []
+        exits: List[Tuple[int, int, Dict]] = []
+        trades: List[Dict] = []
+        skipped = 0
+        opened = itertools.count()
+
+        def close_until(t: Optional[int]):
+            nonlocal balance, peak, max_drawdown
+            while exits and (t is None or exits[0][0] < t):
+                _, _, position = heapq.heappop(exits)
+                open_positions.remove(position)
+                balance += position['pnl']
+                peak = max(peak, balance)
+                max_drawdown = max(max_drawdown, (peak - balance) / peak if peak > 0 else 0.0)
+                trades.append(position)
+
+        def entry_price(symbol: str, i: int, action: str) -> float:
+            # The entry tick: ask (open + spread) for buys, bid for sells
+            data = by_symbol[symbol]
+            return data['open'][i] + (data['spread'][i] if action == 'buy' else 0.0)
+
+        def open_position(entry_time: int, symbol: str, i: int, signal: Dict,
+                          volume: float, sl: float, tp: float):
+            data = by_symbol[symbol]
+            action = signal['action']
+            price = entry_price(symbol, i, action)
+            exit_index, exit_price, reason = self.find_exit(data, i, action, sl, tp)
+
+            units = volume * self.contract_sizes.get(symbol, 1.0)
+            if action == 'buy':
+                pnl = (exit_price - price) * units
+            else:
+                pnl = (price - exit_price) * units
+
+            position = {
+                'symbol': symbol,
+                'type': action,
+                'confidence': signal['confidence'],
+                'volume': volume,
+                'units': units,
+                'entry_index': i,
+                'entry_time': entry_time,
+                'entry_price': price,
+                'price_open': price,
+                'sl': sl,
+                'tp': tp,
+                'exit_time': int(data['time'][exit_index]),
+                'exit_price': exit_price,
+                'exit_reason': reason,
+                'pnl': pnl
+            }
+            open_positions.append(position)
+            heapq.heappush(exits, (position['exit_time'], next(opened), position))
+
+        for entry_time, group in itertools.groupby(entries, key=lambda e: e[0]):
+            group = list(group)
+            close_until(entry_time)
+
+            # Mark open positions to the last closed bar for the equity check
+            unrealized = 0.0
+            for position in open_positions:
+                data = by_symbol[position['symbol']]
+                j = int(np.searchsorted(data['time'], entry_time, side='left')) - 1
+                if j >= position['entry_index']:
+                    price = data['close'][j]
+                    if position['type'] == 'buy':
+                        unrealized += (price - position['entry_price']) * position['units']
+                    else:
+                        unrealized += (position['entry_price'] - price - data['spread'][j]) * position['units']
+            equity = balance + unrealized
+            account_info = {
+                'balance': balance,
+                'equity': equity,
+                'margin': 0.0,
+                'free_margin': equity,
+                'profit': unrealized,
+                'leverage': 0
+            }
+            # The daily loss limit restarts on each bar's (server) date
+            day = entry_time // 86400
+
+            if allocator is None:
+                for _, symbol, i, signal in group:
+                    can_trade, _ = risk_manager.can_trade(account_info, open_positions, day=day)
+                    if not can_trade:
+                        skipped += 1
+                        continue
+                    # Like execute_trade: size and SL/TP from the entry tick
+                    price = entry_price(symbol, i, signal['action'])
+                    atr = signal['indicators']['atr']
+                    volume = risk_manager.calculate_position_size(balance, price, atr,
+                                                                  spec=self.sizing_spec(symbol))
+                    if volume <= 0:
+                        # Risk per trade below the symbol's minimum volume
+                        skipped += 1
+                        continue
+                    sl, tp = risk_manager.calculate_sl_tp(signal['action'], price, atr)
+                    open_position(entry_time, symbol, i, signal, volume, sl, tp)
+                continue
+
+            can_trade, _ = risk_manager.can_trade(account_info, open_positions, day=day)
+            if not can_trade:
+                skipped += len(group)
+                continue
+            if allocator.correlations is not None and (len(group) > 1 or open_positions):
+                # Returns up to the signal bar (the last one closed before the entry)
+                k = int(np.searchsorted(return_times, entry_time))
+                allocator.correlations.load(returns[max(0, k - allocator.correlations.window):k])
+            # Like place_orders: allocate the cycle at the entry ticks
+            candidates = [dict(signal, symbol=symbol) for _, symbol, _, signal in group]
+            bars = {symbol: i for _, symbol, i, _ in group}
+            prices = np.array([entry_price(symbol, i, signal['action']) for _, symbol, i, signal in group])
+            spreads = np.array([by_symbol[symbol]['spread'][i] for _, symbol, i, _ in group])
+            allocations = allocator.allocate(candidates, account_info, open_positions, prices, spreads)
+            skipped += len(group) - len(allocations)
+            for signal, order in allocations:
+                open_position(entry_time, signal['symbol'], bars[signal['symbol']], signal,
+                              order['volume'], order['sl'], order['tp'])
+
+        close_until(None)
+        return self.report(prepared, trades, balance, max_drawdown, skipped)
+
+    def report(self, prepared: List[Dict], trades: List[Dict], balance: float,
+               max_drawdown: float, skipped: int) -> Dict:
+        """Summarize PnL, drawdown and win rate overall and per symbol"""
+        per_symbol = {}
+        for p in prepared:
+            symbol_trades = [t for t in trades if t['symbol'] == p['symbol']]
+            wins = sum(1 for t in symbol_trades if t['pnl'] > 0)
+            per_symbol[p['symbol']] = {
+                'bars': len(p['time']),
+                'signals': len(p['signals']),
+                'trades': len(symbol_trades),
+                'wins': wins,
+                'win_rate': wins / len(symbol_trades) * 100 if symbol_trades else 0.0,
+                'net_profit': sum(t['pnl'] for t in symbol_trades)
+            }
+
+        wins = sum(1 for t in trades if t['pnl'] > 0)
+        return {
+            'initial_balance': self.initial_balance,
+            'final_balance': balance,
+            'net_profit': balance - self.initial_balance,
+            'return_pct': (balance / self.initial_balance - 1) * 100,
+            'max_drawdown_pct': max_drawdown * 100,
+            'trades': len(trades),
+            'win_rate': wins / len(trades) * 100 if trades else 0.0,
+            'skipped_signals': skipped,
+            'symbols': per_symbol,
+            'trade_log': trades
+        }
+
+    def run(self, history: Dict[str, pd.DataFrame]) -> Dict:
+        """Backtest every symbol in `history` and return the report"""
+        started = time.perf_counter()
+        prepared = [self.prepare(symbol, df) for symbol, df in history.items()]
+        report = self.simulate(prepared)
+        report['elapsed_seconds'] = time.perf_counter() - started
+        return report
+
+
+def print_report(report: Dict):
+    """Print a backtest report as a plain-text table"""
+    print("=" * 80)
+    print(f"{'Symbol':<10} {'Bars':>9} {'Signals':>8} {'Trades':>7} {'Win %':>7} {'Net PnL':>14}")
+    print("-" * 80)
+    for symbol, stats in report['symbols'].items():
+        print(f"{symbol:<10} {stats['bars']:>9} {stats['signals']:>8} {stats['trades']:>7} "
+              f"{stats['win_rate']:>7.1f} {stats['net_profit']:>14.2f}")
+    print("-" * 80)
+    print(f"Balance: {report['initial_balance']:.2f} -> {report['final_balance']:.2f} "
+          f"({report['return_pct']:+.2f}%)")
+    print(f"Trades: {report['trades']} | Win rate: {report['win_rate']:.1f}% | "
+          f"Max drawdown: {report['max_drawdown_pct']:.2f}% | Skipped signals: {report['skipped_signals']}")
+    if 'elapsed_seconds' in report:
+        print(f"Elapsed: {report['elapsed_seconds']:.2f}s")
+    print("=" * 80)
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def parse_symbol_values(items: List[str], cast=float) -> Dict:
+    """Parse SYMBOL=VALUE command line pairs"""
+    values = {}
+    for item in items or []:
+        symbol, _, value = item.partition('=')
+        values[symbol.upper()] = cast(value)
+    return values
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Backtest the v2 bot on historical bars")
+    parser.add_argument('sources', nargs='*', help="SYMBOL=PATH history files (csv, parquet, npy, bars)")
+    parser.add_argument('--data-dir', help="Directory with one history file per configured symbol")
+    parser.add_argument('--balance', type=float, default=10000.0, help="Starting balance")
+    parser.add_argument('--spread', action='append', help="SYMBOL=PRICE fixed spread")
+    parser.add_argument('--point', action='append', help="SYMBOL=POINT to use the file's spread column")
+    parser.add_argument('--contract-size', action='append', help="SYMBOL=UNITS per lot (default 1)")
+    parser.add_argument('--min-confidence', type=int, help="Override CONFIG['min_confidence']")
+    parser.add_argument('--json', help="Write the full report (including trades) to this file")
+    args = parser.parse_args()
+
+    paths = parse_symbol_values(args.sources, str)
+    if args.data_dir:
+        for symbol, path in find_history(args.data_dir, CONFIG['symbols']).items():
+            paths.setdefault(symbol, path)
+    if not paths:
+        parser.error("no history given (use SYMBOL=PATH or --data-dir)")
+
+    config = dict(CONFIG)
+    if args.min_confidence is not None:
+        config['min_confidence'] = args.min_confidence
+
+    backtester = Backtester(
+        config,
+        initial_balance=args.balance,
+        spreads=parse_symbol_values(args.spread),
+        points=parse_symbol_values(args.point),
+        contract_sizes=parse_symbol_values(args.contract_size)
+    )
+    history = {symbol: load_history(path) for symbol, path in paths.items()}
+    report = backtester.run(history)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=float)
+
+if __name__ == "__main__":
+    main()
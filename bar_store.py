@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Bar Store for the v2 Trading Bot
+Persistent, memory-mapped history: one append-only binary file of MT5 rates
+per (symbol, timeframe), so a restart only fetches the bars it missed and
+the backtester reads the same files
+"""
+
+import argparse
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MT5BARS1'
+VERSION = 1
+
+# Longest break between bars that can be a weekend market closure
+WEEKEND_SECONDS = 3 * 86400
+
+# Layout of copy_rates_from_pos records
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')
+])
+
+# 64-byte file header; `count` only covers bars that are fully written (a
+# bar being overwritten is taken out of it first), so a torn write is never
+# visible
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'), ('version', '<u4'), ('record_size', '<u4'), ('period', '<i8'),
+    ('count', '<i8'), ('first_time', '<i8'), ('last_time', '<i8'), ('reserved', 'V16')
+])
+
+
+def timeframe_name(period: int) -> str:
+    """MT5-style name (M5, H1, D1, ...) for a bar length in seconds"""
+    if period % 2592000 == 0:
+        return f"MN{period // 2592000}"
+    if period % 604800 == 0:
+        return f"W{period // 604800}"
+    if period % 86400 == 0:
+        return f"D{period // 86400}"
+    if period % 3600 == 0:
+        return f"H{period // 3600}"
+    return f"M{period // 60}"
+
+
+def weekend_break(before, after):
+    """True where the break between bars at `before` and `after` is a weekend closure
+
+    That is at most WEEKEND_SECONDS long and spanning a Saturday (server
+    time), like forex and metals from Friday close to Sunday/Monday open.
+    """
+    before = np.asarray(before, dtype=np.int64)
+    after = np.asarray(after, dtype=np.int64)
+    first_day = before // 86400
+    # Day 0 (1970-01-01) was a Thursday; Saturday is 2 days later
+    saturday = first_day + (2 - first_day) % 7
+    return (after - before <= WEEKEND_SECONDS) & (saturday <= after // 86400)
+
+
+def as_records(rates) -> np.ndarray:
+    """Rates (any structured array with the MT5 field names) in RATES_DTYPE"""
+    rates = np.asarray(rates)
+    if rates.dtype == RATES_DTYPE:
+        return rates
+    out = np.zeros(len(rates), dtype=RATES_DTYPE)
+    for name in RATES_DTYPE.names:
+        if name in rates.dtype.names:
+            out[name] = rates[name]
+    return out
+
+# ============================================================================
+# SERIES
+# ============================================================================
+
+class BarSeries:
+    """One (symbol, timeframe) file: a 64-byte header, then fixed-size records
+
+    Bars are only ever appended in time order, except that the newest bar
+    is overwritten while it is still forming.  History older than the
+    first stored bar (a longer lookback) rewrites the file once, through a
+    side file (see rewrite).  Reads are read-only memory-mapped views,
+    remapped only when the file has grown.
+    """
+
+    # Side file holding a rewrite until it has been copied over the series
+    REWRITE_SUFFIX = '.rewrite'
+
+    def __init__(self, path: str, period: int = 0, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self.header = np.zeros(1, dtype=HEADER_DTYPE)[0]
+        self.file = None
+        self.map: Optional[np.ndarray] = None
+        if os.path.exists(path):
+            self.open()
+        elif readonly:
+            raise FileNotFoundError(path)
+        else:
+            self.create(period)
+        if period and self.period != period:
+            raise ValueError(f"{path} holds {self.period}s bars, not {period}s")
+
+    @property
+    def period(self) -> int:
+        return int(self.header['period'])
+
+    @property
+    def count(self) -> int:
+        return int(self.header['count'])
+
+    @property
+    def first_time(self) -> Optional[int]:
+        return int(self.header['first_time']) if self.count else None
+
+    @property
+    def last_time(self) -> Optional[int]:
+        return int(self.header['last_time']) if self.count else None
+
+    def create(self, period: int):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.header['magic'] = MAGIC
+        self.header['version'] = VERSION
+        self.header['record_size'] = RATES_DTYPE.itemsize
+        self.header['period'] = period
+        self.file = open(self.path, 'w+b')
+        self.write_header()
+
+    def open(self):
+        with open(self.path, 'rb') as f:
+            raw = f.read(HEADER_DTYPE.itemsize)
+        if len(raw) < HEADER_DTYPE.itemsize:
+            raise ValueError(f"{self.path}: truncated header")
+        self.header = np.frombuffer(raw, dtype=HEADER_DTYPE)[0].copy()
+        if self.header['magic'] != MAGIC or self.header['record_size'] != RATES_DTYPE.itemsize:
+            raise ValueError(f"{self.path}: not a bar store file")
+        if not self.readonly:
+            self.file = open(self.path, 'r+b')
+            self.recover()
+        # Bars past what the file actually holds were never fully written
+        size = os.path.getsize(self.path) - HEADER_DTYPE.itemsize
+        stored = size // RATES_DTYPE.itemsize
+        if stored < self.count:
+            self.header['count'] = stored
+            if stored:
+                self.header['last_time'] = self.read_time(stored - 1)
+        if not self.readonly:
+            if stored != self.count or size % RATES_DTYPE.itemsize:
+                try:
+                    self.file.truncate(HEADER_DTYPE.itemsize + self.count * RATES_DTYPE.itemsize)
+                except OSError:
+                    pass  # mapped elsewhere (Windows); bars past the count are ignored
+                self.write_header()
+
+    def read_time(self, index: int) -> int:
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER_DTYPE.itemsize + index * RATES_DTYPE.itemsize)
+            return int(np.frombuffer(f.read(8), dtype='<i8')[0])
+
+    def write_header(self):
+        self.file.seek(0)
+        self.file.write(self.header.tobytes())
+        self.file.flush()
+
+    def write(self, index: int, rates: np.ndarray):
+        self.file.seek(HEADER_DTYPE.itemsize + index * RATES_DTYPE.itemsize)
+        self.file.write(rates.tobytes())
+
+    def view(self, bars: Optional[int] = None) -> np.ndarray:
+        """Read-only, zero-copy view of the newest `bars` bars (all by default), oldest first"""
+        if self.readonly:
+            self.refresh()
+        count = self.count
+        if count == 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        if self.map is None or len(self.map) != count:
+            self.map = np.memmap(self.path, dtype=RATES_DTYPE, mode='r',
+                                 offset=HEADER_DTYPE.itemsize, shape=(count,))
+        return self.map[count - min(bars or count, count):]
+
+    def refresh(self):
+        """Re-read the header (readers following a file another process appends to)"""
+        with open(self.path, 'rb') as f:
+            header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)[0]
+        self.header = header.copy()
+
+    def merge(self, rates) -> int:
+        """Store fetched bars (oldest first); returns the number of new bars
+
+        Bars newer than the last stored one are appended and the last one
+        is overwritten; bars older than the first stored one rewrite the
+        file with them prepended.  Bars in between are already stored.
+        Fetched bars starting past the bar after the last stored one leave
+        a hole, which is logged (the caller should fetch back to it first).
+        """
+        if self.readonly:
+            raise PermissionError(f"{self.path} is open read-only")
+        rates = as_records(rates)
+        if len(rates) == 0:
+            return 0
+        times = rates['time']
+        if self.count and times[0] < self.first_time:
+            older = rates[times < self.first_time]
+            self.rewrite(np.concatenate((older, np.array(self.view()))))
+            added = len(older)
+        else:
+            added = 0
+        if self.hole_before(times[0]):
+            logger.warning("%s: no bars between %s and %s, the store has a hole there",
+                           self.path, np.datetime64(self.last_time, 's'), np.datetime64(int(times[0]), 's'))
+        return added + self.append(rates)
+
+    def hole_before(self, time: int) -> bool:
+        """Whether appending a bar at `time` would skip bars after the last stored one"""
+        last = self.last_time
+        return last is not None and time > last + self.period and not weekend_break(last, time)
+
+    def append(self, rates: np.ndarray) -> int:
+        count = self.count
+        if count:
+            rates = rates[rates['time'] >= self.last_time]
+        if len(rates) == 0:
+            return 0
+        start = count
+        if count and rates['time'][0] == self.last_time:
+            # The stored last bar was still forming: take it out of the
+            # count before overwriting it, so a crash part way through the
+            # write loses that bar rather than leaving it torn
+            start -= 1
+            self.header['count'] = start
+            if start:
+                self.header['last_time'] = self.read_time(start - 1)
+            self.write_header()
+        self.write(start, rates)
+        self.file.flush()
+        self.header['count'] = start + len(rates)
+        if start == 0:
+            self.header['first_time'] = rates['time'][0]
+        self.header['last_time'] = rates['time'][-1]
+        self.write_header()
+        return self.count - count
+
+    def rewrite(self, rates: np.ndarray):
+        """Replace the stored bars with `rates` in place
+
+        The file is never renamed or shrunk, which Windows refuses while
+        other memory maps of it are open; views taken before the rewrite
+        see the new layout.  The new header and bars are first written and
+        synced to a side file, then copied over the series (header last)
+        and the side file removed.  If the process dies before the side
+        file is complete the series is untouched; after that, opening the
+        series finishes the copy (see recover).
+        """
+        rates = as_records(rates)
+        header = self.header.copy()
+        header['count'] = len(rates)
+        if len(rates):
+            header['first_time'] = rates['time'][0]
+            header['last_time'] = rates['time'][-1]
+        with open(self.path + self.REWRITE_SUFFIX, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(rates.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.recover()
+
+    def recover(self) -> bool:
+        """Copy a complete rewrite side file over the series; True if there was one
+
+        An incomplete side file (the process died while writing it) is
+        discarded, leaving the series as it was before the rewrite.
+        """
+        path = self.path + self.REWRITE_SUFFIX
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            raw = f.read()
+        complete = False
+        if len(raw) >= HEADER_DTYPE.itemsize:
+            header = np.frombuffer(raw[:HEADER_DTYPE.itemsize], dtype=HEADER_DTYPE)[0].copy()
+            complete = (header['magic'] == MAGIC
+                        and len(raw) == HEADER_DTYPE.itemsize + int(header['count']) * RATES_DTYPE.itemsize)
+        if complete:
+            self.map = None
+            self.file.seek(HEADER_DTYPE.itemsize)
+            self.file.write(raw[HEADER_DTYPE.itemsize:])
+            self.file.flush()
+            self.header = header
+            self.write_header()
+            os.fsync(self.file.fileno())
+        else:
+            logger.warning("%s: discarding an incomplete rewrite", self.path)
+        os.remove(path)
+        return complete
+
+    def gaps(self, min_seconds: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(last bar before, first bar after) wherever bars are further apart than `min_seconds`
+
+        The default is any missing bar outside weekend closures (see
+        weekend_break); intraday session breaks and holidays still count.
+        """
+        times = self.view()['time']
+        if len(times) < 2:
+            return []
+        step = np.diff(times)
+        if min_seconds:
+            holes = np.flatnonzero(step > min_seconds)
+        else:
+            holes = np.flatnonzero((step > self.period) & ~weekend_break(times[:-1], times[1:]))
+        return [(int(times[i]), int(times[i + 1])) for i in holes]
+
+    def check(self) -> Dict:
+        """Bars, time span, gaps and out-of-order bars"""
+        times = self.view()['time']
+        return {
+            'bars': len(times),
+            'first_time': self.first_time,
+            'last_time': self.last_time,
+            'gaps': len(self.gaps()),
+            'unordered': int(np.count_nonzero(np.diff(times) <= 0)) if len(times) > 1 else 0,
+        }
+
+    def close(self):
+        self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class BarStore:
+    """Directory of BarSeries, one file per (symbol, timeframe) named like EURUSD_M5.bars"""
+
+    EXTENSION = '.bars'
+
+    def __init__(self, directory: str = 'history', readonly: bool = False):
+        self.directory = directory
+        self.readonly = readonly
+        self.series_by_key: Dict[Tuple[str, int], BarSeries] = {}
+        self.lock = threading.Lock()
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, symbol: str, period: int) -> str:
+        return os.path.join(self.directory, f"{symbol}_{timeframe_name(period)}{self.EXTENSION}")
+
+    def series(self, symbol: str, period: int) -> BarSeries:
+        key = (symbol, period)
+        with self.lock:
+            series = self.series_by_key.get(key)
+            if series is None:
+                series = BarSeries(self.path(symbol, period), period, readonly=self.readonly)
+                self.series_by_key[key] = series
+            return series
+
+    def close(self):
+        with self.lock:
+            for series in self.series_by_key.values():
+                series.close()
+            self.series_by_key.clear()
+
+
+def read_bars(path: str) -> np.ndarray:
+    """Every bar in a .bars file as a read-only memory-mapped array"""
+    return BarSeries(path, readonly=True).view()
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect bar store files")
+    parser.add_argument('paths', nargs='+', help=".bars files or store directories")
+    parser.add_argument('--gap', type=float, default=None, help="Only report gaps longer than this many hours (default: any missing bar outside weekends)")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith(BarStore.EXTENSION))
+        else:
+            paths.append(path)
+
+    for path in paths:
+        series = BarSeries(path, readonly=True)
+        info = series.check()
+        gaps = series.gaps(int(args.gap * 3600) if args.gap else None)
+        span = ''
+        if info['bars']:
+            span = (f"{np.datetime64(info['first_time'], 's')} -> {np.datetime64(info['last_time'], 's')}")
+        print(f"{os.path.basename(path):<24} {info['bars']:>9} bars  {span}  gaps: {len(gaps)}"
+              f"{'  UNORDERED: ' + str(info['unordered']) if info['unordered'] else ''}")
+        for before, after in gaps[:10]:
+            print(f"    {np.datetime64(before, 's')} -> {np.datetime64(after, 's')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Cycle Benchmark for the v1 and v2 Trading Bots
+Times run_cycle per stage against the MT5 simulator and keeps JSON baselines
+"""
+
+import argparse
+import functools
+import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BOTS = {'v1': 'standalone_trading_bot', 'v2': 'standalone_trading_bot_v2'}
+
+# stage: [(class name, method name)] per bot; nested stages are timed
+# exclusively, e.g. 'signal' excludes the indicator time spent inside it
+STAGES = {
+    'v1': {
+        'account': [('MT5Connection', 'get_account_info'), ('MT5Connection', 'get_open_positions')],
+        'market_data': [('MT5Connection', 'get_market_data')],
+        'indicators': [('TechnicalAnalyzer', 'calculate_indicators')],
+        'signal': [('SignalGenerator', 'generate_signal')],
+        'execute_trade': [('TradingBot', 'execute_trade')],
+    },
+    'v2': {
+        'account': [('MT5Connection', 'snapshot')],
+        'market_data': [('MT5Connection', 'get_market_data'), ('MT5Connection', 'get_rates')],
+        'indicators': [('TechnicalAnalyzer', 'calculate_indicators'),
+                       ('TechnicalAnalyzer', 'calculate_tail_indicators'),
+                       ('PanelAnalyzer', 'calculate_indicators'), ('IndicatorEngine', 'update')],
+        'signal': [('SignalGenerator', 'generate_signal'), ('SignalGenerator', 'score_signal')],
+        'execute_trade': [('TradingBot', 'execute_trade')],
+        'save_signals': [('TradingBot', 'save_signals')],
+    },
+}
+
+DEFAULT_SYMBOLS = (9, 50, 200, 1000)
+DEFAULT_LOOKBACKS = (100, 500, 5000)
+PERCENTILES = (50, 95, 99)
+
+# ============================================================================
+# STAGE TIMING
+# ============================================================================
+
+class StageTimer:
+    """Exclusive wall time per stage, accumulated per cycle
+
+    Each thread keeps its own stack so time spent in a nested stage is only
+    charged to the innermost one; with worker threads the stage totals can
+    exceed the cycle time.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.current: Dict[str, float] = {}
+        self.cycles: List[Dict[str, float]] = []
+
+    def wrap(self, stage: str, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                child = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.current[stage] = self.current.get(stage, 0.0) + elapsed - child
+        return timed
+
+    def instrument(self, module, stages: Dict[str, List]):
+        """Replace the listed methods on the module's classes with timed wrappers"""
+        for stage, targets in stages.items():
+            for class_name, method in targets:
+                cls = getattr(module, class_name)
+                raw = inspect.getattr_static(cls, method)
+                if isinstance(raw, staticmethod):
+                    setattr(cls, method, staticmethod(self.wrap(stage, raw.__func__)))
+                else:
+                    setattr(cls, method, self.wrap(stage, raw))
+
+    def run(self, cycle, record: bool = True):
+        self.current = {}
+        started = time.perf_counter()
+        cycle()
+        total = time.perf_counter() - started
+        if record:
+            stages = dict(self.current)
+            stages['other'] = max(total - sum(stages.values()), 0.0)
+            stages['cycle'] = total
+            self.cycles.append(stages)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99/mean of each stage's per-cycle time, in milliseconds"""
+        names = sorted({name for cycle in self.cycles for name in cycle})
+        result = {}
+        for name in names:
+            values = np.array([cycle.get(name, 0.0) for cycle in self.cycles]) * 1000
+            result[name] = {f'p{p}': round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+            result[name]['mean'] = round(float(values.mean()), 3)
+        return result
+
+# ============================================================================
+# CASES
+# ============================================================================
+
+def symbol_names(count: int, base: List[str]) -> List[str]:
+    """The configured symbols first, then synthetic SYMnnnn names"""
+    names = list(base[:count])
+    names += [f'SYM{i:04d}' for i in range(count - len(names))]
+    return names
+
+
+def run_case(case: Dict) -> Dict:
+    """Run one (bot, symbols, lookback) case in a fresh working directory"""
+    os.chdir(case['workdir'])
+    sys.path.insert(0, case['root'])
+    module = __import__(BOTS[case['bot']])
+    import mt5_simulator
+    logging.getLogger().setLevel(case['log_level'])
+
+    symbols = symbol_names(case['symbols'], module.CONFIG['symbols'])
+    config = dict(module.CONFIG)
+    config.update(
+        symbols=symbols,
+        lookback_periods=case['lookback'],
+        terminal='simulator',
+        # Manual clock; a large account so the risk limits never end a cycle early
+        simulator={'speed': None, 'seed': case['seed'], 'balance': 1e9, 'leverage': 1000,
+                   'history_bars': case['lookback'] + 300, 'latency': case['latency']},
+        max_open_trades=len(symbols) * (case['cycles'] + case['warmup'] + 1),
+        max_daily_loss=1.0,
+    )
+    config.update(case['overrides'])
+
+    timer = StageTimer()
+    timer.instrument(module, STAGES[case['bot']])
+    bot = module.TradingBot(config)
+    if case['bot'] == 'v2':
+        if not bot.startup():
+            raise RuntimeError("v2 bot failed to start against the simulator")
+    elif not bot.mt5.connect():
+        raise RuntimeError("v1 bot failed to connect to the simulator")
+
+    for i in range(case['warmup'] + case['cycles']):
+        timer.run(bot.run_cycle, record=i >= case['warmup'])
+        mt5_simulator.advance()
+
+    # One extra cycle under tracemalloc for the allocation peak (not timed)
+    tracemalloc.start()
+    bot.run_cycle()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    bot.stop()
+
+    result = {key: case[key] for key in ('bot', 'symbols', 'lookback', 'cycles', 'overrides')}
+    result['stages'] = timer.summary()
+    result['signals'] = bot.signals_generated
+    result['trades'] = bot.trades_executed
+    result['cycle_alloc_peak_mb'] = round(traced_peak / 2 ** 20, 2)
+    if resource is not None:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+    return result
+
+
+def case_key(result: Dict) -> str:
+    overrides = ','.join(f'{k}={v}' for k, v in sorted(result['overrides'].items()))
+    return f"{result['bot']}/{result['symbols']}/{result['lookback']}/{overrides}"
+
+
+def run_all(cases: List[Dict]) -> List[Dict]:
+    """Run each case in its own spawned process (fresh imports, memory and simulator)"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in cases:
+        with context.Pool(1) as pool:
+            started = time.perf_counter()
+            result = pool.apply(run_case, (case,))
+        print_row(result, time.perf_counter() - started)
+        results.append(result)
+    return results
+
+# ============================================================================
+# BASELINES
+# ============================================================================
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float, stat: str = 'p50') -> List[str]:
+    """Cases whose cycle `stat` grew by more than `tolerance` over the baseline"""
+    previous = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        for stage, stats in result['stages'].items():
+            before = old['stages'].get(stage, {}).get(stat)
+            # Ignore sub-millisecond stages, they are mostly noise
+            if before is None or max(before, stats[stat]) < 1.0:
+                continue
+            if stats[stat] > before * (1 + tolerance):
+                regressions.append(f"{case_key(result)} {stage} {stat}: "
+                                   f"{before:.2f}ms -> {stats[stat]:.2f}ms")
+    return regressions
+
+
+def print_row(result: Dict, seconds: float):
+    stages = result['stages']
+    cycle = stages['cycle']
+    parts = ' '.join(f"{name}={stats['p50']:.1f}" for name, stats in stages.items()
+                     if name != 'cycle' and stats['p50'] >= 0.05)
+    overrides = ' '.join(f'{k}={v}' for k, v in result['overrides'].items())
+    print(f"{result['bot']:>3} {result['symbols']:>5} {result['lookback']:>5} "
+          f"{cycle['p50']:>9.1f} {cycle['p95']:>9.1f} {cycle['p99']:>9.1f} "
+          f"{result.get('peak_rss_mb', 0):>7.0f} {result['cycle_alloc_peak_mb']:>7.1f} "
+          f"{seconds:>6.1f}s  {overrides}  [{parts}]", flush=True)
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def parse_value(value: str):
+    """JSON literal if it parses (numbers, true, null), otherwise the string"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_overrides(items: Optional[List[str]]) -> List[Dict]:
+    """KEY=v1,v2 config overrides -> one dict per combination"""
+    space = {}
+    for item in items or []:
+        key, _, values = item.partition('=')
+        space[key] = [parse_value(v) for v in values.split(',')]
+    keys = list(space)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*space.values())]
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark bot cycles against the MT5 simulator")
+    parser.add_argument('--bot', action='append', choices=sorted(BOTS), help="Bots to run (default: both)")
+    parser.add_argument('--symbols', type=int, nargs='+', default=list(DEFAULT_SYMBOLS))
+    parser.add_argument('--lookback', type=int, nargs='+', default=list(DEFAULT_LOOKBACKS))
+    parser.add_argument('--cycles', type=int, default=20, help="Timed cycles per case")
+    parser.add_argument('--warmup', type=int, default=2, help="Untimed cycles first (fills v2 caches)")
+    parser.add_argument('--set', action='append', dest='overrides',
+                        help="CONFIG override, KEY=v1,v2 runs every value (e.g. indicator_mode=batch,panel)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated terminal latency per call (ms)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', action='store_true', help="Keep the bots' INFO logging on")
+    parser.add_argument('--out', help="Write results as JSON (a baseline for --compare)")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed growth over the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bot-benchmark-')
+    cases = []
+    for bot, symbols, lookback, overrides in itertools.product(
+            args.bot or sorted(BOTS), args.symbols, args.lookback, parse_overrides(args.overrides) or [{}]):
+        cases.append({
+            'bot': bot, 'symbols': symbols, 'lookback': lookback, 'overrides': overrides,
+            'cycles': args.cycles, 'warmup': args.warmup, 'seed': args.seed,
+            'latency': args.latency / 1000, 'log_level': logging.INFO if args.log else logging.WARNING,
+            'workdir': workdir, 'root': os.path.dirname(os.path.abspath(__file__)),
+        })
+
+    print(f"Per-cycle ms (stage p50s in brackets); work files in {workdir}")
+    print(f"{'bot':>3} {'syms':>5} {'bars':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'rss MB':>7} {'alloc':>7}")
+    results = run_all(cases)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'processor': platform.processor(),
+                'cpus': os.cpu_count(),
+                'results': results
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Bot Logging
+Queue-based logging: the trading threads only enqueue records, a background
+listener formats and writes them (rotating file, optional JSON lines)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# %-args of these types can't change between the call and the listener formatting them
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message plus any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage().strip(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records and never block the caller
+
+    The stdlib handler formats the message before enqueueing; here that is
+    left to the listener thread when every %-arg is a plain immutable value,
+    so most calls only pay for building the record.  Messages with other
+    args (position and signal dicts the trading threads keep mutating) are
+    formatted eagerly so the log shows them as they were at the call.
+    Records that don't fit in a full queue are dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        # A lone dict argument is kept as the args mapping itself
+        if (not isinstance(record.msg, str) or isinstance(args, dict)
+                or (args and not all(isinstance(a, _IMMUTABLE_ARGS) for a in args))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+def configure_logging(config: Dict) -> Optional[logging.handlers.QueueListener]:
+    """Route the root logger through a queue to a file and console listener
+
+    Uses the `log_*` keys of the bot CONFIG.  Like logging.basicConfig it
+    does nothing if the application already configured the root logger.
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    if root.handlers and _handler not in root.handlers:
+        return None
+    stop_logging()
+
+    path = config.get('log_file', 'trading_bot.log')
+    backups = config.get('log_backups', 5)
+    if config.get('log_rotate_when'):
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=config['log_rotate_when'], backupCount=backups, encoding='utf-8', utc=True
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=config.get('log_max_bytes', 50 * 2 ** 20), backupCount=backups, encoding='utf-8'
+        )
+    file_handler.setFormatter(JsonFormatter() if config.get('log_json') else logging.Formatter(TEXT_FORMAT))
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _handler = QueueHandler(queue.Queue(config.get('log_queue_size', 10000)))
+    root.addHandler(_handler)
+    root.setLevel(config.get('log_level', 'INFO'))
+    _listener = logging.handlers.QueueListener(_handler.queue, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush the queue and stop the listener (registered with atexit)"""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            if _handler.dropped:
+                handler.handle(logging.makeLogRecord({
+                    'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"{_handler.dropped} log records dropped (queue full)"
+                }))
+            handler.close()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+def _after_fork():
+    """A forked child has no listener thread: write through the handlers directly"""
+    global _listener, _handler
+    if _listener is not None:
+        root = logging.getLogger()
+        root.removeHandler(_handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+        _listener, _handler = None, None
+
+
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
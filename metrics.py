@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Bot Metrics
+Counters and latency histograms for the hot paths, rendered in the
+Prometheus text format over HTTP or to a file
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; spans a fast terminal call up to a slow cycle
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NullTimer:
+    """Timer handed out while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Family:
+    """One metric name with a value per combination of label values"""
+
+    kind = ''
+
+    def __init__(self, registry: 'Metrics', name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.children: Dict[Tuple, object] = {}
+
+    def label_text(self, values: Tuple, le: Optional[str] = None) -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Family):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            self.children[labels] = self.children.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}_total{self.label_text(k)} {_number(v)}' for k, v in self.children.items()]
+
+
+class Histogram(Family):
+    kind = 'histogram'
+
+    def __init__(self, registry: 'Metrics', name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            child = self.children.get(labels)
+            if child is None:
+                # One count per bucket plus +Inf, then sum
+                child = self.children[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[bisect_left(self.buckets, value)] += 1
+            child[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the wall time of its block"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f'{self.name}_bucket{self.label_text(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self.label_text(key)} {_number(child[-1])}')
+            lines.append(f'{self.name}_count{self.label_text(key)} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Registry of metric families
+
+    Disabled by default: counters and histograms then return straight away
+    and timers are a shared no-op, so instrumented code pays a function call.
+    """
+
+    def __init__(self, prefix: str = 'bot_'):
+        self.prefix = prefix
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.families: Dict[str, Family] = {}
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._family(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._family(Histogram, name, help, labels, buckets=buckets)
+
+    def _family(self, cls, name: str, help: str, labels: Tuple[str, ...], **kwargs):
+        name = self.prefix + name
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = cls(self, name, help, labels, **kwargs)
+        return family
+
+    def reset(self):
+        with self.lock:
+            for family in self.families.values():
+                family.children.clear()
+
+    def render(self) -> str:
+        """All families in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for family in self.families.values():
+                lines.append(f'# HELP {family.name} {family.help}')
+                lines.append(f'# TYPE {family.name} {family.kind}')
+                lines.extend(family.samples())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Dump render() to `path` atomically (e.g. for a textfile collector)"""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# ============================================================================
+# HTTP ENDPOINT
+# ============================================================================
+
+class MetricsServer:
+    """Serve a registry's render() at /metrics from a background thread"""
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9108):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Process-wide registry used by the bot
+METRICS = Metrics()
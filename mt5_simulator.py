@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+MT5 Terminal Simulator
+Drop-in stand-in for the subset of the MetaTrader5 package the bots use,
+backed by synthetic or recorded bars, for local runs, tests and benchmarks
+"""
+
+import glob
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# CONSTANTS (same values as the MetaTrader5 package)
+# ============================================================================
+
+TIMEFRAME_M1 = 1
+TIMEFRAME_M2 = 2
+TIMEFRAME_M3 = 3
+TIMEFRAME_M4 = 4
+TIMEFRAME_M5 = 5
+TIMEFRAME_M6 = 6
+TIMEFRAME_M10 = 10
+TIMEFRAME_M12 = 12
+TIMEFRAME_M15 = 15
+TIMEFRAME_M20 = 20
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 1 | 0x4000
+TIMEFRAME_H2 = 2 | 0x4000
+TIMEFRAME_H3 = 3 | 0x4000
+TIMEFRAME_H4 = 4 | 0x4000
+TIMEFRAME_H6 = 6 | 0x4000
+TIMEFRAME_H8 = 8 | 0x4000
+TIMEFRAME_H12 = 12 | 0x4000
+TIMEFRAME_D1 = 24 | 0x4000
+TIMEFRAME_W1 = 1 | 0x8000
+TIMEFRAME_MN1 = 1 | 0xC000
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+TRADE_ACTION_CLOSE_BY = 10
+
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+
+ORDER_TIME_GTC = 0
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')
+])
+
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'balance', 'equity', 'margin', 'margin_free', 'profit', 'leverage', 'currency', 'server'
+])
+SymbolInfo = namedtuple('SymbolInfo', [
+    'name', 'digits', 'point', 'spread', 'trade_contract_size', 'trade_tick_value',
+    'trade_tick_value_profit', 'trade_tick_value_loss', 'trade_tick_size', 'volume_min',
+    'volume_max', 'volume_step', 'filling_mode', 'trade_stops_level', 'visible',
+    'currency_base', 'currency_profit'
+])
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'magic', 'identifier', 'volume', 'price_open', 'sl', 'tp',
+    'price_current', 'swap', 'profit', 'symbol', 'comment'
+])
+OrderSendResult = namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id', 'request'
+])
+
+# ============================================================================
+# SYMBOLS
+# ============================================================================
+
+# name: (digits, contract size, start price, volatility per M5 bar, spread in points)
+SYMBOL_DEFAULTS = {
+    'EURUSD': (5, 100000, 1.08, 0.00025, 10),
+    'GBPUSD': (5, 100000, 1.27, 0.00030, 14),
+    'USDJPY': (3, 100000, 150.0, 0.00025, 12),
+    'AUDUSD': (5, 100000, 0.66, 0.00030, 12),
+    'NZDUSD': (5, 100000, 0.60, 0.00030, 16),
+    'BTCUSD': (2, 1, 67000.0, 0.0015, 1500),
+    'ETHUSD': (2, 1, 3500.0, 0.0020, 150),
+    'SOLUSD': (3, 1, 150.0, 0.0030, 50),
+    'DOGEUSD': (5, 100, 0.15, 0.0030, 20),
+}
+GENERIC_SYMBOL = (2, 1, 100.0, 0.0010, 10)
+
+
+def _timeframe_seconds(timeframe: int) -> int:
+    if timeframe & 0xC000 == 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    if timeframe & 0xC000 == 0x8000:
+        return 7 * 86400
+    if timeframe & 0xC000 == 0xC000:
+        return 30 * 86400
+    return timeframe * 60
+
+
+def _make_symbol_info(name: str) -> SymbolInfo:
+    digits, contract, price, _, spread = SYMBOL_DEFAULTS.get(name, GENERIC_SYMBOL)
+    point = 10.0 ** -digits
+    # Profit is in the quote currency; USD-quoted pairs map 1:1 to the account
+    tick_value = point * contract
+    if name.startswith('USD') and name != 'USD':
+        tick_value /= price
+    return SymbolInfo(
+        name=name, digits=digits, point=point, spread=spread,
+        trade_contract_size=float(contract), trade_tick_value=tick_value,
+        trade_tick_value_profit=tick_value, trade_tick_value_loss=tick_value,
+        trade_tick_size=point, volume_min=0.01, volume_max=100.0, volume_step=0.01,
+        filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC, trade_stops_level=0, visible=True,
+        currency_base=name[:-3] if len(name) > 3 else name, currency_profit=name[-3:] if len(name) > 3 else 'USD'
+    )
+
+
+def synthetic_bars(name: str, count: int, start_time: int, period: int = 300, seed: int = 0,
+                   price: Optional[float] = None, offset: int = 0) -> np.ndarray:
+    """Deterministic random-walk bars from `start_time` (bar open time)
+
+    `price` and `offset` continue an earlier series, so extending it
+    never changes bars that were already handed out.
+    """
+    digits, _, start_price, vol, spread = SYMBOL_DEFAULTS.get(name, GENERIC_SYMBOL)
+    price = start_price if price is None else price
+    rng = np.random.default_rng([zlib.crc32(name.encode()), seed, offset])
+    returns = rng.normal(0, vol, count) + vol * 0.3 * np.sin((offset + np.arange(count)) / 150)
+    close = price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([price], close[:-1]))
+    wick = np.abs(rng.normal(0, vol * 0.6, (2, count))) * close
+    bars = np.zeros(count, dtype=RATES_DTYPE)
+    bars['time'] = start_time + period * np.arange(count)
+    bars['open'] = np.round(open_, digits)
+    bars['close'] = np.round(close, digits)
+    bars['high'] = np.round(np.maximum(open_, close) + wick[0], digits)
+    bars['low'] = np.round(np.minimum(open_, close) - wick[1], digits)
+    bars['tick_volume'] = rng.integers(20, 400, count) * (1 + (rng.random(count) < 0.05) * 3)
+    bars['spread'] = spread
+    return bars
+
+
+def load_bars(path: str) -> np.ndarray:
+    """Recorded bars from a .npy rates array or a CSV with copy_rates_from_pos columns"""
+    if path.endswith('.npy'):
+        rates = np.load(path)
+        bars = np.zeros(len(rates), dtype=RATES_DTYPE)
+        for name in rates.dtype.names:
+            if name in RATES_DTYPE.names:
+                bars[name] = rates[name]
+        return bars
+    df = pd.read_csv(path)
+    if not np.issubdtype(df['time'].dtype, np.number):
+        df['time'] = pd.to_datetime(df['time']).astype('int64') // 10 ** 9
+    bars = np.zeros(len(df), dtype=RATES_DTYPE)
+    for name in RATES_DTYPE.names:
+        if name in df.columns:
+            bars[name] = df[name].to_numpy()
+    return bars
+
+# ============================================================================
+# SIMULATED TERMINAL
+# ============================================================================
+
+class Terminal:
+    """State behind the module-level API: bars, clock, account and positions
+
+    With `speed=None` the clock only moves through advance(), so runs are
+    fully deterministic; otherwise simulated time runs at `speed` times the
+    wall clock from the last loaded bar.  `latency` (seconds, or a
+    (low, high) range) is slept in every call and `order_latency` on top of
+    it in order_send; `requote_rate` makes that share of orders come back
+    as requotes.
+    """
+
+    CHUNK = 2000  # synthetic bars generated ahead of the clock at a time
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.configure()
+
+    def configure(self, data_dir: Optional[str] = None, symbols: Optional[List[str]] = None,
+                  history_bars: int = 5000, period: int = 300, start_time: Optional[int] = None,
+                  speed: Optional[float] = None, latency=0.0, order_latency=0.0,
+                  requote_rate: float = 0.0, balance: float = 10000.0, leverage: int = 100,
+                  seed: int = 0):
+        with self.lock:
+            self.data_dir = data_dir
+            self.history_bars = history_bars
+            self.period = period
+            if start_time is None:
+                start_time = int(time.time()) // period * period
+            self.start_time = start_time
+            self.speed = speed
+            self.wall_start = time.time()
+            self.latency = latency
+            self.order_latency = order_latency
+            self.requote_rate = requote_rate
+            self.rng = np.random.default_rng(seed)
+            self.seed = seed
+            self.leverage = leverage
+            self.balance = balance
+            self.bars: Dict[str, np.ndarray] = {}
+            self.infos: Dict[str, SymbolInfo] = {}
+            self.positions: Dict[int, dict] = {}
+            self.steps = 0
+            self.next_ticket = 1
+            self.initialized = False
+            self.error = (1, 'Success')
+            for symbol in symbols or []:
+                self._symbol(symbol)
+
+    # -- clock ---------------------------------------------------------------
+
+    def now(self) -> int:
+        """Current simulated server time"""
+        if self.speed is None:
+            return self.start_time + self.steps * self.period
+        return int(self.start_time + (time.time() - self.wall_start) * self.speed)
+
+    def advance(self, bars: int = 1):
+        """Move the manual clock forward and settle SL/TP hits"""
+        with self.lock:
+            self.steps += bars
+            self._check_stops()
+
+    def _sleep(self, extra=0.0):
+        delay = self.latency
+        if isinstance(delay, (tuple, list)):
+            delay = self.rng.uniform(*delay)
+        if delay or extra:
+            time.sleep(delay + extra)
+
+    # -- data ----------------------------------------------------------------
+
+    def _symbol(self, name: str) -> Optional[np.ndarray]:
+        bars = self.bars.get(name)
+        if bars is not None:
+            return bars
+        recorded = None
+        if self.data_dir:
+            # SYMBOL.npy / SYMBOL.csv or exports like SYMBOL_M5.csv
+            for pattern in (name + '.npy', name + '.csv', name + '_*.npy', name + '_*.csv'):
+                paths = sorted(glob.glob(os.path.join(self.data_dir, pattern)))
+                if paths:
+                    recorded = load_bars(paths[0])
+                    break
+            if recorded is None:
+                return None
+        if recorded is not None:
+            bars = recorded
+            if not self.bars:
+                # Replay from `history_bars` into the recording
+                self.start_time = int(bars['time'][min(self.history_bars, len(bars) - 1)])
+        else:
+            bars = synthetic_bars(name, self.history_bars + self.CHUNK,
+                                  self.start_time - self.history_bars * self.period, self.period, self.seed)
+        self.bars[name] = bars
+        self.infos[name] = _make_symbol_info(name)
+        return bars
+
+    def _index(self, name: str) -> int:
+        """Index of the bar forming at the current time"""
+        bars = self._symbol(name)
+        now = self.now()
+        index = int(np.searchsorted(bars['time'], now, side='right')) - 1
+        while index >= len(bars) - 1 and self.data_dir is None:
+            # Synthetic data ran out: continue the walk
+            extra = synthetic_bars(name, self.CHUNK, int(bars['time'][-1]) + self.period, self.period,
+                                   self.seed, float(bars['close'][-1]), len(bars))
+            self.bars[name] = bars = np.concatenate((bars, extra))
+            index = int(np.searchsorted(bars['time'], now, side='right')) - 1
+        return max(index, 0)
+
+    def rates(self, name: str, timeframe: int, pos: int, count: int) -> Optional[np.ndarray]:
+        bars = self._symbol(name)
+        if bars is None:
+            self.error = (-1, f'Unknown symbol {name}')
+            return None
+        end = self._index(name) + 1
+        bars = self.bars[name]
+        period = _timeframe_seconds(timeframe)
+        if period != self.period:
+            return self._resample(bars[:end], period)[::-1][pos:pos + count][::-1].copy()
+        start = max(0, end - pos - count)
+        return bars[start:max(start, end - pos)].copy()
+
+    @staticmethod
+    def _resample(bars: np.ndarray, period: int) -> np.ndarray:
+        """Aggregate base bars into `period`-second bars"""
+        if len(bars) == 0:
+            return bars
+        keys = bars['time'] // period
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        out = np.zeros(len(starts), dtype=RATES_DTYPE)
+        out['time'] = keys[starts] * period
+        out['open'] = bars['open'][starts]
+        out['close'] = bars['close'][np.concatenate((starts[1:] - 1, [len(bars) - 1]))]
+        out['high'] = np.maximum.reduceat(bars['high'], starts)
+        out['low'] = np.minimum.reduceat(bars['low'], starts)
+        out['tick_volume'] = np.add.reduceat(bars['tick_volume'], starts)
+        out['spread'] = bars['spread'][starts]
+        return out
+
+    def tick(self, name: str) -> Optional[Tick]:
+        if self._symbol(name) is None:
+            return None
+        bar = self.bars[name][self._index(name)]
+        info = self.infos[name]
+        bid = float(bar['close'])
+        ask = round(bid + int(bar['spread'] or info.spread) * info.point, info.digits)
+        now = max(self.now(), int(bar['time']))
+        return Tick(time=now, bid=bid, ask=ask, last=bid, volume=int(bar['tick_volume']),
+                    time_msc=now * 1000, flags=6, volume_real=float(bar['tick_volume']))
+
+    # -- account -------------------------------------------------------------
+
+    def _profit(self, position: dict, tick: Tick) -> float:
+        info = self.infos[position['symbol']]
+        if position['type'] == ORDER_TYPE_BUY:
+            diff = tick.bid - position['price_open']
+        else:
+            diff = position['price_open'] - tick.ask
+        return diff / info.trade_tick_size * info.trade_tick_value * position['volume']
+
+    def _margin(self, position: dict) -> float:
+        notional = position['volume'] * self.infos[position['symbol']].trade_contract_size
+        # USD-based pairs need margin in the base currency, everything else at the open price
+        if not position['symbol'].startswith('USD'):
+            notional *= position['price_open']
+        return notional / self.leverage
+
+    def account(self) -> AccountInfo:
+        profit = sum(self._profit(p, self.tick(p['symbol'])) for p in self.positions.values())
+        margin = sum(self._margin(p) for p in self.positions.values())
+        equity = self.balance + profit
+        return AccountInfo(login=0, balance=round(self.balance, 2), equity=round(equity, 2),
+                           margin=round(margin, 2), margin_free=round(equity - margin, 2),
+                           profit=round(profit, 2), leverage=self.leverage, currency='USD',
+                           server='Simulator')
+
+    def position_list(self, symbol: Optional[str] = None, ticket: Optional[int] = None) -> tuple:
+        result = []
+        for p in self.positions.values():
+            if (symbol is not None and p['symbol'] != symbol) or (ticket is not None and p['ticket'] != ticket):
+                continue
+            tick = self.tick(p['symbol'])
+            current = tick.bid if p['type'] == ORDER_TYPE_BUY else tick.ask
+            result.append(TradePosition(
+                ticket=p['ticket'], time=p['time'], type=p['type'], magic=p['magic'],
+                identifier=p['ticket'], volume=p['volume'], price_open=p['price_open'],
+                sl=p['sl'], tp=p['tp'], price_current=current, swap=0.0,
+                profit=round(self._profit(p, tick), 2), symbol=p['symbol'], comment=p['comment']
+            ))
+        return tuple(result)
+
+    def _close(self, position: dict, price: float, volume: Optional[float] = None):
+        volume = position['volume'] if volume is None else min(volume, position['volume'])
+        info = self.infos[position['symbol']]
+        diff = price - position['price_open'] if position['type'] == ORDER_TYPE_BUY else position['price_open'] - price
+        self.balance += diff / info.trade_tick_size * info.trade_tick_value * volume
+        position['volume'] = round(position['volume'] - volume, 8)
+        if position['volume'] <= 0:
+            del self.positions[position['ticket']]
+
+    def _check_stops(self):
+        """Close positions whose SL/TP was touched by bars since they were last checked"""
+        for position in list(self.positions.values()):
+            bars = self.bars[position['symbol']]
+            end = self._index(position['symbol']) + 1
+            start = position['checked']
+            position['checked'] = end
+            for bar in bars[start:end]:
+                spread = int(bar['spread']) * self.infos[position['symbol']].point
+                if position['type'] == ORDER_TYPE_BUY:
+                    low, high = bar['low'], bar['high']
+                    if position['sl'] and low <= position['sl']:
+                        self._close(position, position['sl'])
+                        break
+                    if position['tp'] and high >= position['tp']:
+                        self._close(position, position['tp'])
+                        break
+                else:
+                    low, high = bar['low'] + spread, bar['high'] + spread
+                    if position['sl'] and high >= position['sl']:
+                        self._close(position, position['sl'])
+                        break
+                    if position['tp'] and low <= position['tp']:
+                        self._close(position, position['tp'])
+                        break
+
+    # -- trading -------------------------------------------------------------
+
+    def order_send(self, request: dict) -> OrderSendResult:
+        self._sleep(self.order_latency)
+        symbol = request.get('symbol')
+        tick = self.tick(symbol) if symbol else None
+
+        def result(retcode, comment, order=0, volume=0.0, price=0.0):
+            return OrderSendResult(
+                retcode=retcode, deal=order, order=order, volume=volume, price=price,
+                bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0,
+                comment=comment, request_id=0, request=request
+            )
+
+        action = request.get('action')
+        if action == TRADE_ACTION_SLTP:
+            position = self.positions.get(request.get('position'))
+            if position is None:
+                return result(TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist')
+            position['sl'] = float(request.get('sl', position['sl']) or 0.0)
+            position['tp'] = float(request.get('tp', position['tp']) or 0.0)
+            return result(TRADE_RETCODE_DONE, 'Request executed', position['ticket'])
+        if action != TRADE_ACTION_DEAL:
+            return result(TRADE_RETCODE_INVALID, 'Unsupported action')
+        if tick is None:
+            return result(TRADE_RETCODE_INVALID, 'Unknown symbol')
+
+        info = self.infos[symbol]
+        volume = float(request.get('volume', 0))
+        steps = volume / info.volume_step
+        if volume < info.volume_min or volume > info.volume_max or abs(steps - round(steps)) > 1e-6:
+            return result(TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume')
+        filling = request.get('type_filling', ORDER_FILLING_FOK)
+        if filling in (ORDER_FILLING_FOK, ORDER_FILLING_IOC) and not info.filling_mode & (1 << filling):
+            return result(TRADE_RETCODE_INVALID_FILL, 'Unsupported filling mode')
+
+        order_type = request.get('type')
+        market = tick.ask if order_type == ORDER_TYPE_BUY else tick.bid
+        price = request.get('price') or market
+        deviation = request.get('deviation', 0) * info.point
+        if abs(price - market) > deviation + info.point / 2 or self.rng.random() < self.requote_rate:
+            return result(TRADE_RETCODE_REQUOTE, 'Requote')
+
+        ticket = self.next_ticket
+        self.next_ticket += 1
+
+        # Closing (or reducing) an existing position
+        if request.get('position'):
+            position = self.positions.get(request['position'])
+            if position is None:
+                return result(TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist')
+            self._close(position, market, volume)
+            return result(TRADE_RETCODE_DONE, 'Request executed', ticket, volume, market)
+
+        self.positions[ticket] = {
+            'ticket': ticket, 'symbol': symbol, 'type': order_type, 'volume': volume,
+            'price_open': market, 'sl': float(request.get('sl') or 0.0), 'tp': float(request.get('tp') or 0.0),
+            'magic': request.get('magic', 0), 'comment': request.get('comment', ''),
+            'time': self.now(), 'checked': self._index(symbol) + 1
+        }
+        return result(TRADE_RETCODE_DONE, 'Request executed', ticket, volume, market)
+
+
+_terminal = Terminal()
+
+# ============================================================================
+# MODULE API (mirrors MetaTrader5)
+# ============================================================================
+
+def configure(**kwargs):
+    """Reset the simulator (see Terminal for the options)"""
+    _terminal.configure(**kwargs)
+
+
+def advance(bars: int = 1):
+    """Move the simulated clock forward by `bars` base bars (manual clock only)"""
+    _terminal.advance(bars)
+
+
+def terminal() -> Terminal:
+    return _terminal
+
+
+def initialize(*args, **kwargs) -> bool:
+    _terminal._sleep()
+    _terminal.initialized = True
+    return True
+
+
+def login(login=None, password=None, server=None, **kwargs) -> bool:
+    _terminal._sleep()
+    return _terminal.initialized
+
+
+def shutdown():
+    _terminal.initialized = False
+
+
+def last_error():
+    return _terminal.error
+
+
+def account_info() -> Optional[AccountInfo]:
+    _terminal._sleep()
+    with _terminal.lock:
+        if not _terminal.initialized:
+            return None
+        _terminal._check_stops()
+        return _terminal.account()
+
+
+def positions_get(symbol: Optional[str] = None, ticket: Optional[int] = None, **kwargs) -> Optional[tuple]:
+    _terminal._sleep()
+    with _terminal.lock:
+        if not _terminal.initialized:
+            return None
+        _terminal._check_stops()
+        return _terminal.position_list(symbol, ticket)
+
+
+def copy_rates_from_pos(symbol: str, timeframe: int, start_pos: int, count: int) -> Optional[np.ndarray]:
+    _terminal._sleep()
+    with _terminal.lock:
+        return _terminal.rates(symbol, timeframe, start_pos, count)
+
+
+def symbol_info(symbol: str) -> Optional[SymbolInfo]:
+    _terminal._sleep()
+    with _terminal.lock:
+        if _terminal._symbol(symbol) is None:
+            return None
+        return _terminal.infos[symbol]
+
+
+def symbol_info_tick(symbol: str) -> Optional[Tick]:
+    _terminal._sleep()
+    with _terminal.lock:
+        return _terminal.tick(symbol)
+
+
+def symbol_select(symbol: str, enable: bool = True) -> bool:
+    with _terminal.lock:
+        return _terminal._symbol(symbol) is not None
+
+
+def order_send(request: dict) -> Optional[OrderSendResult]:
+    _terminal._sleep()
+    with _terminal.lock:
+        if not _terminal.initialized:
+            return None
+        return _terminal.order_send(request)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Parameter Sweep for the v2 Trading Bot
+Grid / random search over min_confidence, score weights and ATR multipliers
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backtest import Backtester, find_history, load_history, parse_symbol_values
+from standalone_trading_bot_v2 import CONFIG, DEFAULT_SCORE_WEIGHTS, IndicatorEngine
+
+# Config keys that can be swept besides the DEFAULT_SCORE_WEIGHTS entries
+CONFIG_PARAMS = ('min_confidence', 'sl_atr_multiplier', 'tp_atr_multiplier')
+INT_PARAMS = ('min_confidence',) + tuple(DEFAULT_SCORE_WEIGHTS)
+
+# Per-bar arrays each worker needs to rescore and simulate
+FIELDS = ('time', 'open', 'high', 'low', 'close', 'spread') + IndicatorEngine.COLUMNS
+
+# ============================================================================
+# SHARED INDICATOR ARRAYS
+# ============================================================================
+
+class SharedArrays:
+    """Precomputed per-symbol arrays in one shared memory block
+
+    Workers attach by name and read the arrays in place, so each parameter
+    set only pays for rescoring and the trade simulation.
+    """
+
+    def __init__(self, arrays: Dict[str, Dict[str, np.ndarray]]):
+        self.layout: List[Tuple[str, int, int]] = []
+        offset = 0
+        for symbol, data in arrays.items():
+            n = len(data['close'])
+            self.layout.append((symbol, offset, n))
+            offset += len(FIELDS) * n * 8
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for symbol, view in self.views(self.shm, self.layout).items():
+            for field in FIELDS:
+                view[field][:] = arrays[symbol][field]
+
+    @property
+    def descriptor(self) -> Tuple[str, List[Tuple[str, int, int]]]:
+        return self.shm.name, self.layout
+
+    @staticmethod
+    def views(shm: shared_memory.SharedMemory,
+              layout: List[Tuple[str, int, int]]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Map the block back to {symbol: {field: array}} without copying"""
+        views = {}
+        for symbol, offset, n in layout:
+            block = np.ndarray((len(FIELDS), n), dtype=np.float64, buffer=shm.buf, offset=offset)
+            views[symbol] = {field: block[i] for i, field in enumerate(FIELDS)}
+        return views
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def precompute(backtester: Backtester, history: Dict) -> Dict[str, Dict[str, np.ndarray]]:
+    """Indicator and price arrays for every symbol (computed once per sweep)"""
+    arrays = {}
+    for symbol, df in history.items():
+        ind = backtester.calculate_indicators(df)
+        data = backtester.price_arrays(symbol, ind)
+        del data['symbol']
+        for column in IndicatorEngine.COLUMNS:
+            data[column] = ind[column].to_numpy(dtype=np.float64)
+        arrays[symbol] = data
+    return arrays
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+_worker: Dict = {}
+
+
+def _init_worker(descriptor, config: Dict, initial_balance: float, contract_sizes: Dict):
+    """Attach to the shared arrays once per worker process"""
+    name, layout = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = SharedArrays.views(shm, layout)
+    for data in arrays.values():
+        data['time'] = data['time'].astype(np.int64)
+    _worker.update(shm=shm, arrays=arrays, config=config,
+                   initial_balance=initial_balance, contract_sizes=contract_sizes)
+
+
+def run_params(params: Dict) -> Dict:
+    """Rescore every symbol with one parameter set and simulate the trades"""
+    started = time.perf_counter()
+    config = dict(_worker['config'])
+    weights = dict(config.get('score_weights') or {})
+    for key, value in params.items():
+        if key in DEFAULT_SCORE_WEIGHTS:
+            weights[key] = value
+        else:
+            config[key] = value
+    config['score_weights'] = weights
+
+    backtester = Backtester(config, _worker['initial_balance'],
+                            contract_sizes=_worker['contract_sizes'])
+    generator = backtester.signal_generator
+    prepared = []
+    for symbol, data in _worker['arrays'].items():
+        buy, sell = generator.score_arrays(data)
+        action, confidence = generator.decide(buy, sell)
+        bars = np.flatnonzero(action != 0)
+        bars = bars[bars >= Backtester.WARMUP_BARS - 1]
+        signals = [
+            (i, {
+                'action': 'buy' if action[i] > 0 else 'sell',
+                'confidence': int(confidence[i]),
+                'price': data['close'][i],
+                'indicators': {'atr': data['atr'][i]}
+            })
+            for i in bars.tolist()
+        ]
+        prepared.append(dict(data, symbol=symbol, signals=signals))
+
+    report = backtester.simulate(prepared)
+    return {
+        'params': params,
+        'net_profit': report['net_profit'],
+        'return_pct': report['return_pct'],
+        'max_drawdown_pct': report['max_drawdown_pct'],
+        'trades': report['trades'],
+        'win_rate': report['win_rate'],
+        'skipped_signals': report['skipped_signals'],
+        'seconds': time.perf_counter() - started
+    }
+
+# ============================================================================
+# PARAMETER SPACE
+# ============================================================================
+
+def parse_space(items: List[str]) -> Dict[str, List]:
+    """Parse NAME=v1,v2,... (or NAME=lo:hi for random search) specs"""
+    space = {}
+    for item in items or []:
+        name, _, values = item.partition('=')
+        if name not in CONFIG_PARAMS and name not in DEFAULT_SCORE_WEIGHTS:
+            raise ValueError(f"Unknown parameter '{name}'")
+        cast = int if name in INT_PARAMS else float
+        if ':' in values:
+            lo, hi = values.split(':')
+            space[name] = ('range', cast(lo), cast(hi))
+        else:
+            space[name] = [cast(v) for v in values.split(',')]
+    return space
+
+
+def grid(space: Dict) -> List[Dict]:
+    """Every combination of the listed values"""
+    if any(isinstance(v, tuple) for v in space.values()):
+        raise ValueError("lo:hi ranges are only supported with --random")
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*space.values())]
+
+
+def sample(space: Dict, count: int, seed: int) -> List[Dict]:
+    """`count` random draws: list entries pick a value, ranges draw uniformly"""
+    rng = random.Random(seed)
+    combos = []
+    for _ in range(count):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                _, lo, hi = values
+                params[name] = rng.randint(lo, hi) if name in INT_PARAMS else rng.uniform(lo, hi)
+            else:
+                params[name] = rng.choice(values)
+        combos.append(params)
+    return combos
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+RANK_ASCENDING = ('max_drawdown_pct',)
+
+
+def sweep(arrays: Dict[str, Dict[str, np.ndarray]], combos: List[Dict], config: Dict,
+          initial_balance: float = 10000.0, contract_sizes: Dict = None,
+          workers: int = None, rank_by: str = 'net_profit') -> List[Dict]:
+    """Run every parameter set across a process pool and rank the results"""
+    shared = SharedArrays(arrays)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared.descriptor, config, initial_balance, contract_sizes or {})
+        ) as pool:
+            chunksize = max(1, len(combos) // ((workers or os.cpu_count() or 1) * 8))
+            results = []
+            for i, result in enumerate(pool.map(run_params, combos, chunksize=chunksize), 1):
+                results.append(result)
+                if i % 100 == 0:
+                    print(f"  {i}/{len(combos)} parameter sets done")
+    finally:
+        shared.release()
+
+    results.sort(key=lambda r: r[rank_by], reverse=rank_by not in RANK_ASCENDING)
+    for rank, result in enumerate(results, 1):
+        result['rank'] = rank
+    return results
+
+
+def print_results(results: List[Dict], top: int = 20):
+    """Print the best `top` results as a ranked table"""
+    print("=" * 100)
+    print(f"{'#':>4} {'Net PnL':>12} {'Return %':>9} {'DD %':>7} {'Trades':>7} {'Win %':>6} {'ms':>8}  Params")
+    print("-" * 100)
+    for r in results[:top]:
+        params = ' '.join(f"{k}={v:g}" for k, v in r['params'].items())
+        print(f"{r['rank']:>4} {r['net_profit']:>12.2f} {r['return_pct']:>9.2f} {r['max_drawdown_pct']:>7.2f} "
+              f"{r['trades']:>7} {r['win_rate']:>6.1f} {r['seconds'] * 1000:>8.1f}  {params}")
+    print("=" * 100)
+
+
+def write_results(results: List[Dict], path: str):
+    """Write results as CSV (one column per parameter) or JSON"""
+    if path.lower().endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        return
+
+    names = sorted({k for r in results for k in r['params']})
+    metrics = ['rank', 'net_profit', 'return_pct', 'max_drawdown_pct', 'trades',
+               'win_rate', 'skipped_signals', 'seconds']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(metrics + names)
+        for r in results:
+            writer.writerow([r[m] for m in metrics] + [r['params'].get(n, '') for n in names])
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Sweep v2 bot parameters over historical bars")
+    parser.add_argument('sources', nargs='*', help="SYMBOL=PATH history files (csv, parquet, npy, bars)")
+    parser.add_argument('--data-dir', help="Directory with one history file per configured symbol")
+    parser.add_argument('--param', action='append', required=True,
+                        help="NAME=v1,v2,... or NAME=lo:hi (random only); "
+                             "names: " + ', '.join(CONFIG_PARAMS + tuple(DEFAULT_SCORE_WEIGHTS)))
+    parser.add_argument('--random', type=int, help="Draw this many random parameter sets instead of the grid")
+    parser.add_argument('--seed', type=int, default=0, help="Random search seed")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all cores)")
+    parser.add_argument('--rank-by', default='net_profit',
+                        choices=['net_profit', 'return_pct', 'win_rate', 'max_drawdown_pct', 'trades'])
+    parser.add_argument('--balance', type=float, default=10000.0, help="Starting balance")
+    parser.add_argument('--spread', action='append', help="SYMBOL=PRICE fixed spread")
+    parser.add_argument('--point', action='append', help="SYMBOL=POINT to use the file's spread column")
+    parser.add_argument('--contract-size', action='append', help="SYMBOL=UNITS per lot (default 1)")
+    parser.add_argument('--top', type=int, default=20, help="Rows to print")
+    parser.add_argument('--out', help="Write all results to a .csv or .json file")
+    args = parser.parse_args()
+
+    paths = parse_symbol_values(args.sources, str)
+    if args.data_dir:
+        for symbol, path in find_history(args.data_dir, CONFIG['symbols']).items():
+            paths.setdefault(symbol, path)
+    if not paths:
+        parser.error("no history given (use SYMBOL=PATH or --data-dir)")
+
+    try:
+        space = parse_space(args.param)
+        combos = sample(space, args.random, args.seed) if args.random else grid(space)
+    except ValueError as e:
+        parser.error(str(e))
+
+    config = dict(CONFIG)
+    backtester = Backtester(
+        config,
+        initial_balance=args.balance,
+        spreads=parse_symbol_values(args.spread),
+        points=parse_symbol_values(args.point)
+    )
+
+    started = time.perf_counter()
+    history = {symbol: load_history(path) for symbol, path in paths.items()}
+    arrays = precompute(backtester, history)
+    print(f"Precomputed indicators for {len(arrays)} symbols in {time.perf_counter() - started:.2f}s; "
+          f"running {len(combos)} parameter sets")
+
+    results = sweep(arrays, combos, config, args.balance,
+                    parse_symbol_values(args.contract_size), args.workers, args.rank_by)
+    print_results(results, args.top)
+    print(f"Total: {time.perf_counter() - started:.2f}s")
+
+    if args.out:
+        write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Signal Journal for the v2 Trading Bot
+Append-only, line-delimited record of every cycle's signals with daily
+rotation, optional NumPy compaction and a reader for symbol/time queries,
+plus atomic publication of the dashboard's latest.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columns kept when a day is compacted to .npz
+SIGNAL_COLUMNS = ('t', 'cycle', 'symbol', 'action', 'confidence', 'price',
+                  'buy_score', 'sell_score', 'reasons')
+CYCLE_COLUMNS = ('t', 'cycle', 'balance', 'equity', 'profit', 'open_positions')
+
+logger = logging.getLogger(__name__)
+
+
+def _day(t: float) -> str:
+    """UTC date a record at epoch time `t` is filed under"""
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _to_epoch(value) -> Optional[float]:
+    """Epoch seconds from None, a number, a datetime or a date string (naive = UTC)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return ts.timestamp()
+
+# ============================================================================
+# JOURNAL
+# ============================================================================
+
+class SignalJournal:
+    """Append-only signal journal, one file per UTC day
+
+    Each cycle is one buffered write of a 'cycle' record (account, positions
+    and counters) followed by one 'signal' record per symbol, as compact JSON
+    lines in `<directory>/<YYYY-MM-DD>.jsonl`.  Finished days can be compacted
+    into `<YYYY-MM-DD>.npz` column arrays, which the reader prefers; with
+    `compact` that happens on a background thread whenever a day's file is
+    opened, for every earlier day still in .jsonl (including days left
+    behind by a restart).
+    """
+
+    def __init__(self, directory: str = 'signals/journal', compact: bool = False):
+        self.directory = directory
+        self.compact_on_rotate = compact
+        self.day: Optional[str] = None
+        self.file = None
+        self.compactor: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, day: str, ext: str = 'jsonl') -> str:
+        return os.path.join(self.directory, f"{day}.{ext}")
+
+    def append(self, cycle: int, signals: List[Dict], account: Dict, positions: List[Dict],
+               stats: Dict, t: Optional[float] = None):
+        """Append one cycle's records in a single write"""
+        if t is None:
+            t = datetime.now(timezone.utc).timestamp()
+        day = _day(t)
+        if day != self.day:
+            self.rotate(day)
+
+        t = round(t, 3)
+        records = [{
+            'type': 'cycle', 't': t, 'cycle': cycle,
+            'account': account, 'positions': positions, 'stats': stats
+        }]
+        records.extend({
+            'type': 'signal', 't': t, 'cycle': cycle,
+            'symbol': s['symbol'],
+            'action': s['action'],
+            'confidence': s['confidence'],
+            'price': float(s['price']),
+            'buy_score': s['scores']['buy_score'],
+            'sell_score': s['scores']['sell_score'],
+            'reasons': s['reason']
+        } for s in signals)
+
+        self.file.write(''.join(json.dumps(r, separators=(',', ':'), default=str) + '\n' for r in records))
+        self.file.flush()
+
+    def rotate(self, day: str):
+        """Switch to `day`'s file, compacting the earlier days in the background if enabled"""
+        self.close()
+        self.day = day
+        self.file = open(self.path(day), 'a', encoding='utf-8', buffering=64 * 1024)
+        if self.compact_on_rotate:
+            self.compactor = threading.Thread(target=self.compact_before, args=(day,),
+                                              name='journal-compact')
+            self.compactor.start()
+
+    def compact_before(self, day: str) -> List[str]:
+        """Compact every day before `day` that is still in .jsonl; returns the days compacted"""
+        done = []
+        for name in sorted(os.listdir(self.directory)):
+            stem, ext = os.path.splitext(name)
+            if ext != '.jsonl' or stem >= day:
+                continue
+            try:
+                if compact_day(self.directory, stem):
+                    done.append(stem)
+            except Exception as e:
+                logger.error("Journal compaction of %s failed: %s", stem, e)
+        return done
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.compactor is not None:
+            self.compactor.join()
+            self.compactor = None
+
+# ============================================================================
+# LATEST SNAPSHOT
+# ============================================================================
+
+def publish_json(path: str, data: Dict, retries: int = 5):
+    """Replace `path` with compact JSON atomically
+
+    The payload is encoded once, written to a temp file next to `path` and
+    renamed over it, so a reader sees either the old or the new snapshot,
+    never a partial one.  The temp file is synced to disk first, so a power
+    loss cannot leave an empty file behind the rename.  On Windows the
+    rename fails while a reader has the file open, so it is retried briefly.
+    """
+    payload = json.dumps(data, separators=(',', ':'), default=str).encode('utf-8')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(retries):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                os.remove(tmp)
+                raise
+            time.sleep(0.01 * (attempt + 1))
+
+# ============================================================================
+# COMPACTION
+# ============================================================================
+
+def compact_day(directory: str, day: str) -> Optional[str]:
+    """Convert a day's .jsonl into column arrays in .npz and remove the .jsonl
+
+    Records already in an existing .npz for that day are kept.
+    """
+    source = os.path.join(directory, f"{day}.jsonl")
+    target = os.path.join(directory, f"{day}.npz")
+    if not os.path.exists(source):
+        return None
+
+    signals = {c: [] for c in SIGNAL_COLUMNS}
+    cycles = {c: [] for c in CYCLE_COLUMNS}
+    if os.path.exists(target):
+        with np.load(target) as old:
+            for c in SIGNAL_COLUMNS:
+                signals[c].extend(old[c].tolist())
+            for c in CYCLE_COLUMNS:
+                cycles[c].extend(old['cycle_' + c].tolist())
+
+    for record in _read_jsonl(source):
+        if record['type'] == 'signal':
+            for c in SIGNAL_COLUMNS:
+                value = record[c]
+                signals[c].append(' | '.join(value) if c == 'reasons' else value)
+        else:
+            account = record.get('account') or {}
+            cycles['t'].append(record['t'])
+            cycles['cycle'].append(record['cycle'])
+            for c in ('balance', 'equity', 'profit'):
+                cycles[c].append(account.get(c, np.nan))
+            cycles['open_positions'].append(len(record.get('positions') or []))
+
+    arrays = {
+        't': np.array(signals['t'], dtype=np.float64),
+        'cycle': np.array(signals['cycle'], dtype=np.int64),
+        'symbol': np.array(signals['symbol'], dtype=str),
+        'action': np.array(signals['action'], dtype=str),
+        'confidence': np.array(signals['confidence'], dtype=np.float64),
+        'price': np.array(signals['price'], dtype=np.float64),
+        'buy_score': np.array(signals['buy_score'], dtype=np.float64),
+        'sell_score': np.array(signals['sell_score'], dtype=np.float64),
+        'reasons': np.array(signals['reasons'], dtype=str),
+    }
+    for c in CYCLE_COLUMNS:
+        dtype = np.int64 if c in ('cycle', 'open_positions') else np.float64
+        arrays['cycle_' + c] = np.array(cycles[c], dtype=dtype)
+
+    tmp = target + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, target)
+    os.remove(source)
+    return target
+
+# ============================================================================
+# READER
+# ============================================================================
+
+def _read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.endswith('\n'):  # skip a line still being written
+                yield json.loads(line)
+
+
+class JournalReader:
+    """Stream or range-query journaled signals by symbol and time"""
+
+    def __init__(self, directory: str = 'signals/journal'):
+        self.directory = directory
+
+    def days(self, start: Optional[float] = None, end: Optional[float] = None) -> List[str]:
+        """Journal days (sorted) that can hold records in [start, end]"""
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        days = sorted({name.split('.')[0] for name in names if name.endswith(('.jsonl', '.npz'))})
+        first = _day(start) if start is not None else None
+        last = _day(end) if end is not None else None
+        return [d for d in days if (first is None or d >= first) and (last is None or d <= last)]
+
+    def frame(self, symbol: Optional[str] = None, start=None, end=None,
+              actions: Optional[List[str]] = None) -> pd.DataFrame:
+        """Signals as a DataFrame (reasons joined with ' | ')"""
+        start, end = _to_epoch(start), _to_epoch(end)
+        parts = []
+        for day in self.days(start, end):
+            npz = os.path.join(self.directory, f"{day}.npz")
+            if os.path.exists(npz):
+                parts.append(pd.DataFrame(self._select(npz, symbol, start, end, actions)))
+            jsonl = os.path.join(self.directory, f"{day}.jsonl")
+            if os.path.exists(jsonl):
+                rows = [dict(r, reasons=' | '.join(r['reasons']))
+                        for r in self._scan(jsonl, 'signal', symbol, start, end, actions)]
+                if rows:
+                    parts.append(pd.DataFrame(rows, columns=SIGNAL_COLUMNS))
+
+        if not parts:
+            return pd.DataFrame(columns=SIGNAL_COLUMNS)
+        df = pd.concat(parts, ignore_index=True).sort_values('t', kind='stable', ignore_index=True)
+        df['time'] = pd.to_datetime((df['t'] * 1000).round().astype(np.int64), unit='ms', utc=True)
+        return df
+
+    def signals(self, symbol: Optional[str] = None, start=None, end=None,
+                actions: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Stream signal records in time order"""
+        start, end = _to_epoch(start), _to_epoch(end)
+        for day in self.days(start, end):
+            npz = os.path.join(self.directory, f"{day}.npz")
+            if os.path.exists(npz):
+                part = self._select(npz, symbol, start, end, actions)
+                for i in range(len(part['t'])):
+                    row = {c: part[c][i].item() for c in SIGNAL_COLUMNS}
+                    row['reasons'] = row['reasons'].split(' | ') if row['reasons'] else []
+                    yield dict(row, type='signal')
+            jsonl = os.path.join(self.directory, f"{day}.jsonl")
+            if os.path.exists(jsonl):
+                yield from self._scan(jsonl, 'signal', symbol, start, end, actions)
+
+    def cycles(self, start=None, end=None) -> Iterator[Dict]:
+        """Stream cycle records (account, positions, counters) in time order
+
+        Compacted days only keep balance, equity, profit and the position count.
+        """
+        start, end = _to_epoch(start), _to_epoch(end)
+        for day in self.days(start, end):
+            npz = os.path.join(self.directory, f"{day}.npz")
+            if os.path.exists(npz):
+                with np.load(npz) as data:
+                    part = {c: data['cycle_' + c] for c in CYCLE_COLUMNS}
+                for i in range(len(part['t'])):
+                    t = part['t'][i]
+                    if (start is None or t >= start) and (end is None or t <= end):
+                        yield dict({c: part[c][i].item() for c in CYCLE_COLUMNS}, type='cycle')
+            jsonl = os.path.join(self.directory, f"{day}.jsonl")
+            if os.path.exists(jsonl):
+                yield from self._scan(jsonl, 'cycle', None, start, end, None)
+
+    @staticmethod
+    def _select(path: str, symbol, start, end, actions) -> Dict[str, np.ndarray]:
+        """Signal columns of a compacted day, filtered in one vectorized pass"""
+        with np.load(path) as data:
+            part = {c: data[c] for c in SIGNAL_COLUMNS}
+        mask = np.ones(len(part['t']), dtype=bool)
+        if symbol is not None:
+            mask &= part['symbol'] == symbol
+        if start is not None:
+            mask &= part['t'] >= start
+        if end is not None:
+            mask &= part['t'] <= end
+        if actions is not None:
+            mask &= np.isin(part['action'], actions)
+        return {c: v[mask] for c, v in part.items()}
+
+    @staticmethod
+    def _scan(path: str, kind: str, symbol, start, end, actions) -> Iterator[Dict]:
+        for record in _read_jsonl(path):
+            if record['type'] != kind:
+                continue
+            t = record['t']
+            if start is not None and t < start:
+                continue
+            if end is not None and t > end:
+                break  # records are appended in time order
+            if symbol is not None and record['symbol'] != symbol:
+                continue
+            if actions is not None and record['action'] not in actions:
+                continue
+            yield record
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Query or compact the signal journal")
+    parser.add_argument('--dir', default='signals/journal', help="Journal directory")
+    parser.add_argument('--symbol', help="Only this symbol")
+    parser.add_argument('--start', help="From this time (e.g. 2025-10-19 or 2025-10-19T12:00, UTC)")
+    parser.add_argument('--end', help="Up to this time (UTC)")
+    parser.add_argument('--action', action='append', choices=['buy', 'sell', 'hold'], help="Only these actions")
+    parser.add_argument('--compact', action='store_true', help="Compact every finished day to .npz and exit")
+    parser.add_argument('--csv', help="Write the matching signals to a CSV file")
+    args = parser.parse_args()
+
+    if args.compact:
+        today = _day(datetime.now(timezone.utc).timestamp())
+        for day in JournalReader(args.dir).days():
+            if day < today and compact_day(args.dir, day):
+                print(f"Compacted {day}")
+        return
+
+    df = JournalReader(args.dir).frame(args.symbol, args.start, args.end, args.action)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    print(df.drop(columns=['t']).to_string(index=False) if len(df) else "No signals")
+
+if __name__ == "__main__":
+    main()
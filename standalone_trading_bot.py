@@ -4,7 +4,13 @@ Standalone MT5 Trading Bot
 Completely independent - reads from MT5, analyzes, generates signals, and executes trades
 """
 
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5
+except ImportError:  # Only available on Windows; the simulator still works
+    MetaTrader5 = None
+import mt5_simulator
+
+mt5 = MetaTrader5 or mt5_simulator
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -33,6 +39,8 @@ CONFIG = {
     'mt5_login': 843153,
     'mt5_password': 'YOUR_PASSWORD_HERE',  # CHANGE THIS
     'mt5_server': 'ACYSecurities-Demo',
+    'terminal': 'mt5',  # 'mt5' or 'simulator' (synthetic/recorded bars, see mt5_simulator.py)
+    'simulator': {'speed': 1.0},  # mt5_simulator.configure() options, e.g. data_dir, latency, balance
     
     # Trading Pairs
     'symbols': [
@@ -60,6 +68,17 @@ CONFIG = {
 # MT5 CONNECTION
 # ============================================================================
 
+def select_terminal(name: str, options: Optional[Dict] = None):
+    """Point the module-level `mt5` at the MetaTrader5 terminal or the simulator"""
+    global mt5
+    if name == 'simulator':
+        mt5_simulator.configure(**(options or {}))
+        mt5 = mt5_simulator
+    elif MetaTrader5 is None:
+        raise RuntimeError("MetaTrader5 package is not installed (set CONFIG['terminal'] = 'simulator')")
+    else:
+        mt5 = MetaTrader5
+
 class MT5Connection:
     """Handle MT5 connection and operations"""
     
@@ -172,6 +191,9 @@ class MT5Connection:
         
         # Send order
         result = mt5.order_send(request)
+        if result is None:
+            logger.error(f"Order failed: order_send returned None ({mt5.last_error()})")
+            return None
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             logger.error(f"Order failed: {result.comment}")
             return None
@@ -449,6 +471,7 @@ class TradingBot:
     
     def __init__(self, config: Dict):
         self.config = config
+        select_terminal(config.get('terminal', 'mt5'), config.get('simulator'))
         self.mt5 = MT5Connection(
             config['mt5_login'],
             config['mt5_password'],
@@ -610,7 +633,7 @@ class TradingBot:
 def main():
     """Main entry point"""
     # Check if MT5 password is set
-    if CONFIG['mt5_password'] == 'YOUR_PASSWORD_HERE':
+    if CONFIG['mt5_password'] == 'YOUR_PASSWORD_HERE' and CONFIG.get('terminal') != 'simulator':
         print("ERROR: Please set your MT5 password in the CONFIG section!")
         print("Edit this file and change 'YOUR_PASSWORD_HERE' to your actual password")
         return
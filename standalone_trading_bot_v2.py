@@ -4,25 +4,33 @@ Standalone MT5 Trading Bot v2 - IMPROVED SIGNAL GENERATION
 Completely independent - reads from MT5, analyzes, generates signals, and executes trades
 """
 
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5
+except ImportError:  # Only available on Windows; the simulator still works
+    MetaTrader5 = None
+import mt5_simulator
+
+mt5 = MetaTrader5 or mt5_simulator
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import asyncio
 import time
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import json
 import os
+import threading
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from bar_store import BarStore
+from bot_logging import configure_logging
+from metrics import METRICS, MetricsServer
+from signal_journal import SignalJournal, publish_json
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('trading_bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -34,6 +42,8 @@ CONFIG = {
     'mt5_login': 843153,
     'mt5_password': 'YOUR_PASSWORD_HERE',  # CHANGE THIS
     'mt5_server': 'ACYSecurities-Demo',
+    'terminal': 'mt5',  # 'mt5' or 'simulator' (synthetic/recorded bars, see mt5_simulator.py)
+    'simulator': {'speed': 1.0},  # mt5_simulator.configure() options, e.g. data_dir, latency, balance
     
     # Trading Pairs
     'symbols': [
@@ -44,34 +54,420 @@ CONFIG = {
     # Risk Management
     'risk_per_trade': 0.02,  # 2% of balance per trade
     'max_daily_loss': 0.05,  # 5% max daily loss
+    'equity_watchdog': False,  # Check equity every watchdog_interval seconds and halt for the day on a breach
+    'watchdog_interval': 0.25,
+    'max_intraday_drawdown': None,  # Also halt when equity falls this fraction below the day's high-water mark (e.g. 0.03)
+    'flatten_on_breach': False,  # With the watchdog, also close the bot's positions (its magic) at market on a breach
+    'manage_positions': False,  # True: break-even, trailing stop and partial close for open positions (distances in ATRs)
+    'position_interval': 1.0,  # Seconds between position passes
+    'breakeven_atr': 1.0,  # Stop to entry (+ breakeven_lock_atr) once a position is this far in profit
+    'breakeven_lock_atr': 0.1,
+    'trail_start_atr': 1.5,  # Trail the stop trail_atr behind price from this profit on
+    'trail_atr': 1.5,
+    'partial_close_atr': 2.0,  # Close partial_close_fraction of the volume once, at this profit (None = never)
+    'partial_close_fraction': 0.5,
+    'stop_min_step_atr': 0.1,  # Ignore stop moves smaller than this
+    'modify_interval': 5.0,  # At most one SL/TP change per position per this many seconds (later moves are coalesced)
+    'max_modifications': 20,  # SL/TP requests per pass
     'max_open_trades': 5,
+    'allocation': 'portfolio',  # Rank the whole cycle's signals before ordering ('sequential' = config order)
+    'max_total_risk': 0.06,  # Stop-loss risk of all open positions plus new orders, as a fraction of balance
+    'max_positions_per_symbol': 1,
+    'correlation_window': 100,  # Bars of returns in the cross-symbol correlation matrix (0 = no correlation gating)
+    'correlation_soft': 0.5,  # New trades shrink linearly from full size at this correlation with an existing one...
+    'correlation_limit': 0.8,  # ...to rejected at this one
+    'crypto_benchmark': 'BTCUSD',  # Exposure report: beta-weighted exposure to this symbol
     'min_confidence': 60,  # REDUCED from 80 to 60 for more signals
+    'sl_atr_multiplier': 2.0,  # Stop loss distance in ATRs
+    'tp_atr_multiplier': 3.0,  # Take profit distance in ATRs
+    'score_weights': None,  # Override DEFAULT_SCORE_WEIGHTS (e.g. from param_sweep.py)
     
     # Strategy Settings
     'timeframe': mt5.TIMEFRAME_M5,  # 5-minute candles
     'lookback_periods': 100,  # Number of candles to analyze
-    'signal_interval': 120,  # Generate signals every 2 minutes
+    'trend_timeframes': [],  # Higher timeframes resampled from the base bars for trend confirmation, e.g. [mt5.TIMEFRAME_H1, mt5.TIMEFRAME_H4]
+    'trend_fast_sma': 20,  # Higher-timeframe trend: close vs fast SMA vs slow SMA (in higher-timeframe bars)
+    'trend_slow_sma': 50,
+    'signal_interval': 120,  # Generate signals every 2 minutes (scheduler 'interval')
+    'scheduler': 'bar_close',  # 'bar_close' (evaluate symbols as soon as a new bar opens) or 'interval'
+    'tick_poll_interval': 1.0,  # Seconds between tick polls right after a bar close
+    'bar_settle_timeout': 30.0,  # Stop polling for symbols that haven't ticked this long after a close
+    'indicator_mode': 'incremental',  # 'incremental', 'tail' (last two bars only), 'panel' (all symbols at once) or 'batch'
+    'bar_cache': True,  # Keep a ring buffer per symbol and only fetch new bars
+    'bar_store': None,  # Directory for persistent bar history (e.g. 'history'): restarts only fetch missed bars
+    'worker_threads': 4,  # Analyze symbols concurrently (0 = one after another)
+    'snapshot_max_age': 5.0,  # Refetch a cycle's tick before ordering if it is older than this (seconds)
+    'order_deviation': 20,  # Max slippage accepted by the broker (points)
+    'order_retries': 3,  # Re-price and resend this many times on requotes / price changes
+    'order_retry_delay': 0.05,  # Backoff step between retries (seconds)
+    'runtime': 'threads',  # 'threads' or 'asyncio' (MT5 calls on one thread, analysis overlapped with I/O)
+    'health_port': None,  # asyncio runtime: serve bot health as JSON over HTTP on this port (None = off)
+    'health_host': '127.0.0.1',
+    'journal_dir': 'signals/journal',  # Append-only signal history, one .jsonl per UTC day
+    'journal_compact': True,  # Compact finished days to .npz column arrays
+    'metrics': False,  # Time MT5 calls, cycle stages and order sends (near-zero cost when off)
+    'metrics_port': None,  # Serve the metrics in Prometheus text format at http://<host>:<port>/metrics
+    'metrics_host': '127.0.0.1',
+    'metrics_file': None,  # Or rewrite them to this file after every cycle (e.g. signals/metrics.prom)
     
     # Trading Hours (UTC)
     'trading_enabled': True,
     'check_market_hours': True,
     
     # Verbose mode - shows all analysis even when no signal
-    'verbose_mode': True
+    'verbose_mode': True,
+    
+    # Logging (written by a background thread, see bot_logging.py)
+    'log_file': 'trading_bot.log',
+    'log_level': 'INFO',
+    'log_json': False,  # JSON lines (with symbol/action/order fields) instead of plain text
+    'log_max_bytes': 50 * 2 ** 20,  # Rotate the file at this size...
+    'log_rotate_when': None,  # ...or on a schedule instead, e.g. 'midnight'
+    'log_backups': 5
+}
+
+configure_logging(CONFIG)
+
+# Points each scoring rule adds (see IMPROVEMENTS_V2.md for the breakdown)
+DEFAULT_SCORE_WEIGHTS = {
+    'rsi_extreme': 25,    # RSI < 30 / > 70
+    'rsi_moderate': 15,   # RSI < 40 / > 60
+    'macd_cross': 25,     # MACD crossover
+    'macd_side': 10,      # MACD above / below signal
+    'ema_trend': 15,      # Fast vs slow EMA
+    'bb_outside': 20,     # Price outside the bands
+    'bb_middle': 5,       # Price above / below the middle band
+    'stoch_extreme': 15,  # Stochastic < 20 / > 80
+    'volume': 10,         # High volume confirmation
+    'trend': 10,          # Close vs SMA 50 vs SMA 200
+    'htf_trend': 10       # Every trend_timeframes trend agrees (only scored when configured)
 }
 
+# ============================================================================
+# METRICS
+# ============================================================================
+
+MT5_CALL_SECONDS = METRICS.histogram('mt5_call_seconds', "MT5 terminal call latency", ('call', 'symbol'))
+ORDER_SEND_SECONDS = METRICS.histogram('order_send_seconds', "order_send round trip to the broker", ('symbol',))
+ORDERS = METRICS.counter('orders', "Orders sent, by symbol and result (retcode when rejected)", ('symbol', 'result'))
+ORDER_RETRIES = METRICS.counter('order_retries', "Order attempts retried, by symbol and retcode", ('symbol', 'retcode'))
+ORDER_LATENCY_SECONDS = METRICS.histogram('order_latency_seconds', "Order round trip including retries", ('symbol',))
+ORDER_SLIPPAGE_POINTS = METRICS.histogram('order_slippage_points', "Fill price vs first price tried (positive = worse)",
+                                          ('symbol',), buckets=(-20, -10, -5, -2, -1, 0, 1, 2, 5, 10, 20, 50, 100))
+STAGE_SECONDS = METRICS.histogram('stage_seconds', "Time spent per cycle stage", ('stage',))
+CYCLES = METRICS.counter('cycles', "Trading cycles started")
+SIGNALS = METRICS.counter('signals', "Actionable signals generated", ('action',))
+POSITION_UPDATES = METRICS.counter('position_updates', "Stop moves and partial closes sent, by kind and result",
+                                   ('kind', 'result'))
+
 # ============================================================================
 # MT5 CONNECTION
 # ============================================================================
 
+def select_terminal(name: str, options: Optional[Dict] = None):
+    """Point the module-level `mt5` at the MetaTrader5 terminal or the simulator"""
+    global mt5
+    if name == 'simulator':
+        mt5_simulator.configure(**(options or {}))
+        mt5 = mt5_simulator
+    elif MetaTrader5 is None:
+        raise RuntimeError("MetaTrader5 package is not installed (set CONFIG['terminal'] = 'simulator')")
+    else:
+        mt5 = MetaTrader5
+
+def timeframe_seconds(timeframe: int) -> int:
+    """Bar length in seconds for an MT5 TIMEFRAME_* constant"""
+    if timeframe & 0xC000 == 0x4000:  # H1..D1 encode hours
+        return (timeframe & 0x3FFF) * 3600
+    if timeframe & 0xC000 == 0x8000:  # W1
+        return 7 * 86400
+    if timeframe & 0xC000 == 0xC000:  # MN1 (nominal)
+        return 30 * 86400
+    return timeframe * 60
+
+
+class BarBuffer:
+    """Fixed-capacity ring buffer of MT5 rates for one (symbol, timeframe)
+
+    Every bar is stored twice (at i and i + capacity) so the newest n bars
+    are always one contiguous slice and can be handed out as a zero-copy view.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype):
+        self.capacity = capacity
+        self.data = np.zeros(capacity * 2, dtype=dtype)
+        self.head = 0  # next write position
+        self.count = 0
+
+    @property
+    def last_time(self) -> Optional[int]:
+        if self.count == 0:
+            return None
+        return int(self.data['time'][self.head - 1 + self.capacity])
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def append(self, rates: np.ndarray):
+        """Append bars (oldest first), evicting the oldest when full"""
+        rates = rates[-self.capacity:]
+        n = len(rates)
+        if n == 0:
+            return
+        first = min(n, self.capacity - self.head)
+        for offset in (0, self.capacity):
+            self.data[self.head + offset:self.head + offset + first] = rates[:first]
+            self.data[offset:offset + n - first] = rates[first:]
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def replace_last(self, bar):
+        """Overwrite the newest bar (the one still forming)"""
+        pos = (self.head - 1) % self.capacity
+        self.data[pos] = bar
+        self.data[pos + self.capacity] = bar
+
+    def merge(self, rates: np.ndarray) -> bool:
+        """Merge freshly fetched bars; False if they don't reach back to our last bar"""
+        last_time = self.last_time
+        if last_time is None:
+            self.append(rates)
+            return True
+        times = rates['time']
+        if times[0] > last_time:
+            return False
+        start = int(np.searchsorted(times, last_time, side='left'))
+        if start < len(rates) and times[start] == last_time:
+            self.replace_last(rates[start])
+            start += 1
+        self.append(rates[start:])
+        return True
+
+    def view(self, bars: int) -> np.ndarray:
+        """Read-only view of the newest `bars` bars, oldest first"""
+        bars = min(bars, self.count)
+        end = self.head + self.capacity
+        view = self.data[end - bars:end]
+        view.flags.writeable = False
+        return view
+
+
+def resample_rates(rates: np.ndarray, seconds: int) -> np.ndarray:
+    """Aggregate rates (oldest first) into bars of `seconds`, aligned to multiples of it"""
+    if len(rates) == 0:
+        return rates[:0].copy()
+    buckets = rates['time'] // seconds
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(rates)])) - 1
+    out = np.zeros(len(starts), dtype=rates.dtype)
+    out['time'] = buckets[starts] * seconds
+    out['open'] = rates['open'][starts]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['close'] = rates['close'][ends]
+    for field in ('tick_volume', 'real_volume'):
+        if field in rates.dtype.names:
+            out[field] = np.add.reduceat(rates[field], starts)
+    if 'spread' in rates.dtype.names:
+        out['spread'] = rates['spread'][ends]
+    return out
+
+
+class TimeframeResampler:
+    """Higher-timeframe bars derived from each symbol's base bars
+
+    Every update re-aggregates only the base bars from the open of the
+    newest higher bar onwards (it may still be forming) and merges them into
+    a BarBuffer per (symbol, timeframe), so higher timeframes never cost an
+    extra terminal request.  `trend_code` classifies each timeframe like
+    classify_trend, with fast/slow SMAs over the higher-timeframe closes.
+    """
+    
+    def __init__(self, timeframes: List[int], fast: int = 20, slow: int = 50):
+        self.seconds = {tf: timeframe_seconds(tf) for tf in timeframes}
+        self.fast = fast
+        self.slow = slow
+        self.capacity = slow + 1
+        self.buffers: Dict[Tuple[str, int], BarBuffer] = {}
+    
+    def history_bars(self, base_timeframe: int) -> int:
+        """Base bars needed to fill the slowest timeframe's SMA"""
+        longest = max(self.seconds.values())
+        return (self.capacity + 1) * longest // timeframe_seconds(base_timeframe)
+    
+    def update(self, symbol: str, rates: np.ndarray):
+        """Fold the latest base bars (oldest first) into every higher timeframe"""
+        if rates is None or len(rates) == 0:
+            return
+        times = rates['time']
+        for tf, seconds in self.seconds.items():
+            key = (symbol, tf)
+            buffer = self.buffers.get(key)
+            if buffer is not None and buffer.count and times[0] <= buffer.last_time:
+                start = int(np.searchsorted(times, buffer.last_time, side='left'))
+                if buffer.merge(resample_rates(rates[start:], seconds)):
+                    continue
+            # First update or a gap: rebuild, dropping a partial oldest bar
+            bars = resample_rates(rates, seconds)
+            if times[0] % seconds:
+                bars = bars[1:]
+            buffer = BarBuffer(self.capacity, rates.dtype)
+            buffer.append(bars)
+            self.buffers[key] = buffer
+    
+    def bars(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        buffer = self.buffers.get((symbol, timeframe))
+        return None if buffer is None else buffer.view(buffer.count)
+    
+    def trends(self, symbol: str) -> Dict[int, str]:
+        """classify_trend per timeframe that has enough bars"""
+        trends = {}
+        for tf in self.seconds:
+            bars = self.bars(symbol, tf)
+            if bars is None or len(bars) < self.slow:
+                continue
+            close = bars['close']
+            trends[tf] = TechnicalAnalyzer.classify_trend(
+                close[-1], close[-self.fast:].mean(), close[-self.slow:].mean()
+            )
+        return trends
+    
+    def trend_code(self, symbol: str) -> int:
+        """1 if every timeframe is in an uptrend, -1 if all are down, else 0"""
+        trends = self.trends(symbol)
+        if len(trends) < len(self.seconds):
+            return 0
+        codes = {TREND_CODES[t] for t in trends.values()}
+        return codes.pop() if len(codes) == 1 else 0
+
+
+class SymbolRegistry:
+    """symbol_info for the traded symbols, loaded once and refreshed lazily
+
+    Specs are read from the terminal at startup (`load`) and again only when
+    an entry is older than `max_age` seconds, so order placement and sizing
+    look them up in memory.
+    """
+    
+    def __init__(self, connection: 'MT5Connection', max_age: float = 3600):
+        self.connection = connection
+        self.max_age = max_age
+        self.specs: Dict[str, Tuple[float, object]] = {}
+    
+    def load(self, symbols: List[str]) -> List[str]:
+        """Fetch every symbol's spec; returns the symbols the terminal doesn't know"""
+        now = time.monotonic()
+        missing = []
+        with self.connection.io_lock:
+            for symbol in symbols:
+                info = self.connection.call('symbol_info', symbol)
+                if info is None:
+                    missing.append(symbol)
+                else:
+                    self.specs[symbol] = (now, info)
+        return missing
+    
+    def get(self, symbol: str):
+        """symbol_info for `symbol` (None if unknown)"""
+        cached = self.specs.get(symbol)
+        if cached is None or time.monotonic() - cached[0] > self.max_age:
+            if not self.connection.connected:
+                return cached[1] if cached else None
+            self.load([symbol])
+            cached = self.specs.get(symbol, cached)
+        return cached[1] if cached else None
+    
+    @staticmethod
+    def sizing(info) -> Dict[str, float]:
+        """The spec fields lots_for_risk needs"""
+        tick_value = getattr(info, 'trade_tick_value_loss', 0) or info.trade_tick_value
+        return {
+            'tick_value': tick_value,
+            'tick_size': info.trade_tick_size,
+            'volume_min': info.volume_min,
+            'volume_step': info.volume_step,
+            'volume_max': info.volume_max
+        }
+    
+    def sizing_arrays(self, symbols: List[str]) -> Dict[str, np.ndarray]:
+        """sizing() for many symbols as column arrays (NaN where unknown)"""
+        rows = [self.get(symbol) for symbol in symbols]
+        columns = ('tick_value', 'tick_size', 'volume_min', 'volume_step', 'volume_max')
+        arrays = {c: np.full(len(symbols), np.nan) for c in columns}
+        for i, info in enumerate(rows):
+            if info is not None:
+                for c, value in self.sizing(info).items():
+                    arrays[c][i] = value
+        return arrays
+
+
+class MarketSnapshot:
+    """Account, positions, ticks and symbol specs shared by one cycle
+
+    Account, positions and specs are fetched once at the start of the cycle;
+    a tick is fetched at most once per cycle, when a symbol first needs a
+    price, and again only if it is older than `max_age` seconds, so an order
+    never goes out on a price from long before it was sized.
+    """
+    
+    def __init__(self, connection: 'MT5Connection', account: Optional[Dict], positions: List[Dict],
+                 ticks: Dict, specs: Dict, max_age: float = 5.0, ticks_time: Optional[float] = None):
+        self.connection = connection
+        self.account = account
+        self.positions = positions
+        self.ticks = ticks
+        self.specs = specs
+        self.max_age = max_age
+        fetched = time.monotonic() if ticks_time is None else ticks_time
+        self.fetched = {symbol: fetched for symbol in ticks}
+    
+    def tick(self, symbol: str):
+        """Latest tick for `symbol`, refetched if older than the staleness budget"""
+        fetched = self.fetched.get(symbol)
+        if fetched is None or time.monotonic() - fetched > self.max_age:
+            tick = self.connection.get_ticks([symbol]).get(symbol)
+            if tick is not None:
+                self.ticks[symbol] = tick
+                self.fetched[symbol] = time.monotonic()
+        return self.ticks.get(symbol)
+    
+    def price(self, symbol: str, side: str) -> Optional[float]:
+        """Entry price for a market order: ask for buys, bid for sells"""
+        tick = self.tick(symbol)
+        if tick is None:
+            return None
+        return tick.ask if side == 'buy' else tick.bid
+    
+    def spec(self, symbol: str):
+        """symbol_info for `symbol`"""
+        if symbol not in self.specs:
+            self.specs[symbol] = self.connection.symbols.get(symbol)
+        return self.specs[symbol]
+
+
 class MT5Connection:
     """Handle MT5 connection and operations"""
     
-    def __init__(self, login: int, password: str, server: str):
+    # Bars re-requested on an incremental fetch (previous + forming bar)
+    DELTA_FETCH_BARS = 2
+    # Furthest a restart fetches back to close a hole in the bar store
+    BACKFILL_BARS = 100000
+    
+    def __init__(self, login: int, password: str, server: str, cache_bars: bool = False,
+                 store: Optional[BarStore] = None):
         self.login = login
         self.password = password
         self.server = server
         self.connected = False
+        self.cache_bars = cache_bars
+        self.store = store
+        self.bar_buffers: Dict[Tuple[str, int], BarBuffer] = {}
+        self.symbols = SymbolRegistry(self)
+        self.orders = OrderExecutor(self)
+        # The terminal bindings are not re-entrant: every mt5.* call from
+        # worker threads goes through this single I/O lane
+        self.io_lock = threading.RLock()
     
     def connect(self) -> bool:
         """Connect to MT5 terminal"""
@@ -96,12 +492,18 @@ class MT5Connection:
             self.connected = False
             logger.info("Disconnected from MT5")
     
+    def call(self, name: str, *args):
+        """mt5.<name>(*args), timed per call and symbol (the first str argument)"""
+        with MT5_CALL_SECONDS.time(name, args[0] if args and isinstance(args[0], str) else ''):
+            return getattr(mt5, name)(*args)
+    
     def get_account_info(self) -> Optional[Dict]:
         """Get account information"""
         if not self.connected:
             return None
         
-        info = mt5.account_info()
+        with self.io_lock:
+            info = self.call('account_info')
         if info is None:
             return None
         
@@ -119,21 +521,120 @@ class MT5Connection:
         if not self.connected:
             return None
         
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
+        if self.cache_bars:
+            rates = self.get_rates(symbol, timeframe, bars)
+        else:
+            with self.io_lock:
+                rates = self.call('copy_rates_from_pos', symbol, timeframe, 0, bars)
         if rates is None or len(rates) == 0:
-            logger.warning(f"No data for {symbol}")
+            logger.warning("No data for %s", symbol)
             return None
         
+        return self.rates_frame(rates)
+    
+    @staticmethod
+    def rates_frame(rates: np.ndarray) -> pd.DataFrame:
+        """DataFrame of MT5 rates with `time` as datetimes"""
         df = pd.DataFrame(rates)
         df['time'] = pd.to_datetime(df['time'], unit='s')
         return df
     
+    def get_rates(self, symbol: str, timeframe: int, bars: int) -> Optional[np.ndarray]:
+        """Get the newest bars as a zero-copy view of the per-symbol ring buffer
+
+        Only bars from the last stored one onwards are requested from the
+        terminal; the stored last bar is overwritten since it may still have
+        been forming when it was fetched.  With a BarStore the buffer starts
+        from the bars on disk (plus the few missed since) and every fetch is
+        written through to it.
+        """
+        if not self.connected:
+            return None
+        
+        with self.io_lock:
+            key = (symbol, timeframe)
+            buffer = self.bar_buffers.get(key)
+            if buffer is not None and buffer.capacity >= bars and buffer.count > 0:
+                count = self.DELTA_FETCH_BARS
+                while True:
+                    rates = self.call('copy_rates_from_pos', symbol, timeframe, 0, min(count, buffer.capacity))
+                    if rates is None or len(rates) == 0:
+                        logger.warning("No data for %s", symbol)
+                        return None
+                    if buffer.merge(rates):
+                        break
+                    if count >= buffer.capacity:
+                        # Missed more bars than the buffer holds - start over
+                        buffer.clear()
+                        buffer.append(rates)
+                        break
+                    count *= 4
+                self.store_bars(symbol, timeframe, rates)
+            else:
+                rates = self.stored_rates(symbol, timeframe, bars)
+                if rates is None:
+                    rates = self.call('copy_rates_from_pos', symbol, timeframe, 0, bars)
+                    if rates is None or len(rates) == 0:
+                        logger.warning("No data for %s", symbol)
+                        return None
+                    self.store_bars(symbol, timeframe, rates)
+                buffer = BarBuffer(bars, rates.dtype)
+                buffer.append(rates)
+                self.bar_buffers[key] = buffer
+        
+            return buffer.view(bars)
+    
+    def stored_rates(self, symbol: str, timeframe: int, bars: int) -> Optional[np.ndarray]:
+        """The newest `bars` bars from the store, after fetching the ones it missed
+
+        None if there is no store, it holds fewer bars, or it is further
+        behind than `bars` (the caller then fetches the whole window).
+        """
+        if self.store is None:
+            return None
+        series = self.store.series(symbol, timeframe_seconds(timeframe))
+        if series.count < bars:
+            return None
+        count = self.DELTA_FETCH_BARS
+        while True:
+            rates = self.call('copy_rates_from_pos', symbol, timeframe, 0, min(count, bars))
+            if rates is None or len(rates) == 0:
+                return None
+            if rates['time'][0] <= series.last_time:
+                break
+            if count >= bars:
+                return None
+            count *= 4
+        series.merge(rates)
+        return series.view(bars)
+    
+    def store_bars(self, symbol: str, timeframe: int, rates: np.ndarray):
+        """Write fetched bars through to the store
+
+        Bars that start past the last stored one are first fetched back to
+        it, so the store is left without a hole.
+        """
+        if self.store is not None:
+            try:
+                series = self.store.series(symbol, timeframe_seconds(timeframe))
+                count = len(rates)
+                while series.hole_before(rates['time'][0]) and count < self.BACKFILL_BARS:
+                    count = min(count * 4, self.BACKFILL_BARS)
+                    older = self.call('copy_rates_from_pos', symbol, timeframe, 0, count)
+                    if older is None or len(older) <= len(rates):
+                        break  # the terminal has no older history
+                    rates = older
+                series.merge(rates)
+            except (OSError, ValueError) as e:
+                logger.error("Bar store write failed for %s: %s", symbol, e)
+    
     def get_current_price(self, symbol: str) -> Optional[Dict]:
         """Get current bid/ask prices"""
         if not self.connected:
             return None
         
-        tick = mt5.symbol_info_tick(symbol)
+        with self.io_lock:
+            tick = self.call('symbol_info_tick', symbol)
         if tick is None:
             return None
         
@@ -143,52 +644,47 @@ class MT5Connection:
             'spread': tick.ask - tick.bid,
             'time': datetime.fromtimestamp(tick.time)
         }
-    
-    def place_order(self, symbol: str, order_type: str, volume: float, 
-                    sl: float = 0, tp: float = 0, comment: str = "") -> Optional[int]:
-        """Place a market order"""
+
+    def get_ticks(self, symbols: List[str]) -> Dict:
+        """Last tick per symbol in one pass over the terminal; symbols without a tick are left out"""
         if not self.connected:
-            return None
-        
-        # Get symbol info
-        symbol_info = mt5.symbol_info(symbol)
-        if symbol_info is None:
-            logger.error(f"Symbol {symbol} not found")
-            return None
-        
-        # Prepare request
-        price = mt5.symbol_info_tick(symbol).ask if order_type == 'buy' else mt5.symbol_info_tick(symbol).bid
-        
-        request = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": volume,
-            "type": mt5.ORDER_TYPE_BUY if order_type == 'buy' else mt5.ORDER_TYPE_SELL,
-            "price": price,
-            "sl": sl,
-            "tp": tp,
-            "deviation": 20,
-            "magic": 234000,
-            "comment": comment,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
-        }
-        
-        # Send order
-        result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.error(f"Order failed: {result.comment}")
-            return None
-        
-        logger.info(f"Order placed: {order_type.upper()} {volume} {symbol} @ {price:.5f}")
-        return result.order
+            return {}
+
+        ticks = {}
+        with self.io_lock:
+            for symbol in symbols:
+                tick = self.call('symbol_info_tick', symbol)
+                if tick is not None:
+                    ticks[symbol] = tick
+        return ticks
+
+    def snapshot(self, symbols: List[str], max_age: float = 5.0, ticks: Optional[Dict] = None,
+                 ticks_time: Optional[float] = None) -> 'MarketSnapshot':
+        """Account, positions and specs for one cycle, fetched back to back
+
+        `ticks` (e.g. from the scheduler's last poll, taken at monotonic time
+        `ticks_time`) are reused; other ticks are fetched when first needed.
+        """
+        with self.io_lock:
+            account = self.get_account_info()
+            positions = self.get_open_positions() if account is not None else []
+            specs = {symbol: self.symbols.get(symbol) for symbol in symbols}
+        return MarketSnapshot(self, account, positions, dict(ticks or {}), specs, max_age, ticks_time)
+
+    def place_order(self, symbol: str, order_type: str, volume: float, 
+                    sl: float = 0, tp: float = 0, comment: str = "",
+                    snapshot: Optional['MarketSnapshot'] = None) -> Optional[int]:
+        """Place a market order (price and symbol spec from `snapshot` when given)"""
+        fill = self.orders.send(symbol, order_type, volume, sl, tp, comment, snapshot)
+        return fill['order'] if fill else None
     
     def get_open_positions(self) -> List[Dict]:
         """Get all open positions"""
         if not self.connected:
             return []
         
-        positions = mt5.positions_get()
+        with self.io_lock:
+            positions = self.call('positions_get')
         if positions is None:
             return []
         
@@ -202,15 +698,242 @@ class MT5Connection:
                 'price_current': pos.price_current,
                 'profit': pos.profit,
                 'sl': pos.sl,
-                'tp': pos.tp
+                'tp': pos.tp,
+                'magic': getattr(pos, 'magic', 0)
             }
             for pos in positions
         ]
 
+# ============================================================================
+# ORDER EXECUTION
+# ============================================================================
+
+class OrderExecutor:
+    """Market orders with requote handling, filling-mode selection and fill stats
+
+    A requote or price change re-prices the order (keeping the SL/TP
+    distances) and retries up to `max_retries` times, waiting `retry_delay`
+    longer each time; an unsupported filling mode falls through to the next
+    one the symbol allows without using up a retry.  Each fill reports
+    its slippage against the first price tried and the round-trip time.
+
+    The terminal is still one I/O lane, but the lock is only held per
+    attempt, so orders submitted together (`submit_many`) overlap their
+    retry waits instead of queueing behind each other.
+    """
+    
+    # Retcodes worth retrying at a fresh price
+    REPRICE_RETCODES = (10004, 10020, 10021)  # REQUOTE, PRICE_CHANGED, PRICE_OFF
+    FILLED_RETCODES = (10009, 10010)  # DONE, DONE_PARTIAL
+    INVALID_FILL = 10030
+    # symbol_info.filling_mode flags (SYMBOL_FILLING_FOK = 1, SYMBOL_FILLING_IOC = 2)
+    FILLING_FLAGS = ((2, 'ORDER_FILLING_IOC'), (1, 'ORDER_FILLING_FOK'))
+    
+    def __init__(self, connection: 'MT5Connection', deviation: int = 20, max_retries: int = 3,
+                 retry_delay: float = 0.05, magic: int = 234000, workers: int = 4):
+        self.connection = connection
+        self.deviation = deviation
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.magic = magic
+        self.workers = workers
+        self.pool: Optional[ThreadPoolExecutor] = None
+    
+    def filling_modes(self, info) -> List[int]:
+        """Filling modes the symbol accepts, IOC first (RETURN if it names none)"""
+        flags = getattr(info, 'filling_mode', 0) or 0
+        modes = [getattr(mt5, name) for flag, name in self.FILLING_FLAGS if flags & flag]
+        return modes or [mt5.ORDER_FILLING_RETURN]
+    
+    def send(self, symbol: str, side: str, volume: float, sl: float = 0, tp: float = 0,
+             comment: str = "", snapshot: Optional['MarketSnapshot'] = None, position: int = 0) -> Optional[Dict]:
+        """Place a market order; returns the fill (order, price, slippage, latency) or None
+
+        With a `position` ticket the deal closes (part of) that position.
+        """
+        if not self.connection.connected:
+            return None
+        
+        started = time.perf_counter()
+        with self.connection.io_lock:
+            info = snapshot.spec(symbol) if snapshot is not None else self.connection.symbols.get(symbol)
+            if snapshot is not None:
+                price = snapshot.price(symbol, side)
+            else:
+                tick = self.connection.get_ticks([symbol]).get(symbol)
+                price = None if tick is None else (tick.ask if side == 'buy' else tick.bid)
+        if info is None:
+            logger.error("Symbol %s not found", symbol)
+            return None
+        if price is None:
+            logger.error("No price for %s", symbol)
+            return None
+        
+        requested = price
+        modes = self.filling_modes(info)
+        attempt = 0
+        requotes = 0
+        while True:
+            attempt += 1
+            request = {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "symbol": symbol,
+                "volume": volume,
+                "type": mt5.ORDER_TYPE_BUY if side == 'buy' else mt5.ORDER_TYPE_SELL,
+                "price": price,
+                "sl": sl,
+                "tp": tp,
+                "deviation": self.deviation,
+                "magic": self.magic,
+                "comment": comment,
+                "type_time": mt5.ORDER_TIME_GTC,
+                "type_filling": modes[0],
+            }
+            if position:
+                request["position"] = position
+            with self.connection.io_lock:
+                with ORDER_SEND_SECONDS.time(symbol):
+                    result = mt5.order_send(request)
+            
+            if result is None:
+                ORDERS.inc(symbol, 'error')
+                logger.error("Order failed: %s order_send returned None (%s)", symbol, mt5.last_error(),
+                             extra={'event': 'order_failed', 'symbol': symbol})
+                return None
+            if result.retcode in self.FILLED_RETCODES:
+                break
+            
+            if result.retcode == self.INVALID_FILL and len(modes) > 1:
+                # Not a requote: the next filling mode doesn't use up a retry
+                modes = modes[1:]
+                ORDER_RETRIES.inc(symbol, str(result.retcode))
+                logger.warning("Order retry: %s %s (retcode %s), retrying with filling mode %s", symbol,
+                               result.comment, result.retcode, modes[0],
+                               extra={'event': 'order_retry', 'symbol': symbol, 'retcode': result.retcode})
+                continue
+            
+            new_price = None
+            if result.retcode in self.REPRICE_RETCODES and requotes < self.max_retries:
+                new_price = self.reprice(symbol, side, result)
+            if new_price is None:
+                ORDERS.inc(symbol, str(result.retcode))
+                logger.error("Order failed: %s %s (retcode %s, attempt %d)", symbol, result.comment,
+                             result.retcode, attempt,
+                             extra={'event': 'order_failed', 'symbol': symbol, 'retcode': result.retcode})
+                return None
+            
+            requotes += 1
+            # Keep the stop distances from the new entry
+            shift = new_price - price
+            sl = sl + shift if sl else sl
+            tp = tp + shift if tp else tp
+            price = new_price
+            ORDER_RETRIES.inc(symbol, str(result.retcode))
+            logger.warning("Order retry %d/%d: %s %s (retcode %s), retrying at %.5f", requotes,
+                           self.max_retries, symbol, result.comment, result.retcode, price,
+                           extra={'event': 'order_retry', 'symbol': symbol, 'retcode': result.retcode})
+            time.sleep(self.retry_delay * requotes)
+        
+        latency = time.perf_counter() - started
+        fill_price = result.price or price
+        point = getattr(info, 'point', 0) or 1
+        # Positive = worse than the first price tried
+        slippage = (fill_price - requested if side == 'buy' else requested - fill_price) / point
+        ORDERS.inc(symbol, 'done')
+        ORDER_LATENCY_SECONDS.observe(latency, symbol)
+        ORDER_SLIPPAGE_POINTS.observe(slippage, symbol)
+        logger.info("Order placed: %s %s %s @ %.5f (slippage %+.1f pts, %.0fms, attempt %d)", side.upper(),
+                    result.volume or volume, symbol, fill_price, slippage, latency * 1000, attempt)
+        return {
+            'order': result.order,
+            'symbol': symbol,
+            'side': side,
+            'volume': result.volume or volume,
+            'price': fill_price,
+            'requested_price': requested,
+            'sl': sl,
+            'tp': tp,
+            'slippage_points': slippage,
+            'latency_ms': latency * 1000,
+            'attempts': attempt,
+            'retcode': result.retcode
+        }
+    
+    def reprice(self, symbol: str, side: str, result) -> Optional[float]:
+        """Price for the next attempt: the requote's bid/ask, else a fresh tick"""
+        price = result.ask if side == 'buy' else result.bid
+        if price:
+            return price
+        tick = self.connection.get_ticks([symbol]).get(symbol)
+        if tick is None:
+            return None
+        return tick.ask if side == 'buy' else tick.bid
+    
+    def submit_many(self, orders: List[Dict], snapshot: Optional['MarketSnapshot'] = None) -> List[Optional[Dict]]:
+        """send() each order (keyword dicts) concurrently, one symbol per worker; fills in order"""
+        if len(orders) <= 1 or self.workers <= 1:
+            return [self.send(snapshot=snapshot, **order) for order in orders]
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='order')
+        futures = [self.pool.submit(partial(self.send, snapshot=snapshot, **order)) for order in orders]
+        return [future.result() for future in futures]
+    
+    def modify(self, ticket: int, symbol: str, sl: float, tp: float) -> int:
+        """Move a position's SL/TP (TRADE_ACTION_SLTP); returns the retcode (0 if none)"""
+        request = {
+            "action": mt5.TRADE_ACTION_SLTP,
+            "symbol": symbol,
+            "position": ticket,
+            "sl": sl,
+            "tp": tp,
+            "magic": self.magic,
+        }
+        with self.connection.io_lock:
+            with ORDER_SEND_SECONDS.time(symbol):
+                result = mt5.order_send(request)
+        if result is None:
+            logger.error("SL/TP change failed: %s #%s order_send returned None (%s)", symbol, ticket,
+                         mt5.last_error())
+            return 0
+        if result.retcode not in self.FILLED_RETCODES:
+            logger.warning("SL/TP change failed: %s #%s %s (retcode %s)", symbol, ticket, result.comment,
+                           result.retcode)
+        return result.retcode
+    
+    def close_positions(self, positions: List[Dict], comment: str = "Close") -> List[Optional[Dict]]:
+        """Close positions (get_open_positions dicts) at market, concurrently"""
+        return self.submit_many([{
+            'symbol': p['symbol'],
+            'side': 'sell' if p['type'] == 'buy' else 'buy',
+            'volume': p['volume'],
+            'position': p['ticket'],
+            'comment': comment
+        } for p in positions])
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
 # ============================================================================
 # TECHNICAL ANALYSIS
 # ============================================================================
 
+def _tail_rolling(values: np.ndarray, window: int, func: str, count: int = 2) -> np.ndarray:
+    """Rolling reduction evaluated only at the last `count` bars (NaN if too short)"""
+    out = np.full(count, np.nan)
+    segment = values[max(0, len(values) - (window + count - 1)):]
+    if len(segment) < window:
+        return out
+    windows = sliding_window_view(segment, window)
+    if func == 'std':
+        result = windows.std(axis=-1, ddof=1)
+    else:
+        result = getattr(windows, func)(axis=-1)
+    out[count - len(result):] = result
+    return out
+
+
 class TechnicalAnalyzer:
     """Perform technical analysis on market data"""
     
@@ -261,6 +984,97 @@ class TechnicalAnalyzer:
         
         return df
     
+    @staticmethod
+    def calculate_tail_indicators(df) -> Tuple[Dict, Dict]:
+        """Evaluate the indicators at the last two bars only
+
+        Returns (prev, last) rows with the same keys as calculate_indicators,
+        without widening or mutating the caller's frame.  Only the EMA chain
+        walks the whole window; everything else reads a short tail slice.
+        """
+        close = np.asarray(df['close'], dtype=np.float64)
+        high = np.asarray(df['high'], dtype=np.float64)
+        low = np.asarray(df['low'], dtype=np.float64)
+        volume = np.asarray(df['tick_volume'], dtype=np.float64)
+        n = len(close)
+        rows = ({}, {})
+        
+        # Moving Averages / MACD (recursive, so walk every bar but keep no series)
+        ema_fast, ema_slow, ema_macd = EMAState(12), EMAState(26), EMAState(9)
+        for i, price in enumerate(close.tolist()):
+            fast = ema_fast.push(price)
+            slow = ema_slow.push(price)
+            signal = ema_macd.push(fast - slow)
+            if i >= n - 2:
+                row = rows[i - (n - 2)]
+                row['ema_fast'] = fast
+                row['ema_slow'] = slow
+                row['macd'] = fast - slow
+                row['macd_signal'] = signal
+                row['macd_hist'] = row['macd'] - signal
+        
+        sma_50 = _tail_rolling(close, 50, 'mean')
+        if n >= 200:
+            sma_200 = _tail_rolling(close, 200, 'mean')
+        else:
+            # Batch path uses a window spanning the whole frame
+            sma_200 = np.array([np.nan, close.mean()])
+        
+        # RSI (the first bar has no change and counts as zero)
+        tail = close[max(0, n - 16):]
+        delta = np.diff(tail)
+        if n <= 16:
+            delta = np.concatenate(([0.0], delta))
+        gain = _tail_rolling(np.where(delta > 0, delta, 0.0), 14, 'mean')
+        loss = _tail_rolling(np.where(delta < 0, -delta, 0.0), 14, 'mean')
+        
+        # Bollinger Bands
+        bb_middle = _tail_rolling(close, 20, 'mean')
+        bb_std = _tail_rolling(close, 20, 'std')
+        
+        # ATR (Average True Range)
+        start = max(0, n - 15)
+        if start > 0:
+            prev_close = close[start - 1:n - 1]
+        else:
+            prev_close = np.concatenate(([np.nan], close[:n - 1]))
+        h, l = high[start:], low[start:]
+        true_range = np.fmax(h - l, np.fmax(np.abs(h - prev_close), np.abs(l - prev_close)))
+        atr = _tail_rolling(true_range, 14, 'mean')
+        
+        # Volume analysis
+        volume_sma = _tail_rolling(volume, 20, 'mean')
+        
+        # Stochastic Oscillator (%D needs the last four %K values)
+        low_14 = _tail_rolling(low, 14, 'min', count=4)
+        high_14 = _tail_rolling(high, 14, 'max', count=4)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + gain / loss))
+            volume_ratio = volume[n - 2:] / volume_sma if n >= 2 else np.full(2, np.nan)
+            stoch_k = 100 * ((close[max(0, n - 4):] - low_14[4 - min(n, 4):]) /
+                             (high_14[4 - min(n, 4):] - low_14[4 - min(n, 4):]))
+        stoch_k = np.concatenate((np.full(4 - len(stoch_k), np.nan), stoch_k))
+        stoch_d = _tail_rolling(stoch_k, 3, 'mean')
+        
+        for j, row in enumerate(rows):
+            i = n - 2 + j
+            row['close'] = close[i]
+            row['high'] = high[i]
+            row['low'] = low[i]
+            row['tick_volume'] = volume[i]
+            row['sma_50'] = sma_50[j]
+            row['sma_200'] = sma_200[j]
+            row['rsi'] = rsi[j]
+            row['bb_middle'] = bb_middle[j]
+            row['bb_upper'] = bb_middle[j] + (bb_std[j] * 2)
+            row['bb_lower'] = bb_middle[j] - (bb_std[j] * 2)
+            row['atr'] = atr[j]
+            row['volume_sma'] = volume_sma[j]
+            row['volume_ratio'] = volume_ratio[j]
+            row['stoch_k'] = stoch_k[2 + j]
+            row['stoch_d'] = stoch_d[j]
+        return rows
+    
     @staticmethod
     def detect_trend(df: pd.DataFrame) -> str:
         """Detect market trend"""
@@ -270,7 +1084,12 @@ class TechnicalAnalyzer:
         last_close = df['close'].iloc[-1]
         sma_50 = df['sma_50'].iloc[-1]
         sma_200 = df['sma_200'].iloc[-1] if 'sma_200' in df.columns else sma_50
-        
+
+        return TechnicalAnalyzer.classify_trend(last_close, sma_50, sma_200)
+
+    @staticmethod
+    def classify_trend(last_close: float, sma_50: float, sma_200: float) -> str:
+        """Classify trend from the latest close and moving averages"""
         if last_close > sma_50 > sma_200:
             return 'uptrend'
         elif last_close < sma_50 < sma_200:
@@ -287,179 +1106,936 @@ class TechnicalAnalyzer:
         returns = df['close'].pct_change()
         volatility = returns.std() * np.sqrt(len(df))
         return volatility
+    
+    @staticmethod
+    def calculate_atr(rates, period: int = 14) -> float:
+        """Latest ATR (mean true range of the last `period` bars) from rates or a DataFrame"""
+        if rates is None or len(rates) <= period:
+            return np.nan
+        high, low, close = (np.asarray(rates[k][-period - 1:], dtype=np.float64) for k in ('high', 'low', 'close'))
+        prev_close = close[:-1]
+        true_range = np.fmax(high[1:] - low[1:], np.fmax(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+        return float(true_range.mean())
 
 # ============================================================================
-# SIGNAL GENERATOR - IMPROVED VERSION
+# PANEL INDICATORS
 # ============================================================================
 
-class SignalGenerator:
-    """Generate trading signals based on analysis"""
-    
-    def __init__(self, min_confidence: int = 60):
-        self.min_confidence = min_confidence
-    
-    def generate_signal(self, symbol: str, df: pd.DataFrame, verbose: bool = False) -> Optional[Dict]:
-        """Generate trading signal for a symbol"""
-        if df is None or len(df) < 50:
-            return None
-        
-        # Calculate indicators
-        df = TechnicalAnalyzer.calculate_indicators(df)
-        
-        # Get latest values
-        last = df.iloc[-1]
-        prev = df.iloc[-2]
-        
-        # Initialize signal
-        signal = {
-            'symbol': symbol,
-            'timestamp': datetime.now(),
-            'action': 'hold',
-            'confidence': 0,
-            'price': last['close'],
-            'indicators': {},
-            'reason': [],
-            'scores': {}
-        }
-        
-        # Collect indicator values
-        signal['indicators'] = {
-            'rsi': last['rsi'],
-            'macd': last['macd'],
-            'macd_signal': last['macd_signal'],
-            'ema_fast': last['ema_fast'],
-            'ema_slow': last['ema_slow'],
-            'atr': last['atr'],
-            'stoch_k': last['stoch_k'],
-            'stoch_d': last['stoch_d'],
-            'bb_upper': last['bb_upper'],
-            'bb_lower': last['bb_lower'],
-            'close': last['close']
-        }
-        
-        # Scoring system - MORE BALANCED
-        buy_score = 0
-        sell_score = 0
-        
-        # RSI signals (0-25 points)
-        if last['rsi'] < 30:
-            buy_score += 25
-            signal['reason'].append(f'RSI oversold ({last["rsi"]:.1f})')
-        elif last['rsi'] < 40:
-            buy_score += 15
-            signal['reason'].append(f'RSI low ({last["rsi"]:.1f})')
-        elif last['rsi'] > 70:
-            sell_score += 25
-            signal['reason'].append(f'RSI overbought ({last["rsi"]:.1f})')
-        elif last['rsi'] > 60:
-            sell_score += 15
-            signal['reason'].append(f'RSI high ({last["rsi"]:.1f})')
-        
-        # MACD signals (0-25 points)
-        if prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']:
-            buy_score += 25
-            signal['reason'].append('MACD bullish crossover')
-        elif prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']:
-            sell_score += 25
-            signal['reason'].append('MACD bearish crossover')
-        elif last['macd'] > last['macd_signal']:
-            buy_score += 10
-            signal['reason'].append('MACD above signal')
-        else:
-            sell_score += 10
-            signal['reason'].append('MACD below signal')
-        
-        # EMA trend (0-15 points)
-        if last['ema_fast'] > last['ema_slow']:
-            buy_score += 15
-            signal['reason'].append('EMA bullish')
-        else:
-            sell_score += 15
-            signal['reason'].append('EMA bearish')
-        
-        # Bollinger Bands (0-20 points)
-        if last['close'] < last['bb_lower']:
-            buy_score += 20
-            signal['reason'].append('Price below lower BB')
-        elif last['close'] > last['bb_upper']:
-            sell_score += 20
-            signal['reason'].append('Price above upper BB')
-        elif last['close'] < last['bb_middle']:
-            sell_score += 5
-            signal['reason'].append('Price below BB middle')
-        else:
-            buy_score += 5
-            signal['reason'].append('Price above BB middle')
-        
-        # Stochastic Oscillator (0-15 points)
-        if last['stoch_k'] < 20:
-            buy_score += 15
-            signal['reason'].append(f'Stochastic oversold ({last["stoch_k"]:.1f})')
-        elif last['stoch_k'] > 80:
-            sell_score += 15
-            signal['reason'].append(f'Stochastic overbought ({last["stoch_k"]:.1f})')
-        
-        # Volume confirmation (0-10 points)
-        if last['volume_ratio'] > 1.5:
-            if buy_score > sell_score:
-                buy_score += 10
-                signal['reason'].append(f'High volume ({last["volume_ratio"]:.1f}x)')
-            elif sell_score > buy_score:
-                sell_score += 10
-                signal['reason'].append(f'High volume ({last["volume_ratio"]:.1f}x)')
-        
-        # Trend detection (0-10 points)
-        trend = TechnicalAnalyzer.detect_trend(df)
-        if trend == 'uptrend':
-            buy_score += 10
-            signal['reason'].append('Uptrend detected')
-        elif trend == 'downtrend':
-            sell_score += 10
-            signal['reason'].append('Downtrend detected')
-        
-        # Store scores for analysis
-        signal['scores'] = {
-            'buy_score': buy_score,
-            'sell_score': sell_score
-        }
-        
-        # Determine action and confidence
-        if buy_score > sell_score:
-            signal['action'] = 'buy' if buy_score >= self.min_confidence else 'hold'
-            signal['confidence'] = min(buy_score, 100)
-        elif sell_score > buy_score:
-            signal['action'] = 'sell' if sell_score >= self.min_confidence else 'hold'
-            signal['confidence'] = min(sell_score, 100)
+def _rolling(values: np.ndarray, window: int, func: str) -> np.ndarray:
+    """Trailing rolling reduction along the bar axis of a 2-D panel
+
+    The first window - 1 bars are NaN, as with pandas rolling().
+    """
+    out = np.full(values.shape, np.nan)
+    if window <= values.shape[1]:
+        windows = sliding_window_view(values, window, axis=1)
+        if func == 'std':
+            out[:, window - 1:] = windows.std(axis=-1, ddof=1)
         else:
-            signal['action'] = 'hold'
-            signal['confidence'] = max(buy_score, sell_score)
-        
-        # Verbose logging
-        if verbose:
-            logger.info(f"  {symbol}: BUY={buy_score} SELL={sell_score} -> {signal['action'].upper()} ({signal['confidence']}%)")
-            if signal['action'] == 'hold' and (buy_score > 40 or sell_score > 40):
-                logger.info(f"    Close to signal! Reasons: {', '.join(signal['reason'][:3])}")
-        
-        return signal
+            out[:, window - 1:] = getattr(windows, func)(axis=-1)
+    return out
+
+
+def _ema_panel(values: np.ndarray, span: int) -> np.ndarray:
+    """Row-wise ewm(span, adjust=False).mean() over a 2-D panel
+
+    Leading NaNs (padding) stay NaN and each row is seeded at its first value.
+    """
+    alpha = 2.0 / (span + 1.0)
+    old_wt_factor = 1.0 - alpha
+    out = np.empty(values.shape)
+    out[:, 0] = values[:, 0]
+    for i in range(1, values.shape[1]):
+        weighted = old_wt_factor * out[:, i - 1] + alpha * values[:, i]
+        out[:, i] = np.where(np.isnan(out[:, i - 1]), values[:, i], weighted / (old_wt_factor + alpha))
+    return out
+
+
+class PanelAnalyzer:
+    """Compute every indicator for many symbols in one vectorized pass
+
+    Prices are stacked into aligned (symbols x bars) arrays; each symbol keeps
+    its own newest bars, right-aligned, so forex and crypto rows line up by
+    position rather than by timestamp.  Shorter histories are NaN-padded at
+    the front, so every row gets the same values as the per-symbol path.
+    """
+
+    @staticmethod
+    def stack(frames: List, bars: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Stack the newest bars of each DataFrame / rates array into a panel"""
+        length = max(len(f) for f in frames)
+        if bars is not None:
+            length = min(length, bars)
+        panel = {}
+        for column in ('close', 'high', 'low', 'tick_volume'):
+            values = np.full((len(frames), length), np.nan)
+            for i, f in enumerate(frames):
+                column_values = np.asarray(f[column], dtype=np.float64)[-length:]
+                values[i, length - len(column_values):] = column_values
+            panel[column] = values
+        return panel
+
+    @staticmethod
+    def calculate_indicators(panel: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Same columns as TechnicalAnalyzer.calculate_indicators, one row per symbol"""
+        close = panel['close']
+        high = panel['high']
+        low = panel['low']
+        volume = panel['tick_volume']
+        padding = np.isnan(close)
+        lengths = close.shape[1] - padding.sum(axis=1)
+        ind = dict(panel)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Moving Averages
+            ind['ema_fast'] = _ema_panel(close, 12)
+            ind['ema_slow'] = _ema_panel(close, 26)
+            ind['sma_50'] = _rolling(close, 50, 'mean')
+            # Each symbol falls back to a window spanning its own history
+            ind['sma_200'] = np.full(close.shape, np.nan)
+            for length in np.unique(np.minimum(lengths, 200)):
+                rows = np.minimum(lengths, 200) == length
+                ind['sma_200'][rows] = _rolling(close[rows], int(length), 'mean')
+
+            # RSI
+            delta = np.full(close.shape, np.nan)
+            delta[:, 1:] = np.diff(close, axis=1)
+            gain = _rolling(np.where(padding, np.nan, np.where(delta > 0, delta, 0.0)), 14, 'mean')
+            loss = _rolling(np.where(padding, np.nan, np.where(delta < 0, -delta, 0.0)), 14, 'mean')
+            ind['rsi'] = 100 - (100 / (1 + gain / loss))
+
+            # MACD
+            ind['macd'] = ind['ema_fast'] - ind['ema_slow']
+            ind['macd_signal'] = _ema_panel(ind['macd'], 9)
+            ind['macd_hist'] = ind['macd'] - ind['macd_signal']
+
+            # Bollinger Bands
+            ind['bb_middle'] = _rolling(close, 20, 'mean')
+            bb_std = _rolling(close, 20, 'std')
+            ind['bb_upper'] = ind['bb_middle'] + (bb_std * 2)
+            ind['bb_lower'] = ind['bb_middle'] - (bb_std * 2)
+
+            # ATR (Average True Range)
+            prev_close = np.full(close.shape, np.nan)
+            prev_close[:, 1:] = close[:, :-1]
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+            ind['atr'] = _rolling(true_range, 14, 'mean')
+
+            # Volume analysis
+            ind['volume_sma'] = _rolling(volume, 20, 'mean')
+            ind['volume_ratio'] = volume / ind['volume_sma']
+
+            # Stochastic Oscillator
+            low_14 = _rolling(low, 14, 'min')
+            high_14 = _rolling(high, 14, 'max')
+            ind['stoch_k'] = 100 * ((close - low_14) / (high_14 - low_14))
+            ind['stoch_d'] = _rolling(ind['stoch_k'], 3, 'mean')
+
+        return ind
+
+    @staticmethod
+    def row(ind: Dict[str, np.ndarray], symbol_index: int, bar_index: int) -> Dict:
+        """One symbol's values at one bar, keyed like a calculate_indicators row"""
+        return {name: values[symbol_index, bar_index] for name, values in ind.items()}
 
 # ============================================================================
-# RISK MANAGER
+# INCREMENTAL INDICATORS
 # ============================================================================
 
-class RiskManager:
-    """Manage trading risk"""
-    
-    def __init__(self, risk_per_trade: float, max_daily_loss: float, max_open_trades: int):
-        self.risk_per_trade = risk_per_trade
+def bar_times(bars) -> np.ndarray:
+    """Bar open times as int64 epoch seconds (DataFrame or MT5 rates array)"""
+    times = np.asarray(bars['time'])
+    if times.dtype.kind == 'M':
+        return times.astype('datetime64[s]').astype(np.int64)
+    return times.astype(np.int64)
+
+
+def _divide(num: float, den: float) -> float:
+    """Float division with pandas semantics (x/0 -> +/-inf, 0/0 -> nan)"""
+    if den == 0:
+        if num == 0 or num != num:
+            return np.nan
+        return np.inf if (num > 0) == (np.copysign(1.0, den) > 0) else -np.inf
+    return num / den
+
+
+class EMAState:
+    """Exponential moving average, same recursion as ewm(span, adjust=False)"""
+
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1.0)
+        self.old_wt_factor = 1.0 - self.alpha
+        self.value = np.nan
+
+    def push(self, x: float) -> float:
+        if self.value != self.value:
+            self.value = x
+        elif x == x:
+            weighted = self.old_wt_factor * self.value + self.alpha * x
+            self.value = weighted / (self.old_wt_factor + self.alpha)
+        return self.value
+
+    def save(self):
+        return self.value
+
+    def restore(self, state):
+        self.value = state
+
+
+class RollingStats:
+    """Fixed-window running mean/variance with O(1) add/remove updates
+
+    Mirrors the compensated (Kahan) running sums pandas uses for
+    rolling().mean() and rolling().std(), so a stream of pushes yields the
+    same values as the batch computation over the same bars.
+    """
+
+    def __init__(self, window: int, track_var: bool = False):
+        self.window = window
+        self.track_var = track_var
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.comp_var_add = 0.0
+        self.comp_var_remove = 0.0
+        self.same_run = 0
+        self.prev_value = np.nan
+
+    def push(self, x: float):
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(x)
+        self._add(x)
+
+    def _add(self, x: float):
+        if x != x:
+            return
+        self.nobs += 1
+        y = x - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if x == self.prev_value:
+            self.same_run += 1
+        else:
+            self.same_run = 1
+        self.prev_value = x
+        if self.track_var:
+            prev_mean = self.mean_x - self.comp_var_add
+            y = x - self.comp_var_add
+            t = y - self.mean_x
+            self.comp_var_add = t + self.mean_x - y
+            self.mean_x = self.mean_x + t / self.nobs
+            self.ssqdm_x += (x - prev_mean) * (x - self.mean_x)
+            if self.same_run >= self.nobs:
+                # Flat window - drop accumulated rounding like pandas does
+                self.mean_x = x
+                self.ssqdm_x = 0.0
+
+    def _remove(self, x: float):
+        if x != x:
+            return
+        self.nobs -= 1
+        y = -x - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if self.track_var:
+            if self.nobs:
+                prev_mean = self.mean_x - self.comp_var_remove
+                y = x - self.comp_var_remove
+                t = y - self.mean_x
+                self.comp_var_remove = t + self.mean_x - y
+                self.mean_x = self.mean_x - t / self.nobs
+                self.ssqdm_x -= (x - prev_mean) * (x - self.mean_x)
+            else:
+                self.mean_x = 0.0
+                self.ssqdm_x = 0.0
+
+    def mean(self) -> float:
+        if self.nobs < self.window:
+            return np.nan
+        if self.same_run >= self.nobs:
+            return self.prev_value
+        return self.sum_x / self.nobs
+
+    def std(self) -> float:
+        if self.nobs < self.window or self.nobs < 2:
+            return np.nan
+        if self.same_run >= self.nobs:
+            return 0.0
+        return np.sqrt(max(self.ssqdm_x / (self.nobs - 1), 0.0))
+
+    def save(self):
+        return (deque(self.values), self.nobs, self.sum_x, self.comp_add, self.comp_remove,
+                self.mean_x, self.ssqdm_x, self.comp_var_add, self.comp_var_remove,
+                self.same_run, self.prev_value)
+
+    def restore(self, state):
+        (self.values, self.nobs, self.sum_x, self.comp_add, self.comp_remove,
+         self.mean_x, self.ssqdm_x, self.comp_var_add, self.comp_var_remove,
+         self.same_run, self.prev_value) = state
+
+
+class RollingExtreme:
+    """Fixed-window rolling min or max using a monotonic deque"""
+
+    def __init__(self, window: int, mode: str = 'max'):
+        self.window = window
+        self.is_max = mode == 'max'
+        self.candidates = deque()  # (index, value), monotonic
+        self.count = 0
+
+    def push(self, x: float) -> float:
+        candidates = self.candidates
+        if self.is_max:
+            while candidates and candidates[-1][1] <= x:
+                candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= x:
+                candidates.pop()
+        candidates.append((self.count, x))
+        self.count += 1
+        if candidates[0][0] <= self.count - 1 - self.window:
+            candidates.popleft()
+        return candidates[0][1] if self.count >= self.window else np.nan
+
+    def save(self):
+        return (deque(self.candidates), self.count)
+
+    def restore(self, state):
+        self.candidates, self.count = state
+
+
+class IndicatorEngine:
+    """Stateful per-symbol indicator engine
+
+    Keeps EMA state, running window sums and rolling min/max deques, and only
+    consumes bars appended since the previous call.  The values equal
+    TechnicalAnalyzer.calculate_indicators run over the bars passed to
+    `update`: the EMAs run over every bar consumed, and are shifted onto the
+    batch path's seed (the window's first close) in closed form from the
+    values stored at that bar.  The still-forming last bar is evaluated on a
+    scratch copy of the state and only committed once a newer bar shows up.
+    """
+
+    COLUMNS = (
+        'ema_fast', 'ema_slow', 'sma_50', 'sma_200', 'rsi', 'macd', 'macd_signal',
+        'macd_hist', 'bb_middle', 'bb_upper', 'bb_lower', 'atr', 'volume_sma',
+        'volume_ratio', 'stoch_k', 'stoch_d'
+    )
+
+    def __init__(self, long_window: int = 200):
+        self.long_window = long_window
+        self.reset()
+
+    def reset(self):
+        """Drop all state (next update reseeds from the supplied bars)"""
+        self.ema_fast = EMAState(12)
+        self.ema_slow = EMAState(26)
+        self.ema_macd = EMAState(9)
+        self.sma_50 = RollingStats(50)
+        self.sma_long = RollingStats(self.long_window)
+        self.gain = RollingStats(14)
+        self.loss = RollingStats(14)
+        self.bb = RollingStats(20, track_var=True)
+        self.true_range = RollingStats(14)
+        self.volume = RollingStats(20)
+        self.low_14 = RollingExtreme(14, 'min')
+        self.high_14 = RollingExtreme(14, 'max')
+        self.stoch = RollingStats(3)
+        self.prev_close = np.nan
+        self.bars_seen = 0
+        self.last_time = None
+        self.rows = deque(maxlen=2)
+        self.ema_history = deque()  # (time, close, ema_fast, ema_slow, macd_signal) per committed bar
+
+    def _state(self) -> List:
+        return [self.ema_fast, self.ema_slow, self.ema_macd, self.sma_50, self.sma_long,
+                self.gain, self.loss, self.bb, self.true_range, self.volume,
+                self.low_14, self.high_14, self.stoch]
+
+    def _save(self):
+        return [s.save() for s in self._state()], self.prev_close, self.bars_seen
+
+    def _restore(self, saved):
+        states, self.prev_close, self.bars_seen = saved
+        for s, state in zip(self._state(), states):
+            s.restore(state)
+
+    def _step(self, close: float, high: float, low: float, volume: float) -> Dict:
+        """Advance every indicator by one bar and return the row values"""
+        prev_close = self.prev_close
+        self.prev_close = close
+        self.bars_seen += 1
+
+        ema_fast = self.ema_fast.push(close)
+        ema_slow = self.ema_slow.push(close)
+        macd = ema_fast - ema_slow
+        macd_signal = self.ema_macd.push(macd)
+
+        self.sma_50.push(close)
+        self.sma_long.push(close)
+        if self.bars_seen < self.long_window:
+            # Batch path falls back to a window spanning the whole frame
+            sma_200 = self.sma_long.sum_x / self.sma_long.nobs
+        else:
+            sma_200 = self.sma_long.mean()
+
+        delta = close - prev_close
+        self.gain.push(delta if delta > 0 else 0.0)
+        self.loss.push(-delta if delta < 0 else 0.0)
+        rs = _divide(self.gain.mean(), self.loss.mean())
+        rsi = 100 - (100 / (1 + rs))
+
+        self.bb.push(close)
+        bb_middle = self.bb.mean()
+        bb_std = self.bb.std()
+
+        if prev_close != prev_close:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.true_range.push(true_range)
+
+        self.volume.push(volume)
+        volume_sma = self.volume.mean()
+
+        low_14 = self.low_14.push(low)
+        high_14 = self.high_14.push(high)
+        stoch_k = 100 * _divide(close - low_14, high_14 - low_14)
+        self.stoch.push(stoch_k)
+
+        return {
+            'close': close,
+            'high': high,
+            'low': low,
+            'tick_volume': volume,
+            'ema_fast': ema_fast,
+            'ema_slow': ema_slow,
+            'sma_50': self.sma_50.mean(),
+            'sma_200': sma_200,
+            'rsi': rsi,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_hist': macd - macd_signal,
+            'bb_middle': bb_middle,
+            'bb_upper': bb_middle + (bb_std * 2),
+            'bb_lower': bb_middle - (bb_std * 2),
+            'atr': self.true_range.mean(),
+            'volume_sma': volume_sma,
+            'volume_ratio': _divide(volume, volume_sma),
+            'stoch_k': stoch_k,
+            'stoch_d': self.stoch.mean()
+        }
+
+    def update(self, bars, forming: bool = True) -> Optional[Tuple[Dict, Dict]]:
+        """Consume new bars and return the (prev, last) indicator rows
+
+        `bars` is a DataFrame or MT5 rates array ordered oldest first.  When
+        `forming` is set the final bar is treated as still open.  If the
+        window no longer overlaps the bars already consumed the engine reseeds.
+        """
+        times = bar_times(bars)
+        if len(times) == 0:
+            return None
+
+        if self.last_time is None:
+            start = 0
+        elif times[0] > self.last_time or times[-1] < self.last_time:
+            # Gap or history rewind - the running state no longer lines up
+            self.reset()
+            start = 0
+        else:
+            start = int(np.searchsorted(times, self.last_time, side='right'))
+
+        end = len(times) - 1 if forming else len(times)
+        if start < len(times):
+            closes = np.asarray(bars['close'], dtype=np.float64)[start:].tolist()
+            highs = np.asarray(bars['high'], dtype=np.float64)[start:].tolist()
+            lows = np.asarray(bars['low'], dtype=np.float64)[start:].tolist()
+            volumes = np.asarray(bars['tick_volume'], dtype=np.float64)[start:].tolist()
+
+        for i in range(start, end):
+            j = i - start
+            row = self._step(closes[j], highs[j], lows[j], volumes[j])
+            row['time'] = int(times[i])
+            self.rows.append(row)
+            self.ema_history.append((row['time'], row['close'], row['ema_fast'], row['ema_slow'],
+                                     row['macd_signal']))
+            self.last_time = int(times[i])
+
+        rows = list(self.rows)
+        if forming and start <= end:
+            saved = self._save()
+            j = end - start
+            row = self._step(closes[j], highs[j], lows[j], volumes[j])
+            row['time'] = int(times[end])
+            self._restore(saved)
+            rows.append(row)
+
+        if len(rows) < 2:
+            return None
+        rows = [dict(row) for row in rows[-2:]]
+        history = self.ema_history
+        while history and history[0][0] < times[0]:
+            history.popleft()
+        if history and history[0][0] == times[0]:
+            for row in rows:
+                self._reseed(row, history[0], int(np.searchsorted(times, row['time'])))
+        if len(times) <= self.long_window:
+            # No full long window ends before the frame's last bar
+            rows[0]['sma_200'] = np.nan
+            if len(times) < self.long_window:
+                # Batch path uses one window spanning the whole frame
+                rows[1]['sma_200'] = float(np.mean(bars['close']))
+        return rows[0], rows[1]
+
+    def _reseed(self, row: Dict, seed: Tuple, n: int):
+        """Shift `row`'s EMAs onto a seed at the window's first bar, `n` bars before it
+
+        The EMAs are linear, so the batch and stream values differ by the
+        seed difference at that bar decayed by (1 - alpha) per bar; the
+        signal line (seeded at MACD 0 there) follows the sum of two such
+        geometric sequences.
+        """
+        _, close, fast, slow, signal = seed
+        qf = self.ema_fast.old_wt_factor
+        qs = self.ema_slow.old_wt_factor
+        qm = self.ema_macd.old_wt_factor
+        fast_gap, slow_gap = close - fast, close - slow
+        fast_shift = qf ** n * fast_gap
+        slow_shift = qs ** n * slow_gap
+        signal_shift = qm ** n * -signal + self.ema_macd.alpha * (
+            fast_gap * qf * (qf ** n - qm ** n) / (qf - qm)
+            - slow_gap * qs * (qs ** n - qm ** n) / (qs - qm)
+        )
+        row['ema_fast'] += fast_shift
+        row['ema_slow'] += slow_shift
+        row['macd'] = row['ema_fast'] - row['ema_slow']
+        row['macd_signal'] += signal_shift
+        row['macd_hist'] = row['macd'] - row['macd_signal']
+
+# ============================================================================
+# SCORING RULES
+# ============================================================================
+
+TREND_CODES = {'uptrend': 1, 'neutral': 0, 'downtrend': -1}
+
+
+def trend_codes(close: np.ndarray, sma_50: np.ndarray, sma_200: np.ndarray) -> np.ndarray:
+    """classify_trend over whole series: 1 uptrend, -1 downtrend, 0 neutral"""
+    return np.where((close > sma_50) & (sma_50 > sma_200), 1,
+                    np.where((close < sma_50) & (sma_50 < sma_200), -1, 0))
+
+
+def _previous(values: np.ndarray) -> np.ndarray:
+    """Value of the bar before each bar (NaN for the first one)"""
+    return np.concatenate(([np.nan], values[:-1]))
+
+
+class ScoringRule:
+    """One scoring rule evaluated over whole indicator series
+
+    `classify` maps every bar to an outcome code: 0 scores nothing, code k
+    adds points(w)[k - 1] as (buy, sell) points and reasons[k - 1] (formatted
+    with the bar's indicator values) to the signal.  `buy` and `sell` hold
+    the scores of the rules evaluated before this one.
+    """
+    
+    name = ''
+    inputs: Tuple[str, ...] = ()
+    reasons: Tuple[str, ...] = ()
+    
+    def classify(self, ind: Dict[str, np.ndarray], buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+    
+    def points(self, w: Dict) -> List[Tuple[float, float]]:
+        raise NotImplementedError
+    
+    def reason(self, code: int, values) -> Optional[str]:
+        """Reason text for one bar's outcome code"""
+        return self.reasons[code - 1].format_map(values) if code else None
+
+
+class RSIRule(ScoringRule):
+    name = 'rsi'
+    inputs = ('rsi',)
+    reasons = ('RSI oversold ({rsi:.1f})', 'RSI low ({rsi:.1f})',
+               'RSI overbought ({rsi:.1f})', 'RSI high ({rsi:.1f})')
+    
+    def classify(self, ind, buy, sell):
+        rsi = ind['rsi']
+        return np.select([rsi < 30, rsi < 40, rsi > 70, rsi > 60], [1, 2, 3, 4], 0)
+    
+    def points(self, w):
+        return [(w['rsi_extreme'], 0), (w['rsi_moderate'], 0),
+                (0, w['rsi_extreme']), (0, w['rsi_moderate'])]
+
+
+class MACDRule(ScoringRule):
+    name = 'macd'
+    inputs = ('macd', 'macd_signal')
+    reasons = ('MACD bullish crossover', 'MACD bearish crossover',
+               'MACD above signal', 'MACD below signal')
+    
+    def classify(self, ind, buy, sell):
+        macd = ind['macd']
+        macd_signal = ind['macd_signal']
+        prev_macd = _previous(macd)
+        prev_macd_signal = _previous(macd_signal)
+        return np.select([
+            (prev_macd < prev_macd_signal) & (macd > macd_signal),
+            (prev_macd > prev_macd_signal) & (macd < macd_signal),
+            macd > macd_signal
+        ], [1, 2, 3], 4)
+    
+    def points(self, w):
+        return [(w['macd_cross'], 0), (0, w['macd_cross']),
+                (w['macd_side'], 0), (0, w['macd_side'])]
+
+
+class EMATrendRule(ScoringRule):
+    name = 'ema_trend'
+    inputs = ('ema_fast', 'ema_slow')
+    reasons = ('EMA bullish', 'EMA bearish')
+    
+    def classify(self, ind, buy, sell):
+        return np.where(ind['ema_fast'] > ind['ema_slow'], 1, 2)
+    
+    def points(self, w):
+        return [(w['ema_trend'], 0), (0, w['ema_trend'])]
+
+
+class BollingerRule(ScoringRule):
+    name = 'bollinger'
+    inputs = ('close', 'bb_upper', 'bb_middle', 'bb_lower')
+    reasons = ('Price below lower BB', 'Price above upper BB',
+               'Price below BB middle', 'Price above BB middle')
+    
+    def classify(self, ind, buy, sell):
+        close = ind['close']
+        return np.select([close < ind['bb_lower'], close > ind['bb_upper'],
+                          close < ind['bb_middle']], [1, 2, 3], 4)
+    
+    def points(self, w):
+        return [(w['bb_outside'], 0), (0, w['bb_outside']),
+                (0, w['bb_middle']), (w['bb_middle'], 0)]
+
+
+class StochasticRule(ScoringRule):
+    name = 'stochastic'
+    inputs = ('stoch_k',)
+    reasons = ('Stochastic oversold ({stoch_k:.1f})', 'Stochastic overbought ({stoch_k:.1f})')
+    
+    def classify(self, ind, buy, sell):
+        stoch_k = ind['stoch_k']
+        return np.select([stoch_k < 20, stoch_k > 80], [1, 2], 0)
+    
+    def points(self, w):
+        return [(w['stoch_extreme'], 0), (0, w['stoch_extreme'])]
+
+
+class VolumeRule(ScoringRule):
+    """Confirms whichever side is ahead after the preceding rules"""
+    name = 'volume'
+    inputs = ('volume_ratio',)
+    reasons = ('High volume ({volume_ratio:.1f}x)', 'High volume ({volume_ratio:.1f}x)')
+    
+    def classify(self, ind, buy, sell):
+        high_volume = ind['volume_ratio'] > 1.5
+        return np.select([high_volume & (buy > sell), high_volume & (sell > buy)], [1, 2], 0)
+    
+    def points(self, w):
+        return [(w['volume'], 0), (0, w['volume'])]
+
+
+class TrendRule(ScoringRule):
+    """Uses the 'trend' codes from trend_codes (or the caller's trend label)"""
+    name = 'trend'
+    inputs = ('trend',)
+    reasons = ('Uptrend detected', 'Downtrend detected')
+    
+    def classify(self, ind, buy, sell):
+        trend = ind['trend']
+        return np.select([trend > 0, trend < 0], [1, 2], 0)
+    
+    def points(self, w):
+        return [(w['trend'], 0), (0, w['trend'])]
+
+
+class HigherTimeframeRule(ScoringRule):
+    """Uses the 'htf_trend' code from TimeframeResampler.trend_code"""
+    name = 'htf_trend'
+    inputs = ('htf_trend',)
+    reasons = ('Higher timeframes in uptrend', 'Higher timeframes in downtrend')
+    
+    def classify(self, ind, buy, sell):
+        htf_trend = ind['htf_trend']
+        return np.select([htf_trend > 0, htf_trend < 0], [1, 2], 0)
+    
+    def points(self, w):
+        return [(w['htf_trend'], 0), (0, w['htf_trend'])]
+
+
+# Evaluated in order; append a ScoringRule (or pass `rules=` to SignalGenerator) to extend
+SCORING_RULES: List[ScoringRule] = [
+    RSIRule(), MACDRule(), EMATrendRule(), BollingerRule(),
+    StochasticRule(), VolumeRule(), TrendRule()
+]
+
+# ============================================================================
+# SIGNAL GENERATOR - IMPROVED VERSION
+# ============================================================================
+
+class SignalGenerator:
+    """Generate trading signals based on analysis"""
+    
+    def __init__(self, min_confidence: int = 60, weights: Optional[Dict[str, int]] = None,
+                 rules: Optional[List[ScoringRule]] = None):
+        self.min_confidence = min_confidence
+        self.weights = dict(DEFAULT_SCORE_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self.rules = list(SCORING_RULES if rules is None else rules)
+        self.inputs = tuple(dict.fromkeys(c for rule in self.rules for c in rule.inputs))
+    
+    def generate_signal(self, symbol: str, df: pd.DataFrame, verbose: bool = False,
+                        engine: Optional[IndicatorEngine] = None,
+                        tail_only: bool = False, context: Optional[Dict[str, float]] = None) -> Optional[Dict]:
+        """Generate trading signal for a symbol
+
+        With an IndicatorEngine only the bars appended since the last call are
+        processed; with `tail_only` just the last two values of each indicator
+        are evaluated; otherwise every indicator is rebuilt over the whole frame.
+        `context` holds extra rule inputs that aren't bar indicators (htf_trend).
+        """
+        if df is None or len(df) < 50:
+            return None
+        
+        with STAGE_SECONDS.time('indicators'):
+            if engine is not None:
+                rows = engine.update(df)
+                if rows is None:
+                    return None
+                prev, last = rows
+                if engine.bars_seen < 50:
+                    trend = 'neutral'
+                else:
+                    trend = TechnicalAnalyzer.classify_trend(last['close'], last['sma_50'], last['sma_200'])
+            elif tail_only:
+                prev, last = TechnicalAnalyzer.calculate_tail_indicators(df)
+                trend = TechnicalAnalyzer.classify_trend(last['close'], last['sma_50'], last['sma_200'])
+            else:
+                # Calculate indicators
+                df = TechnicalAnalyzer.calculate_indicators(df)
+            
+                # Get latest values
+                last = df.iloc[-1]
+                prev = df.iloc[-2]
+                trend = TechnicalAnalyzer.detect_trend(df)
+        
+        return self.score_signal(symbol, last, prev, trend, verbose, context)
+    
+    def score_arrays(self, ind: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Buy and sell scores for every bar of full indicator series at once
+
+        Same rules and points as score_signal, with bar i-1 as `prev`.
+        """
+        if 'trend' not in ind:
+            ind = dict(ind, trend=trend_codes(ind['close'], ind['sma_50'], ind['sma_200']))
+        buy, sell, _ = self.evaluate(ind)
+        return buy, sell
+    
+    def evaluate(self, ind: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+        """Run every rule over the series: (buy, sell, outcome codes per rule)"""
+        n = len(next(iter(ind.values())))
+        buy = np.zeros(n, dtype=np.int64)
+        sell = np.zeros(n, dtype=np.int64)
+        codes = []
+        for rule in self.rules:
+            code = rule.classify(ind, buy, sell)
+            table = np.array([(0, 0)] + rule.points(self.weights))
+            buy = buy + table[code, 0]
+            sell = sell + table[code, 1]
+            codes.append(code)
+        return buy, sell, codes
+    
+    def reasons(self, codes: List[np.ndarray], index: int, values) -> List[str]:
+        """Reason texts for bar `index` from evaluate()'s outcome codes"""
+        reasons = []
+        for rule, code in zip(self.rules, codes):
+            reason = rule.reason(int(code[index]), values)
+            if reason:
+                reasons.append(reason)
+        return reasons
+    
+    def decide(self, buy: np.ndarray, sell: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized action (1 buy, -1 sell, 0 hold) and confidence from scores"""
+        action = np.where((buy > sell) & (buy >= self.min_confidence), 1,
+                          np.where((sell > buy) & (sell >= self.min_confidence), -1, 0))
+        confidence = np.minimum(np.maximum(buy, sell), 100)
+        confidence = np.where(buy == sell, buy, confidence)
+        return action, confidence
+    
+    def score_signal(self, symbol: str, last, prev, trend: str, verbose: bool = False,
+                     context: Optional[Dict[str, float]] = None) -> Dict:
+        """Score the latest two indicator rows (plus `context` inputs) into a signal"""
+        context = context or {}
+        with STAGE_SECONDS.time('scoring'):
+            # Run the rules over a two-bar series (prev, last)
+            ind = {c: np.array([prev[c], last[c]], dtype=np.float64)
+                   for c in self.inputs if c != 'trend' and c not in context}
+            ind['trend'] = np.array([0, TREND_CODES.get(trend, 0)])
+            for c, value in context.items():
+                ind[c] = np.array([value, value], dtype=np.float64)
+            buy, sell, codes = self.evaluate(ind)
+            return self.build_signal(symbol, last, buy[-1].item(), sell[-1].item(),
+                                     self.reasons(codes, -1, last), verbose)
+    
+    def build_signal(self, symbol: str, last, buy_score, sell_score, reasons: List[str],
+                     verbose: bool = False) -> Dict:
+        """Signal dict (action, confidence, indicators) for one bar's scores"""
+        # Initialize signal
+        signal = {
+            'symbol': symbol,
+            'timestamp': datetime.now(),
+            'action': 'hold',
+            'confidence': 0,
+            'price': last['close'],
+            'indicators': {},
+            'reason': [],
+            'scores': {}
+        }
+        
+        # Collect indicator values
+        signal['indicators'] = {
+            'rsi': last['rsi'],
+            'macd': last['macd'],
+            'macd_signal': last['macd_signal'],
+            'ema_fast': last['ema_fast'],
+            'ema_slow': last['ema_slow'],
+            'atr': last['atr'],
+            'stoch_k': last['stoch_k'],
+            'stoch_d': last['stoch_d'],
+            'bb_upper': last['bb_upper'],
+            'bb_lower': last['bb_lower'],
+            'close': last['close']
+        }
+        
+        signal['reason'] = reasons
+        
+        # Store scores for analysis
+        signal['scores'] = {
+            'buy_score': buy_score,
+            'sell_score': sell_score
+        }
+        
+        # Determine action and confidence
+        if buy_score > sell_score:
+            signal['action'] = 'buy' if buy_score >= self.min_confidence else 'hold'
+            signal['confidence'] = min(buy_score, 100)
+        elif sell_score > buy_score:
+            signal['action'] = 'sell' if sell_score >= self.min_confidence else 'hold'
+            signal['confidence'] = min(sell_score, 100)
+        else:
+            signal['action'] = 'hold'
+            signal['confidence'] = max(buy_score, sell_score)
+        
+        # Verbose logging
+        if verbose and logger.isEnabledFor(logging.INFO):
+            logger.info("  %s: BUY=%s SELL=%s -> %s (%s%%)", symbol, buy_score, sell_score,
+                        signal['action'].upper(), signal['confidence'])
+            if signal['action'] == 'hold' and (buy_score > 40 or sell_score > 40):
+                logger.info("    Close to signal! Reasons: %s", ', '.join(signal['reason'][:3]))
+        
+        return signal
+
+# ============================================================================
+# RISK MANAGER
+# ============================================================================
+
+def lots_for_risk(risk_amount, sl_distance, spec: Dict):
+    """Lots that lose `risk_amount` (account currency) if price moves `sl_distance`
+
+    `spec` holds tick_value, tick_size, volume_min, volume_step and
+    volume_max (SymbolRegistry.sizing / sizing_arrays); every argument may
+    be a scalar or an array, so a whole batch of trades is sized at once.
+    Lots are rounded down to the volume step (never more than the risk)
+    and capped at the symbol's max volume.  Trades whose risk does not
+    cover the minimum volume, or with an unusable stop distance or spec,
+    get 0 lots so the caller skips them.
+    """
+    risk_amount = np.asarray(risk_amount, dtype=np.float64)
+    sl_distance = np.asarray(sl_distance, dtype=np.float64)
+    step = np.asarray(spec['volume_step'], dtype=np.float64)
+    volume_min = np.asarray(spec['volume_min'], dtype=np.float64)
+    volume_max = np.asarray(spec['volume_max'], dtype=np.float64)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        loss_per_lot = sl_distance / spec['tick_size'] * spec['tick_value']
+        lots = risk_amount / loss_per_lot
+        # The small epsilon keeps e.g. 0.3 / 0.1 = 2.9999999999999996 from losing a step
+        lots = np.floor(lots / step + 1e-9) * step
+    lots = np.where(np.isfinite(lots) & (loss_per_lot > 0) & (lots >= volume_min), lots, 0.0)
+    lots = np.minimum(lots, volume_max)
+    decimals = np.clip(np.ceil(-np.log10(step)), 0, 8)
+    return np.round(lots * 10 ** decimals) / 10 ** decimals
+
+
+class RiskManager:
+    """Manage trading risk"""
+    
+    def __init__(self, risk_per_trade: float, max_daily_loss: float, max_open_trades: int,
+                 sl_atr_multiplier: float = 2.0, tp_atr_multiplier: float = 3.0):
+        self.risk_per_trade = risk_per_trade
         self.max_daily_loss = max_daily_loss
         self.max_open_trades = max_open_trades
+        self.sl_atr_multiplier = sl_atr_multiplier
+        self.tp_atr_multiplier = tp_atr_multiplier
         self.daily_start_balance = 0
         self.daily_pnl = 0
+        self.day = None
+        self.halted: Optional[str] = None  # reason, until the next trading day
+        self.lock = threading.Lock()
+    
+    def roll_day(self, balance: float, day=None) -> bool:
+        """Start a new trading day (reset the daily baseline and any halt) if the date changed"""
+        today = day or datetime.now().date()
+        with self.lock:
+            if self.day == today:
+                return False
+            if self.halted:
+                logger.info("New trading day: lifting halt (%s)", self.halted)
+            self.day = today
+            self.daily_start_balance = balance
+            self.halted = None
+            return True
+    
+    def halt(self, reason: str):
+        """Stop opening trades until the next trading day"""
+        with self.lock:
+            if self.halted is None:
+                self.halted = reason
     
-    def calculate_position_size(self, balance: float, price: float, atr: float) -> float:
-        """Calculate position size based on risk"""
+    def calculate_position_size(self, balance: float, price: float, atr: float,
+                                spec: Optional[Dict] = None) -> float:
+        """Calculate position size based on risk
+
+        With a symbol `spec` (SymbolRegistry.sizing) the risk is converted to
+        lots through the tick value and the symbol's volume limits, and is 0
+        when the risk does not cover the minimum volume; without one, one lot
+        is assumed to move one account unit per price unit.
+        """
         risk_amount = balance * self.risk_per_trade
-        stop_loss_distance = atr * 2  # 2x ATR for stop loss
+        stop_loss_distance = atr * self.sl_atr_multiplier  # 2x ATR for stop loss
+        
+        if spec is not None:
+            return float(lots_for_risk(risk_amount, stop_loss_distance, spec))
         
         if stop_loss_distance == 0:
             return 0.01  # Minimum lot size
@@ -472,15 +2048,29 @@ class RiskManager:
         # Ensure minimum lot size
         return max(position_size, 0.01)
     
-    def can_trade(self, account_info: Dict, open_positions: List) -> Tuple[bool, str]:
-        """Check if trading is allowed"""
+    def calculate_position_sizes(self, balance: float, atr: np.ndarray, specs: Dict[str, np.ndarray]) -> np.ndarray:
+        """calculate_position_size for a batch of trades (SymbolRegistry.sizing_arrays specs)"""
+        return lots_for_risk(balance * self.risk_per_trade, np.asarray(atr) * self.sl_atr_multiplier, specs)
+    
+    def calculate_sl_tp(self, action: str, price: float, atr: float) -> Tuple[float, float]:
+        """Stop loss and take profit levels for an entry at `price`"""
+        sl_distance = atr * self.sl_atr_multiplier
+        tp_distance = atr * self.tp_atr_multiplier
+        
+        if action == 'buy':
+            return price - sl_distance, price + tp_distance
+        return price + sl_distance, price - tp_distance
+    
+    def can_trade(self, account_info: Dict, open_positions: List, day=None) -> Tuple[bool, str]:
+        """Check if trading is allowed (`day` overrides today's date, e.g. in a backtest)"""
         # Check max open trades
         if len(open_positions) >= self.max_open_trades:
             return False, f"Max open trades reached ({self.max_open_trades})"
         
         # Check daily loss limit
-        if self.daily_start_balance == 0:
-            self.daily_start_balance = account_info['balance']
+        self.roll_day(account_info['balance'], day)
+        if self.halted:
+            return False, f"Trading halted: {self.halted}"
         
         self.daily_pnl = account_info['equity'] - self.daily_start_balance
         max_loss = self.daily_start_balance * self.max_daily_loss
@@ -494,6 +2084,718 @@ class RiskManager:
         
         return True, "OK"
 
+
+class CorrelationTracker:
+    """Rolling return covariance / correlation across symbols
+
+    Log returns of closed bars are kept in a `window` x symbols ring; a new
+    bar adds its outer products to running pairwise sums and removes the
+    ones of the bar it evicts, so each bar costs O(symbols²) however long
+    the window.  The sums are rebuilt from the ring once per `window` bars to
+    keep rounding from drifting.  A symbol has no return at a bar time it
+    has no bar for, nor at its next bar (that move spans two bars), and
+    each pair is measured only over the bars both have a return for, like
+    DataFrame.corr; pairs with fewer than MIN_PAIRS such bars count as
+    uncorrelated.
+    """
+    
+    MIN_PAIRS = 10
+    
+    def __init__(self, symbols: List[str], window: int = 100):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.window = window
+        n = len(self.symbols)
+        self.returns = np.zeros((window, n))
+        self.present = np.zeros((window, n))
+        self.pos = 0
+        self.count = 0
+        self.pushes = 0
+        # [i, j] sums run over the bars where both i and j have a return
+        self.pairs = np.zeros((n, n))
+        self.sum = np.zeros((n, n))  # of i's returns
+        self.sum_sq = np.zeros((n, n))  # of i's squared returns
+        self.cross = np.zeros((n, n))
+        self.last_close = np.full(n, np.nan)
+        self.last_time: Optional[int] = None
+        self.bars: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.lock = threading.Lock()
+    
+    @property
+    def ready(self) -> bool:
+        return self.count >= max(self.MIN_PAIRS, self.window // 2)
+    
+    def load(self, returns: np.ndarray):
+        """Replace the window with the newest rows of `returns` (bars x symbols, oldest first, NaN = none)"""
+        returns = np.asarray(returns, dtype=np.float64)[-self.window:]
+        present = np.isfinite(returns)
+        self.returns[:] = 0.0
+        self.present[:] = 0.0
+        self.returns[:len(returns)] = np.where(present, returns, 0.0)
+        self.present[:len(returns)] = present
+        self.pos = len(returns) % self.window
+        self.count = len(returns)
+        self.rebuild()
+    
+    def rebuild(self):
+        """Recompute the pairwise sums from the ring"""
+        self.pairs = self.present.T @ self.present
+        self.sum = self.returns.T @ self.present
+        self.sum_sq = (self.returns ** 2).T @ self.present
+        self.cross = self.returns.T @ self.returns
+    
+    def observe(self, symbol: str, bars):
+        """Remember a symbol's latest closed bars (DataFrame or rates; the last bar is still forming)"""
+        if symbol not in self.index or bars is None or len(bars) < 2:
+            return
+        keep = self.window + 2
+        times = bar_times(bars[-keep:])[:-1]
+        closes = np.array(bars['close'][-keep:], dtype=np.float64)[:-1]
+        with self.lock:
+            self.bars[symbol] = (times, closes)
+    
+    def advance(self) -> int:
+        """Push every bar time newer than the last one pushed; returns how many"""
+        with self.lock:
+            bars = list(self.bars.items())
+        if not bars:
+            return 0
+        times = np.unique(np.concatenate([t for _, (t, _) in bars]))
+        if self.last_time is not None:
+            times = times[times > self.last_time]
+        times = times[-(self.window + 1):]
+        if len(times) == 0:
+            return 0
+        closes = np.full((len(times), len(self.symbols)), np.nan)
+        for symbol, (t, c) in bars:
+            at = np.searchsorted(t, times)
+            found = at < len(t)
+            found[found] = t[at[found]] == times[found]
+            closes[found, self.index[symbol]] = c[at[found]]
+        for row in closes:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.push(np.log(row / self.last_close))
+            self.last_close = row
+        self.last_time = int(times[-1])
+        return len(times)
+    
+    def push(self, r: np.ndarray):
+        """Add one bar of returns (one per symbol, NaN where a symbol has none), evicting the oldest"""
+        present = np.isfinite(r)
+        r = np.where(present, r, 0.0)
+        old = self.returns[self.pos]
+        old_present = self.present[self.pos]
+        # Rank-2 updates new new' - old old' as one matrix product each
+        self.pairs += np.vstack((present, old_present)).T @ np.vstack((present, -old_present))
+        self.sum += np.vstack((r, old)).T @ np.vstack((present, -old_present))
+        self.sum_sq += np.vstack((r * r, old * old)).T @ np.vstack((present, -old_present))
+        self.cross += np.vstack((r, old)).T @ np.vstack((r, -old))
+        self.returns[self.pos] = r
+        self.present[self.pos] = present
+        self.pos = (self.pos + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        self.pushes += 1
+        if self.pushes % self.window == 0:
+            self.rebuild()
+    
+    def covariance(self) -> np.ndarray:
+        """Pairwise covariance ([i, i] is i's variance; NaN under two shared bars)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.pairs >= 2,
+                            (self.cross - self.sum * self.sum.T / self.pairs) / (self.pairs - 1), np.nan)
+    
+    def variance(self) -> np.ndarray:
+        """[i, j]: i's return variance over the bars j also has a return for"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.pairs >= 2,
+                            (self.sum_sq - self.sum ** 2 / self.pairs) / (self.pairs - 1), np.nan)
+    
+    def correlation(self) -> np.ndarray:
+        cov = self.covariance()
+        var = np.clip(self.variance(), 0, None)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.sqrt(var * var.T)
+        corr = np.where(self.pairs >= self.MIN_PAIRS, np.nan_to_num(corr), 0.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+    
+    def beta(self, benchmark: str) -> Optional[np.ndarray]:
+        """Each symbol's return beta to `benchmark` (None if it isn't tracked)"""
+        j = self.index.get(benchmark)
+        if j is None or not self.ready:
+            return None
+        cov = self.covariance()
+        if not cov[j, j] > 0:
+            return None
+        # The benchmark's variance over the bars each symbol shares with it
+        var = self.variance()[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = cov[:, j] / var
+        return np.where((self.pairs[:, j] >= self.MIN_PAIRS) & (var > 0), beta, 0.0)
+
+
+def position_exposure(positions: List[Dict], symbols: 'SymbolRegistry',
+                      correlations: Optional[CorrelationTracker] = None,
+                      benchmark: Optional[str] = None) -> Dict:
+    """Net exposure of open positions in account currency
+
+    Every position is long its base currency and short its quote currency
+    by its notional (volume x price, valued through the tick value); with
+    a CorrelationTracker `beta` is the notional weighted by each symbol's
+    return beta to `benchmark` (e.g. BTCUSD for crypto exposure).
+    """
+    currencies: Dict[str, float] = {}
+    beta_exposure = 0.0
+    betas = correlations.beta(benchmark) if correlations is not None and benchmark else None
+    for p in positions:
+        info = symbols.get(p['symbol'])
+        if info is None:
+            continue
+        spec = SymbolRegistry.sizing(info)
+        price = p.get('price_current') or p['price_open']
+        notional = p.get('volume', 0) * price * spec['tick_value'] / spec['tick_size']
+        if p['type'] == 'sell':
+            notional = -notional
+        name = p['symbol'].upper()
+        base = getattr(info, 'currency_base', '') or name[:-3]
+        quote = getattr(info, 'currency_profit', '') or name[-3:]
+        currencies[base] = currencies.get(base, 0.0) + notional
+        currencies[quote] = currencies.get(quote, 0.0) - notional
+        if betas is not None and p['symbol'] in correlations.index:
+            beta_exposure += notional * betas[correlations.index[p['symbol']]]
+    return {
+        'currencies': {c: round(v, 2) for c, v in currencies.items()},
+        'beta': round(float(beta_exposure), 2) if betas is not None else None,
+        'benchmark': benchmark if betas is not None else None
+    }
+
+
+class PortfolioAllocator:
+    """Pick which of a cycle's candidate signals get an order
+
+    Candidates are ranked by confidence, then by their spread-adjusted
+    reward/risk (take-profit distance less the spread over stop-loss
+    distance plus the spread).  Down that ranking, symbols already at
+    `max_per_symbol` positions are skipped and the best prefix is taken that
+    fits both the free `max_open_trades` slots and the total-risk budget.
+    Risk is what each order loses at its stop loss; open positions without
+    a stop count as one `risk_per_trade`.
+    
+    With a CorrelationTracker, a candidate whose returns move with an open
+    position or an already selected candidate (in the direction of both trades)
+    is sized down linearly from full risk at `correlation_soft` to rejected
+    at `correlation_limit`.
+    """
+    
+    def __init__(self, risk_manager: RiskManager, symbols: SymbolRegistry,
+                 max_total_risk: float = 0.06, max_per_symbol: int = 1,
+                 correlations: Optional[CorrelationTracker] = None,
+                 correlation_soft: float = 0.5, correlation_limit: float = 0.8, verbose: bool = True):
+        self.risk_manager = risk_manager
+        self.symbols = symbols
+        self.max_total_risk = max_total_risk
+        self.max_per_symbol = max_per_symbol
+        self.correlations = correlations
+        self.correlation_soft = correlation_soft
+        self.correlation_limit = correlation_limit
+        self.verbose = verbose  # log skipped and scaled candidates
+    
+    def correlations_with(self, symbols: List[str], direction: np.ndarray,
+                          open_positions: List[Dict]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Same-bet correlations: each candidate's strongest with an open position, and candidate x candidate
+
+        Correlations are signed by both trades' directions (a hedge is
+        negative) and -inf where a symbol isn't tracked or the symbols match.
+        """
+        tracker = self.correlations
+        rho = np.full(len(symbols), -np.inf)
+        if tracker is None or not tracker.ready or (len(symbols) < 2 and not open_positions):
+            return rho, None
+        corr = tracker.correlation()
+        idx = np.array([tracker.index.get(s, -1) for s in symbols])
+        tracked = idx >= 0
+        names = np.array(symbols, dtype=object)
+        
+        held = [p for p in open_positions if p['symbol'] in tracker.index]
+        if held:
+            held_idx = np.array([tracker.index[p['symbol']] for p in held])
+            held_dir = np.array([1.0 if p['type'] == 'buy' else -1.0 for p in held])
+            same_bet = corr[np.ix_(idx, held_idx)] * direction[:, None] * held_dir[None, :]
+            other = names[:, None] != np.array([p['symbol'] for p in held], dtype=object)[None, :]
+            rho = np.where(tracked, np.where(other, same_bet, -np.inf).max(axis=1), -np.inf)
+        
+        pairs = corr[np.ix_(idx, idx)] * np.outer(direction, direction)
+        usable = (names[:, None] != names[None, :]) & tracked[:, None] & tracked[None, :]
+        return rho, np.where(usable, pairs, -np.inf)
+    
+    def correlation_scale(self, rho: float) -> float:
+        """Size multiplier for a same-bet correlation: 1 up to `correlation_soft`, 0 from `correlation_limit`"""
+        span = max(self.correlation_limit - self.correlation_soft, 1e-9)
+        return float(np.clip((self.correlation_limit - rho) / span, 0.0, 1.0))
+    
+    @staticmethod
+    def stop_loss_value(volume, sl_distance, specs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Account currency lost at the stop (one unit per lot and price unit without a spec)"""
+        with np.errstate(invalid='ignore'):
+            value = volume * sl_distance / specs['tick_size'] * specs['tick_value']
+        return np.where(np.isnan(specs['tick_value']), volume * sl_distance, value)
+    
+    def open_risk(self, positions: List[Dict], balance: float) -> float:
+        """Stop-loss risk of the open positions"""
+        if not positions:
+            return 0.0
+        specs = self.symbols.sizing_arrays([p['symbol'] for p in positions])
+        sl = np.array([p.get('sl') or 0 for p in positions], dtype=np.float64)
+        volume = np.array([p.get('volume', 0) for p in positions], dtype=np.float64)
+        distance = np.abs(np.array([p['price_open'] for p in positions], dtype=np.float64) - sl)
+        risk = self.stop_loss_value(volume, distance, specs)
+        return float(np.where(sl > 0, risk, balance * self.risk_manager.risk_per_trade).sum())
+    
+    def allocate(self, candidates: List[Dict], account_info: Dict, open_positions: List[Dict],
+                 prices: np.ndarray, spreads: np.ndarray) -> List[Tuple[Dict, Dict]]:
+        """(signal, order keywords for OrderExecutor.send) for every selected candidate, best first"""
+        if not candidates:
+            return []
+        rm = self.risk_manager
+        balance = account_info['balance']
+        symbols = [c['symbol'] for c in candidates]
+        confidence = np.array([c['confidence'] for c in candidates], dtype=np.float64)
+        atr = np.array([c['indicators'].get('atr', 0.001) for c in candidates], dtype=np.float64)
+        direction = np.array([1.0 if c['action'] == 'buy' else -1.0 for c in candidates])
+        sl_distance = atr * rm.sl_atr_multiplier
+        tp_distance = atr * rm.tp_atr_multiplier
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reward_risk = np.nan_to_num((tp_distance - spreads) / (sl_distance + spreads), nan=-np.inf)
+        
+        # Highest confidence first, ties broken by reward/risk (stable)
+        ranked = np.lexsort((-reward_risk, -confidence))
+        
+        specs = self.symbols.sizing_arrays(symbols)
+        volume = rm.calculate_position_sizes(balance, atr, specs)
+        for i in np.flatnonzero(np.isnan(specs['tick_value'])):
+            volume[i] = rm.calculate_position_size(balance, prices[i], atr[i])
+        risk = self.stop_loss_value(volume, sl_distance, specs)
+        held_rho, pair_rho = self.correlations_with(symbols, direction, open_positions)
+        
+        held = {}
+        for p in open_positions:
+            held[p['symbol']] = held.get(p['symbol'], 0) + 1
+        slots = rm.max_open_trades - len(open_positions)
+        budget = balance * self.max_total_risk - self.open_risk(open_positions, balance)
+        
+        # Walk the ranking: each candidate is gated only on open positions and
+        # the candidates already taken, and the first one over the budget ends it
+        allocations = []
+        taken: List[int] = []
+        over_budget = False
+        for i in ranked:
+            signal = candidates[i]
+            scale = 1.0
+            reason = None
+            if held.get(symbols[i], 0) >= self.max_per_symbol:
+                reason = 'symbol position limit'
+            else:
+                rho = held_rho[i]
+                if pair_rho is not None and taken:
+                    rho = max(rho, pair_rho[i, taken].max())
+                scale = self.correlation_scale(rho)
+                if 0 < scale < 1:
+                    # Size on the balance share this trade may risk after correlation
+                    spec = {k: v[i:i + 1] for k, v in specs.items()}
+                    if np.isnan(specs['tick_value'][i]):
+                        volume[i] = rm.calculate_position_size(balance * scale, prices[i], atr[i])
+                    else:
+                        volume[i] = rm.calculate_position_sizes(balance * scale, atr[i:i + 1], spec)[0]
+                    risk[i] = self.stop_loss_value(volume[i:i + 1], sl_distance[i:i + 1], spec)[0]
+                if scale <= 0:
+                    reason = 'correlated with a position or selected candidate'
+                elif not (np.isfinite(risk[i]) and volume[i] > 0):
+                    reason = 'risk below the minimum volume'
+                elif len(taken) >= slots:
+                    reason = 'no open-trade slots'
+                elif over_budget or risk[i] > budget:
+                    over_budget = True
+                    reason = 'total risk budget'
+            if reason is not None:
+                if not self.verbose:
+                    continue
+                logger.info("Not ordering %s %s (%s%%): %s", signal['action'], signal['symbol'],
+                            signal['confidence'], reason, extra={'event': 'allocation_skip',
+                            'symbol': signal['symbol'], 'reason': reason})
+                continue
+            taken.append(i)
+            held[symbols[i]] = held.get(symbols[i], 0) + 1
+            budget -= risk[i]
+            allocations.append((signal, {
+                'symbol': signal['symbol'],
+                'side': signal['action'],
+                'volume': float(volume[i]),
+                'sl': float(prices[i] - direction[i] * sl_distance[i]),
+                'tp': float(prices[i] + direction[i] * tp_distance[i]),
+                'comment': f"Bot-{signal['confidence']}%"
+            }))
+            if scale < 1 and self.verbose:
+                logger.info("Sizing %s %s at %.0f%% risk (correlated)", signal['action'], signal['symbol'],
+                            scale * 100, extra={'event': 'allocation_scale', 'symbol': signal['symbol']})
+        return allocations
+
+# ============================================================================
+# EQUITY WATCHDOG
+# ============================================================================
+
+class EquityWatchdog:
+    """Enforce the daily loss limit between cycles
+
+    A background thread reads account equity every `interval` seconds and
+    tracks the day's starting balance (reset by RiskManager.roll_day) and
+    equity high-water mark.  When the loss from the start of the day exceeds
+    `max_daily_loss`, or the drop from the high-water mark exceeds
+    `max_drawdown`, trading is halted for the rest of the day and, with
+    `flatten`, the bot's own positions (its order magic number) are closed
+    at market; while some survive, the attempts back off exponentially and
+    stop after FLATTEN_ATTEMPTS until the next day.  Once none are left the
+    watchdog stops flattening until the next day.  Each sample is one
+    account_info call under the connection's I/O lock, so the analysis
+    threads only wait for it when they are talking to the terminal too.
+    """
+    
+    # Seconds before the first retry while positions survive a flatten (doubling, capped)
+    FLATTEN_RETRY = 1.0
+    FLATTEN_MAX_DELAY = 60.0
+    FLATTEN_ATTEMPTS = 10
+    
+    def __init__(self, connection: MT5Connection, risk_manager: RiskManager, interval: float = 0.25,
+                 max_drawdown: Optional[float] = None, flatten: bool = False):
+        self.connection = connection
+        self.risk_manager = risk_manager
+        self.interval = interval
+        self.max_drawdown = max_drawdown
+        self.flatten = flatten
+        self.high_water = 0.0
+        self.next_flatten = 0.0
+        self.flatten_failures = 0
+        self.flattened = False  # no positions of the bot's left since the halt
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='watchdog', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Equity watchdog error: %s", e)
+    
+    def check(self) -> Optional[str]:
+        """Sample equity once; returns the halt reason if trading is halted"""
+        account = self.connection.get_account_info()
+        if account is None:
+            return self.risk_manager.halted
+        self.samples += 1
+        rm = self.risk_manager
+        equity = account['equity']
+        if rm.roll_day(account['balance']):
+            self.high_water = equity
+            self.next_flatten = 0.0
+            self.flatten_failures = 0
+            self.flattened = False
+        self.high_water = max(self.high_water, equity)
+        
+        if not rm.halted:
+            start = rm.daily_start_balance
+            loss = start - equity
+            drawdown = self.high_water - equity
+            reason = None
+            if loss > start * rm.max_daily_loss:
+                reason = f"daily loss {loss:.2f} exceeds {rm.max_daily_loss:.1%} of {start:.2f}"
+            elif self.max_drawdown and drawdown > self.high_water * self.max_drawdown:
+                reason = f"drawdown {drawdown:.2f} from high-water {self.high_water:.2f} exceeds {self.max_drawdown:.1%}"
+            if reason is None:
+                return None
+            rm.halt(reason)
+            logger.critical("🛑 TRADING HALTED: %s (equity %.2f)", reason, equity,
+                            extra={'event': 'halt', 'reason': reason, 'equity': equity})
+        
+        if (self.flatten and not self.flattened and self.flatten_failures < self.FLATTEN_ATTEMPTS
+                and time.monotonic() >= self.next_flatten):
+            self.flatten_positions()
+        return rm.halted
+    
+    def flatten_positions(self):
+        """Close the bot's open positions (those with its magic number) at market"""
+        magic = self.connection.orders.magic
+        positions = [p for p in self.connection.get_open_positions() if p.get('magic') == magic]
+        if not positions:
+            self.flattened = True
+            return
+        fills = self.connection.orders.close_positions(positions, comment="Flatten")
+        closed = sum(fill is not None for fill in fills)
+        logger.warning("Flatten: closed %d/%d positions", closed, len(positions),
+                       extra={'event': 'flatten', 'closed': closed, 'positions': len(positions)})
+        if closed == len(positions):
+            self.flattened = True
+            return
+        self.flatten_failures += 1
+        delay = min(self.FLATTEN_RETRY * 2 ** (self.flatten_failures - 1), self.FLATTEN_MAX_DELAY)
+        self.next_flatten = time.monotonic() + delay
+        if self.flatten_failures >= self.FLATTEN_ATTEMPTS:
+            logger.critical("Flatten: giving up after %d attempts, %d positions still open",
+                            self.flatten_failures, len(positions) - closed,
+                            extra={'event': 'flatten_failed', 'positions': len(positions) - closed})
+
+# ============================================================================
+# POSITION MANAGEMENT
+# ============================================================================
+
+class PositionManager:
+    """Break-even, trailing stops and partial closes for every open position
+
+    Each pass reads the open positions once and evaluates all rules in one
+    vectorized step; distances are in multiples of each symbol's latest ATR
+    (fed via `update_atr` each cycle for every symbol with an open position,
+    before the trading limits are checked).  Only stops that
+    improve by at least `min_step_atr` are wanted; wanted stops are queued
+    per ticket and replaced by each pass's evaluation (coalescing), and at
+    most `max_modifications` SL/TP requests go out per pass, at most one per
+    position every `modify_interval` seconds, biggest improvements first.
+    """
+    
+    # Retcode for a ticket that no longer exists
+    POSITION_CLOSED = 10036
+    
+    def __init__(self, connection: MT5Connection, interval: float = 1.0,
+                 breakeven_atr: Optional[float] = 1.0, breakeven_lock_atr: float = 0.1,
+                 trail_start_atr: Optional[float] = 1.5, trail_atr: float = 1.5,
+                 partial_close_atr: Optional[float] = 2.0, partial_close_fraction: float = 0.5,
+                 min_step_atr: float = 0.1, modify_interval: float = 5.0, max_modifications: int = 20):
+        self.connection = connection
+        self.interval = interval
+        self.breakeven_atr = breakeven_atr
+        self.breakeven_lock_atr = breakeven_lock_atr
+        self.trail_start_atr = trail_start_atr
+        self.trail_atr = trail_atr
+        self.partial_close_atr = partial_close_atr
+        self.partial_close_fraction = partial_close_fraction
+        self.min_step_atr = min_step_atr
+        self.modify_interval = modify_interval
+        self.max_modifications = max_modifications
+        self.atr: Dict[str, float] = {}
+        self.pending: Dict[int, Tuple[Dict, float, float]] = {}  # ticket -> (position, sl, improvement in ATRs)
+        self.last_modified: Dict[int, float] = {}
+        self.partially_closed: set = set()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def update_atr(self, symbol: str, atr: float):
+        if atr and np.isfinite(atr):
+            self.atr[symbol] = float(atr)
+    
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='positions', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.manage()
+            except Exception as e:
+                logger.error("Position manager error: %s", e)
+    
+    def manage(self, positions: Optional[List[Dict]] = None) -> Tuple[int, int]:
+        """One pass; returns (stops moved, partial closes)"""
+        if positions is None:
+            positions = self.connection.get_open_positions()
+        stops, partials = self.evaluate(positions)
+        open_tickets = {p['ticket'] for p in positions}
+        self.last_modified = {t: v for t, v in self.last_modified.items() if t in open_tickets}
+        self.partially_closed &= open_tickets
+        
+        # Only what this pass still wants: a deferred move that no longer
+        # qualifies (price pulled back, stop moved since) is dropped, and the
+        # queued position carries this pass's sl/tp
+        self.pending = {position['ticket']: (position, sl, gain) for position, sl, gain in stops}
+        moved = self.flush()
+        closed = self.close_partials(partials)
+        return moved, closed
+    
+    def evaluate(self, positions: List[Dict]) -> Tuple[List[Tuple[Dict, float, float]], List[Tuple[Dict, float]]]:
+        """Stops to move as (position, new sl, improvement in ATRs) and partial closes as (position, volume)"""
+        if not positions:
+            return [], []
+        symbols = [p['symbol'] for p in positions]
+        specs = {s: self.connection.symbols.get(s) for s in set(symbols)}
+        point = np.array([getattr(specs[s], 'point', 0.0) or 0.0 for s in symbols])
+        digits = [getattr(specs[s], 'digits', 5) for s in symbols]
+        stops_level = np.array([getattr(specs[s], 'trade_stops_level', 0) or 0 for s in symbols]) * point
+        atr = np.array([self.atr.get(s, np.nan) for s in symbols])
+        direction = np.array([1.0 if p['type'] == 'buy' else -1.0 for p in positions])
+        entry = np.array([p['price_open'] for p in positions], dtype=np.float64)
+        price = np.array([p.get('price_current') or p['price_open'] for p in positions], dtype=np.float64)
+        sl = np.array([p.get('sl') or 0.0 for p in positions], dtype=np.float64)
+        
+        # Work in "higher is better" stop levels: d * sl
+        profit = (price - entry) * direction
+        current = np.where(sl > 0, direction * sl, -np.inf)
+        wanted = np.full(len(positions), -np.inf)
+        with np.errstate(invalid='ignore'):
+            if self.breakeven_atr is not None:
+                breakeven = direction * entry + self.breakeven_lock_atr * atr
+                wanted = np.where(profit >= self.breakeven_atr * atr, np.maximum(wanted, breakeven), wanted)
+            if self.trail_start_atr is not None:
+                trail = direction * price - self.trail_atr * atr
+                wanted = np.where(profit >= self.trail_start_atr * atr, np.maximum(wanted, trail), wanted)
+            # Respect the broker's minimum stop distance from the current price
+            wanted = np.minimum(wanted, direction * price - np.maximum(stops_level, point))
+            # Improvement in ATRs (infinite for a position without a stop)
+            gain = np.where(np.isfinite(current), (wanted - current) / atr, np.inf)
+            move = np.isfinite(wanted) & (gain >= self.min_step_atr) & (gain > 0)
+        
+        stops = [(positions[i], round(float(direction[i] * wanted[i]), digits[i]), float(gain[i]))
+                 for i in np.flatnonzero(move)]
+        
+        partials = []
+        if self.partial_close_atr is not None:
+            with np.errstate(invalid='ignore'):
+                due = profit >= self.partial_close_atr * atr
+            for i in np.flatnonzero(due):
+                position = positions[i]
+                if position['ticket'] in self.partially_closed:
+                    continue
+                info = specs[symbols[i]]
+                if info is None:
+                    continue
+                spec = SymbolRegistry.sizing(info)
+                step, volume_min = spec['volume_step'], spec['volume_min']
+                volume = np.floor(position['volume'] * self.partial_close_fraction / step + 1e-9) * step
+                volume = round(float(volume), 8)
+                if volume >= volume_min and position['volume'] - volume >= volume_min - 1e-9:
+                    partials.append((position, volume))
+        return stops, partials
+    
+    def flush(self) -> int:
+        """Send queued stop moves allowed by the rate limits; returns how many went through"""
+        now = time.monotonic()
+        ready = [ticket for ticket in self.pending
+                 if now - self.last_modified.get(ticket, -np.inf) >= self.modify_interval]
+        ready.sort(key=lambda ticket: -self.pending[ticket][2])
+        moved = 0
+        for ticket in ready[:self.max_modifications]:
+            position, sl, _ = self.pending.pop(ticket)
+            retcode = self.connection.orders.modify(ticket, position['symbol'], sl, position.get('tp') or 0.0)
+            self.last_modified[ticket] = now
+            if retcode in OrderExecutor.FILLED_RETCODES:
+                moved += 1
+                POSITION_UPDATES.inc('stop', 'done')
+                logger.info("Stop moved: %s #%s %s -> %.5f", position['symbol'], ticket,
+                            position.get('sl') or 0.0, sl,
+                            extra={'event': 'stop_moved', 'symbol': position['symbol'], 'ticket': ticket, 'sl': sl})
+            else:
+                POSITION_UPDATES.inc('stop', str(retcode))
+        return moved
+    
+    def close_partials(self, partials: List[Tuple[Dict, float]]) -> int:
+        if not partials:
+            return 0
+        fills = self.connection.orders.close_positions([dict(p, volume=v) for p, v in partials], comment="Partial")
+        closed = 0
+        for (position, volume), fill in zip(partials, fills):
+            # Once per position, even if the close failed, so a rejection isn't resent every pass
+            self.partially_closed.add(position['ticket'])
+            POSITION_UPDATES.inc('partial', 'done' if fill else 'failed')
+            if fill:
+                closed += 1
+                logger.info("Partial close: %s #%s %s of %s", position['symbol'], position['ticket'], volume,
+                            position['volume'], extra={'event': 'partial_close', 'symbol': position['symbol'],
+                                                       'ticket': position['ticket'], 'volume': volume})
+        return closed
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+class BarCloseScheduler:
+    """Wake up at bar-close boundaries and report which symbols got a new bar
+
+    Between closes the scheduler sleeps; after a boundary it polls tick
+    times every `poll_interval` seconds until every symbol has ticked into
+    the new bar or `settle_timeout` seconds have passed, so symbols whose
+    market is closed (no ticks) are simply never reported.  Boundaries are
+    computed on the server clock, estimated from the tick times themselves.
+    """
+    
+    def __init__(self, connection: MT5Connection, symbols: List[str], timeframe: int,
+                 poll_interval: float = 1.0, settle_timeout: float = 30.0):
+        self.connection = connection
+        self.symbols = list(symbols)
+        self.period = timeframe_seconds(timeframe)
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
+        self.server_offset = 0.0  # server clock - local clock
+        self.bars: Dict[str, int] = {}  # start time of the last bar seen per symbol
+        self.ticks: Dict = {}  # ticks from the last poll (reused by the cycle's snapshot)
+        self.ticks_time: Optional[float] = None
+        self.stopped = threading.Event()
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def poll(self) -> List[str]:
+        """Symbols whose latest tick falls in a bar we haven't reported yet"""
+        now = time.time()
+        self.ticks = self.connection.get_ticks(self.symbols)
+        self.ticks_time = time.monotonic()
+        ticks = {symbol: int(tick.time) for symbol, tick in self.ticks.items()}
+        if ticks:
+            # Broker servers run on whole or quarter hour offsets from UTC;
+            # anything outside UTC-12..UTC+14 means every market is closed
+            offset = round((max(ticks.values()) - now) / 900) * 900
+            if -12 * 3600 <= offset <= 14 * 3600:
+                self.server_offset = offset
+        
+        due = []
+        for symbol, tick_time in ticks.items():
+            bar = tick_time - tick_time % self.period
+            if bar > self.bars.get(symbol, -1):
+                self.bars[symbol] = bar
+                due.append(symbol)
+        return due
+    
+    def delay(self) -> float:
+        """Seconds to sleep before the next poll"""
+        server_now = time.time() + self.server_offset
+        bar = server_now - server_now % self.period
+        pending = any(self.bars.get(symbol, -1) < bar for symbol in self.symbols)
+        if pending and server_now - bar < self.settle_timeout:
+            return self.poll_interval
+        return bar + self.period - server_now
+    
+    def wait(self) -> List[str]:
+        """Block until at least one symbol has a new bar (empty list once stopped)"""
+        while not self.stopped.is_set():
+            due = self.poll()
+            if due:
+                return [symbol for symbol in self.symbols if symbol in due]
+            self.stopped.wait(self.delay())
+        return []
+
 # ============================================================================
 # TRADING BOT
 # ============================================================================
@@ -503,17 +2805,91 @@ class TradingBot:
     
     def __init__(self, config: Dict):
         self.config = config
+        select_terminal(config.get('terminal', 'mt5'), config.get('simulator'))
         self.mt5 = MT5Connection(
             config['mt5_login'],
             config['mt5_password'],
-            config['mt5_server']
+            config['mt5_server'],
+            cache_bars=config.get('bar_cache', False) or bool(config.get('bar_store')),
+            store=BarStore(config['bar_store']) if config.get('bar_store') else None
         )
-        self.signal_generator = SignalGenerator(config['min_confidence'])
+        self.mt5.orders = OrderExecutor(
+            self.mt5,
+            deviation=config.get('order_deviation', 20),
+            max_retries=config.get('order_retries', 3),
+            retry_delay=config.get('order_retry_delay', 0.05)
+        )
+        self.timeframes = None
+        rules = None
+        if config.get('trend_timeframes'):
+            self.timeframes = TimeframeResampler(
+                config['trend_timeframes'],
+                fast=config.get('trend_fast_sma', 20),
+                slow=config.get('trend_slow_sma', 50)
+            )
+            rules = SCORING_RULES + [HigherTimeframeRule()]
+        self.signal_generator = SignalGenerator(config['min_confidence'], config.get('score_weights'), rules)
         self.risk_manager = RiskManager(
             config['risk_per_trade'],
             config['max_daily_loss'],
-            config['max_open_trades']
+            config['max_open_trades'],
+            sl_atr_multiplier=config.get('sl_atr_multiplier', 2.0),
+            tp_atr_multiplier=config.get('tp_atr_multiplier', 3.0)
         )
+        self.watchdog = None
+        if config.get('equity_watchdog'):
+            self.watchdog = EquityWatchdog(
+                self.mt5,
+                self.risk_manager,
+                interval=config.get('watchdog_interval', 0.25),
+                max_drawdown=config.get('max_intraday_drawdown'),
+                flatten=config.get('flatten_on_breach', False)
+            )
+        self.positions = None
+        if config.get('manage_positions'):
+            self.positions = PositionManager(
+                self.mt5,
+                interval=config.get('position_interval', 1.0),
+                breakeven_atr=config.get('breakeven_atr', 1.0),
+                breakeven_lock_atr=config.get('breakeven_lock_atr', 0.1),
+                trail_start_atr=config.get('trail_start_atr', 1.5),
+                trail_atr=config.get('trail_atr', 1.5),
+                partial_close_atr=config.get('partial_close_atr', 2.0),
+                partial_close_fraction=config.get('partial_close_fraction', 0.5),
+                min_step_atr=config.get('stop_min_step_atr', 0.1),
+                modify_interval=config.get('modify_interval', 5.0),
+                max_modifications=config.get('max_modifications', 20)
+            )
+        self.correlations = None
+        if config.get('correlation_window'):
+            self.correlations = CorrelationTracker(config['symbols'], config['correlation_window'])
+        self.allocator = None
+        if config.get('allocation', 'portfolio') == 'portfolio':
+            self.allocator = PortfolioAllocator(
+                self.risk_manager,
+                self.mt5.symbols,
+                max_total_risk=config.get('max_total_risk', 0.06),
+                max_per_symbol=config.get('max_positions_per_symbol', 1),
+                correlations=self.correlations,
+                correlation_soft=config.get('correlation_soft', 0.5),
+                correlation_limit=config.get('correlation_limit', 0.8)
+            )
+        self.indicator_engines: Dict[str, IndicatorEngine] = {}
+        self.executor = None
+        if config.get('worker_threads', 0) > 0:
+            self.executor = ThreadPoolExecutor(
+                max_workers=config['worker_threads'],
+                thread_name_prefix='symbol'
+            )
+        self.scheduler = None
+        if config.get('scheduler') == 'bar_close':
+            self.scheduler = BarCloseScheduler(
+                self.mt5,
+                config['symbols'],
+                config['timeframe'],
+                poll_interval=config.get('tick_poll_interval', 1.0),
+                settle_timeout=config.get('bar_settle_timeout', 30.0)
+            )
         self.running = False
         self.signals_generated = 0
         self.trades_executed = 0
@@ -521,9 +2897,37 @@ class TradingBot:
         
         # Create signals directory for dashboard
         os.makedirs('signals', exist_ok=True)
+        self.journal = SignalJournal(
+            config.get('journal_dir', 'signals/journal'),
+            compact=config.get('journal_compact', False)
+        )
+        METRICS.enabled = bool(config.get('metrics'))
+        self.metrics_server = None
     
     def start(self):
         """Start the trading bot"""
+        if not self.startup():
+            return
+        
+        self.running = True
+        
+        try:
+            if self.scheduler is not None:
+                while self.running:
+                    symbols = self.scheduler.wait()
+                    if symbols:
+                        self.run_cycle(symbols)
+            else:
+                while self.running:
+                    self.run_cycle()
+                    time.sleep(self.config['signal_interval'])
+        except KeyboardInterrupt:
+            logger.info("Bot stopped by user")
+        finally:
+            self.stop()
+    
+    def startup(self) -> bool:
+        """Connect to MT5 and log the settings"""
         logger.info("=" * 80)
         logger.info("STANDALONE MT5 TRADING BOT v2 - IMPROVED SIGNAL GENERATION")
         logger.info("=" * 80)
@@ -531,163 +2935,459 @@ class TradingBot:
         # Connect to MT5
         if not self.mt5.connect():
             logger.error("Failed to connect to MT5. Exiting.")
-            return
+            return False
+        
+        missing = self.mt5.symbols.load(self.config['symbols'])
+        if missing:
+            logger.warning(f"Symbols not found in the terminal: {', '.join(missing)}")
+        if self.mt5.store is not None:
+            self.warm_bars([s for s in self.config['symbols'] if s not in missing])
         
         logger.info(f"Trading {len(self.config['symbols'])} symbols: {', '.join(self.config['symbols'])}")
         logger.info(f"Risk per trade: {self.config['risk_per_trade']*100}%")
         logger.info(f"Min confidence: {self.config['min_confidence']}% (REDUCED for more signals)")
-        logger.info(f"Signal interval: {self.config['signal_interval']}s")
+        if self.config.get('scheduler') == 'bar_close':
+            logger.info(f"Scheduler: bar close ({timeframe_seconds(self.config['timeframe'])}s bars, "
+                        f"tick poll {self.config.get('tick_poll_interval', 1.0)}s)")
+        else:
+            logger.info(f"Signal interval: {self.config['signal_interval']}s")
         logger.info(f"Verbose mode: {self.config['verbose_mode']}")
+        if self.watchdog is not None:
+            logger.info(f"Equity watchdog: every {self.watchdog.interval}s, max daily loss "
+                        f"{self.config['max_daily_loss']*100}%")
+        self.start_monitors()
+        if METRICS.enabled and self.config.get('metrics_port'):
+            self.metrics_server = MetricsServer(METRICS, self.config.get('metrics_host', '127.0.0.1'),
+                                                self.config['metrics_port'])
+            self.metrics_server.start()
+            logger.info(f"Metrics on http://{self.config.get('metrics_host', '127.0.0.1')}:"
+                        f"{self.config['metrics_port']}/metrics")
         logger.info("=" * 80)
-        
-        self.running = True
-        
-        try:
-            while self.running:
-                self.run_cycle()
-                time.sleep(self.config['signal_interval'])
-        except KeyboardInterrupt:
-            logger.info("Bot stopped by user")
-        finally:
-            self.stop()
+        return True
     
-    def run_cycle(self):
-        """Run one trading cycle"""
-        try:
-            self.cycles += 1
-            logger.info(f"\n{'='*80}")
-            logger.info(f"CYCLE #{self.cycles} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            logger.info(f"{'='*80}")
-            
-            # Get account info
-            account_info = self.mt5.get_account_info()
-            if account_info is None:
-                logger.error("Failed to get account info")
-                return
-            
-            # Get open positions
-            open_positions = self.mt5.get_open_positions()
-            
-            # Check if trading is allowed
-            can_trade, reason = self.risk_manager.can_trade(account_info, open_positions)
+    def start_monitors(self):
+        """Start the equity watchdog and position manager threads"""
+        if self.watchdog is not None:
+            self.watchdog.start()
+        if self.positions is not None:
+            self.positions.start()
+    
+    def warm_bars(self, symbols: List[str]):
+        """Fill the bar buffers from the bar store and check it for gaps"""
+        started = time.perf_counter()
+        timeframe = self.config['timeframe']
+        bars = self.history_bars()
+        gaps = 0
+        for symbol in symbols:
+            self.mt5.get_rates(symbol, timeframe, bars)
+            series = self.mt5.store.series(symbol, timeframe_seconds(timeframe))
+            info = series.check()
+            gaps += info['gaps']
+            if info['unordered']:
+                logger.warning("Bar store %s has %d out-of-order bars", series.path, info['unordered'])
+        logger.info(f"Bar store {self.mt5.store.directory}: {len(symbols)} symbols warmed in "
+                    f"{(time.perf_counter() - started) * 1000:.0f}ms ({gaps} gaps in stored history)")
+    
+    def refresh_position_atr(self, positions: List[Dict]):
+        """Feed the position manager the latest ATR of every symbol with an open position
+
+        Runs ahead of the trading limits so stops keep trailing while the
+        book is full, after a halt and for positions left from a restart.
+        With the bar cache this is a delta fetch the analysis then reuses.
+        """
+        if self.positions is None or not positions:
+            return
+        timeframe = self.config['timeframe']
+        for symbol in sorted({p['symbol'] for p in positions}):
+            try:
+                if self.mt5.cache_bars:
+                    rates = self.mt5.get_rates(symbol, timeframe, self.history_bars())
+                else:
+                    rates = self.mt5.get_market_data(symbol, timeframe, 15)
+                self.positions.update_atr(symbol, TechnicalAnalyzer.calculate_atr(rates))
+            except Exception as e:
+                logger.error("Error updating the ATR of %s: %s", symbol, e)
+    
+    def run_cycle(self, symbols: Optional[List[str]] = None):
+        """Run one trading cycle (over `symbols`, default every configured symbol)"""
+        if symbols is None:
+            symbols = self.config['symbols']
+        with STAGE_SECONDS.time('cycle'):
+            try:
+                self.begin_cycle()
             
-            logger.info(f"Balance: ${account_info['balance']:.2f} | Equity: ${account_info['equity']:.2f} | "
-                       f"Profit: ${account_info['profit']:.2f} | Open: {len(open_positions)}")
+                # Account, positions, ticks and specs in one batch
+                snapshot = self.take_snapshot(symbols)
+                account_info = snapshot.account
+                if account_info is None:
+                    logger.error("Failed to get account info")
+                    return
+                open_positions = snapshot.positions
+                self.refresh_position_atr(open_positions)
             
-            if not can_trade:
-                logger.warning(f"Trading disabled: {reason}")
-                return
+                if not self.trading_allowed(account_info, open_positions):
+                    return
             
-            # Generate signals for each symbol
-            all_signals = []
-            for symbol in self.config['symbols']:
-                signal = self.process_symbol(symbol, account_info)
-                if signal:
-                    all_signals.append(signal)
+                # Generate signals for each symbol; with the allocator orders go
+                # out together once every signal is in, otherwise one at a time
+                # in config order, re-checking the limits against this cycle's fills
+                all_signals = []
+                candidates = []
+                cycle_positions = list(open_positions)
+                for signal in self.analyze_symbols(symbols):
+                    if signal:
+                        all_signals.append(signal)
+                        if self.allocator is None:
+                            self.handle_signal(signal, account_info, cycle_positions, snapshot)
+                        elif self.announce_signal(signal):
+                            candidates.append(signal)
+                if self.correlations is not None:
+                    self.correlations.advance()
+                if candidates:
+                    self.place_orders(candidates, account_info, open_positions, snapshot)
             
-            # Save signals to file for dashboard
-            self.save_signals(all_signals, account_info, open_positions)
+                # Save signals to file for dashboard
+                self.save_signals(all_signals, account_info, open_positions)
             
-            logger.info(f"Cycle complete. Signals generated: {self.signals_generated}, Trades executed: {self.trades_executed}")
+                logger.info("Cycle complete. Signals generated: %d, Trades executed: %d",
+                            self.signals_generated, self.trades_executed)
             
-        except Exception as e:
-            logger.error(f"Error in trading cycle: {e}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Error in trading cycle: {e}", exc_info=True)
+    
+    def take_snapshot(self, symbols: List[str]) -> MarketSnapshot:
+        """Cycle snapshot, reusing the ticks the scheduler just polled"""
+        ticks, ticks_time = None, None
+        if self.scheduler is not None:
+            ticks, ticks_time = self.scheduler.ticks, self.scheduler.ticks_time
+        with STAGE_SECONDS.time('snapshot'):
+            return self.mt5.snapshot(symbols, self.config.get('snapshot_max_age', 5.0), ticks, ticks_time)
+    
+    def begin_cycle(self):
+        """Count the cycle and log its header"""
+        self.cycles += 1
+        CYCLES.inc()
+        logger.info("\n%s\nCYCLE #%d - %s\n%s", '=' * 80, self.cycles,
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'), '=' * 80,
+                    extra={'event': 'cycle', 'cycle': self.cycles})
+    
+    def trading_allowed(self, account_info: Dict, open_positions: List[Dict]) -> bool:
+        """Log the account line and check the risk limits"""
+        can_trade, reason = self.risk_manager.can_trade(account_info, open_positions)
+        
+        logger.info("Balance: $%.2f | Equity: $%.2f | Profit: $%.2f | Open: %d", account_info['balance'],
+                    account_info['equity'], account_info['profit'], len(open_positions))
+        
+        if not can_trade:
+            logger.warning("Trading disabled: %s", reason)
+        return can_trade
     
-    def process_symbol(self, symbol: str, account_info: Dict) -> Optional[Dict]:
+    def process_symbol(self, symbol: str, account_info: Dict,
+                       open_positions: Optional[List[Dict]] = None,
+                       snapshot: Optional[MarketSnapshot] = None) -> Optional[Dict]:
         """Process a single symbol"""
+        signal = self.analyze_symbol(symbol)
+        if signal is not None:
+            self.handle_signal(signal, account_info, open_positions, snapshot)
+        return signal
+    
+    def analyze_symbols(self, symbols: List[str]) -> Iterator[Optional[Dict]]:
+        """Yield each symbol's signal in config order
+
+        With a worker pool every symbol is analyzed concurrently and results
+        are handed back in order, so the caller acts as the single order lane.
+        """
+        if self.config.get('indicator_mode') == 'panel':
+            yield from self.analyze_panel(symbols)
+            return
+        
+        if self.executor is None:
+            for symbol in symbols:
+                yield self.analyze_symbol(symbol)
+            return
+        
+        futures = [self.executor.submit(self.analyze_symbol, symbol) for symbol in symbols]
+        for future in futures:
+            yield future.result()
+    
+    def analyze_panel(self, symbols: List[str]) -> List[Optional[Dict]]:
+        """Score every symbol from one vectorized indicator pass over a price panel"""
+        return self.score_panel(symbols, self.fetch_panel(symbols))
+    
+    def fetch_panel(self, symbols: List[str]) -> Dict[str, np.ndarray]:
+        """Bars for every symbol with enough history for the panel"""
+        lookback = self.config['lookback_periods']
+        fetch = self.mt5.get_rates if self.mt5.cache_bars else self.mt5.get_market_data
+        data = {}
+        with STAGE_SECONDS.time('market_data'):
+            for symbol in symbols:
+                try:
+                    if self.timeframes is not None:
+                        bars = self.fetch_timeframes(symbol)
+                    else:
+                        bars = fetch(symbol, self.config['timeframe'], lookback)
+                except Exception as e:
+                    logger.error("Error processing %s: %s", symbol, e)
+                    continue
+                if bars is not None and len(bars) >= 50:
+                    data[symbol] = bars
+        return data
+    
+    def score_panel(self, symbols: List[str], data: Dict) -> List[Optional[Dict]]:
+        """Panel indicators and signals for the bars from fetch_panel"""
+        if not data:
+            return [None] * len(symbols)
+        
+        panel_symbols = list(data)
+        if self.correlations is not None:
+            for symbol in panel_symbols:
+                self.correlations.observe(symbol, data[symbol])
+        panel = PanelAnalyzer.stack([data[symbol] for symbol in panel_symbols], self.config['lookback_periods'])
+        with STAGE_SECONDS.time('indicators'):
+            ind = PanelAnalyzer.calculate_indicators(panel)
+        
+        results = {}
+        for i, symbol in enumerate(panel_symbols):
+            try:
+                last = PanelAnalyzer.row(ind, i, -1)
+                prev = PanelAnalyzer.row(ind, i, -2)
+                trend = TechnicalAnalyzer.classify_trend(last['close'], last['sma_50'], last['sma_200'])
+                results[symbol] = self.signal_generator.score_signal(
+                    symbol, last, prev, trend, verbose=self.config['verbose_mode'],
+                    context=self.signal_context(symbol)
+                )
+            except Exception as e:
+                logger.error("Error processing %s: %s", symbol, e)
+        return [results.get(symbol) for symbol in symbols]
+    
+    def analyze_symbol(self, symbol: str) -> Optional[Dict]:
+        """Fetch data and generate a signal for one symbol (no order placement)"""
         try:
-            # Get market data
-            df = self.mt5.get_market_data(
+            return self.score_symbol(symbol, self.fetch_symbol(symbol))
+        except Exception as e:
+            logger.error("Error processing %s: %s", symbol, e)
+            return None
+    
+    def fetch_symbol(self, symbol: str):
+        """Bars for one symbol (engine and tail modes read the cached rates directly)"""
+        engine_mode = self.config.get('indicator_mode') in ('incremental', 'tail')
+        with STAGE_SECONDS.time('market_data'):
+            if self.timeframes is not None:
+                rates = self.fetch_timeframes(symbol)
+                if rates is None or engine_mode:
+                    return rates
+                return MT5Connection.rates_frame(rates)
+            if engine_mode and self.mt5.cache_bars:
+                return self.mt5.get_rates(
+                    symbol,
+                    self.config['timeframe'],
+                    self.config['lookback_periods']
+                )
+            return self.mt5.get_market_data(
                 symbol,
                 self.config['timeframe'],
                 self.config['lookback_periods']
             )
-            
-            if df is None:
-                return None
-            
-            # Generate signal
-            signal = self.signal_generator.generate_signal(
-                symbol, 
-                df, 
-                verbose=self.config['verbose_mode']
-            )
-            
-            if signal is None:
-                return None
-            
-            # Log signal if not hold
-            if signal['action'] != 'hold':
-                self.signals_generated += 1
-                
-                logger.info(f"\n🔔 SIGNAL GENERATED 🔔")
-                logger.info(f"  Symbol: {signal['symbol']}")
-                logger.info(f"  Action: {signal['action'].upper()}")
-                logger.info(f"  Price: {signal['price']:.5f}")
-                logger.info(f"  Confidence: {signal['confidence']}%")
-                logger.info(f"  Buy Score: {signal['scores']['buy_score']}")
-                logger.info(f"  Sell Score: {signal['scores']['sell_score']}")
-                logger.info(f"  Reasons: {', '.join(signal['reason'])}")
-                
-                # Execute trade if confidence is high enough
-                if signal['confidence'] >= self.config['min_confidence']:
-                    self.execute_trade(signal, account_info, df)
-            
-            return signal
+    
+    def history_bars(self) -> int:
+        """Base-timeframe bars kept per symbol"""
+        bars = self.config['lookback_periods']
+        if self.timeframes is not None:
+            bars = max(bars, self.timeframes.history_bars(self.config['timeframe']))
+        return bars
+    
+    def fetch_timeframes(self, symbol: str) -> Optional[np.ndarray]:
+        """Base bars for one symbol, folded into the higher trend timeframes
+
+        Enough history is kept in the bar cache to cover the slowest
+        timeframe's SMA; only the newest `lookback_periods` bars are returned.
+        """
+        timeframe = self.config['timeframe']
+        rates = self.mt5.get_rates(symbol, timeframe, self.history_bars())
+        if rates is None:
+            return None
+        self.timeframes.update(symbol, rates)
+        return rates[-self.config['lookback_periods']:]
+    
+    def signal_context(self, symbol: str) -> Optional[Dict[str, float]]:
+        """Rule inputs that don't come from the base-timeframe indicators"""
+        if self.timeframes is None:
+            return None
+        return {'htf_trend': self.timeframes.trend_code(symbol)}
+    
+    def score_symbol(self, symbol: str, df) -> Optional[Dict]:
+        """Generate the signal for bars from fetch_symbol (CPU only, no MT5 calls)"""
+        if df is None:
+            return None
+        if self.correlations is not None:
+            self.correlations.observe(symbol, df)
         
-        except Exception as e:
-            logger.error(f"Error processing {symbol}: {e}")
+        return self.signal_generator.generate_signal(
+            symbol, 
+            df, 
+            verbose=self.config['verbose_mode'],
+            engine=self.get_indicator_engine(symbol),
+            tail_only=self.config.get('indicator_mode') == 'tail',
+            context=self.signal_context(symbol)
+        )
+    
+    def handle_signal(self, signal: Dict, account_info: Dict,
+                      open_positions: Optional[List[Dict]] = None,
+                      snapshot: Optional[MarketSnapshot] = None):
+        """Log an actionable signal and place its order
+
+        When `open_positions` is given the risk checks are re-run before the
+        order and the list is extended with every position opened here.
+        """
+        if not self.announce_signal(signal):
+            return
+        
+        if open_positions is not None:
+            can_trade, reason = self.risk_manager.can_trade(account_info, open_positions)
+            if not can_trade:
+                logger.warning("Skipping %s: %s", signal['symbol'], reason)
+                return
+        
+        with STAGE_SECONDS.time('order'):
+            order_id = self.execute_trade(signal, account_info, snapshot=snapshot)
+        if order_id and open_positions is not None:
+            open_positions.append({
+                'ticket': order_id,
+                'symbol': signal['symbol'],
+                'type': signal['action'],
+                'price_open': signal['price']
+            })
+    
+    def announce_signal(self, signal: Dict) -> bool:
+        """Count and log a buy/sell signal; True if it is confident enough to trade"""
+        if signal['action'] == 'hold':
+            return False
+        
+        self.signals_generated += 1
+        SIGNALS.inc(signal['action'])
+        
+        logger.info(
+            "\n🔔 SIGNAL GENERATED 🔔\n  Symbol: %s\n  Action: %s\n  Price: %.5f\n  Confidence: %s%%\n"
+            "  Buy Score: %s\n  Sell Score: %s\n  Reasons: %s",
+            signal['symbol'], signal['action'].upper(), signal['price'], signal['confidence'],
+            signal['scores']['buy_score'], signal['scores']['sell_score'], ', '.join(signal['reason']),
+            extra={'event': 'signal', 'symbol': signal['symbol'], 'action': signal['action'],
+                   'confidence': signal['confidence'], 'price': signal['price']}
+        )
+        
+        # Trade only if confidence is high enough
+        return signal['confidence'] >= self.config['min_confidence']
+    
+    def place_orders(self, candidates: List[Dict], account_info: Dict, open_positions: List[Dict],
+                     snapshot: MarketSnapshot):
+        """Allocate the cycle's candidate signals and submit the chosen orders as one batch"""
+        if self.risk_manager.halted:
+            logger.warning("Not ordering: trading halted (%s)", self.risk_manager.halted)
+            return
+        with STAGE_SECONDS.time('order'):
+            try:
+                prices = np.empty(len(candidates))
+                spreads = np.zeros(len(candidates))
+                for i, signal in enumerate(candidates):
+                    tick = snapshot.tick(signal['symbol'])
+                    if tick is not None:
+                        prices[i] = tick.ask if signal['action'] == 'buy' else tick.bid
+                        spreads[i] = tick.ask - tick.bid
+                    else:
+                        prices[i] = signal['price']
+                allocations = self.allocator.allocate(candidates, account_info, open_positions, prices, spreads)
+                fills = self.mt5.orders.submit_many([order for _, order in allocations], snapshot)
+            except Exception as e:
+                logger.error("Error placing orders: %s", e, exc_info=True)
+                return
+            for (signal, _), fill in zip(allocations, fills):
+                self.record_fill(signal, fill)
+    
+    def get_indicator_engine(self, symbol: str) -> Optional[IndicatorEngine]:
+        """Per-symbol incremental indicator state (None in batch mode)"""
+        if self.config.get('indicator_mode', 'batch') != 'incremental':
             return None
+        engine = self.indicator_engines.get(symbol)
+        if engine is None:
+            # Same long-SMA window the batch path gets from the lookback frame
+            engine = IndicatorEngine(long_window=min(200, self.config['lookback_periods']))
+            self.indicator_engines[symbol] = engine
+        return engine
     
-    def execute_trade(self, signal: Dict, account_info: Dict, df: pd.DataFrame):
-        """Execute a trade based on signal"""
+    def execute_trade(self, signal: Dict, account_info: Dict,
+                      df: Optional[pd.DataFrame] = None,
+                      snapshot: Optional[MarketSnapshot] = None) -> Optional[int]:
+        """Execute a trade based on signal
+
+        With a snapshot, sizing, SL/TP and the order all use the same
+        ask/bid tick instead of the bar close.
+        """
         try:
+            price = signal['price']
+            if snapshot is not None:
+                price = snapshot.price(signal['symbol'], signal['action']) or price
+            
             # Calculate position size
-            atr = df['atr'].iloc[-1] if 'atr' in df.columns else 0.001
+            atr = signal['indicators'].get('atr', 0.001)
+            info = snapshot.spec(signal['symbol']) if snapshot is not None else self.mt5.symbols.get(signal['symbol'])
             volume = self.risk_manager.calculate_position_size(
                 account_info['balance'],
-                signal['price'],
-                atr
+                price,
+                atr,
+                spec=SymbolRegistry.sizing(info) if info is not None else None
             )
+            if volume <= 0:
+                logger.warning("Skipping %s %s: risk per trade is below the minimum volume",
+                               signal['action'], signal['symbol'],
+                               extra={'event': 'trade_skipped', 'symbol': signal['symbol']})
+                return None
             
             # Calculate SL and TP
-            sl_distance = atr * 2
-            tp_distance = atr * 3
-            
-            if signal['action'] == 'buy':
-                sl = signal['price'] - sl_distance
-                tp = signal['price'] + tp_distance
-            else:
-                sl = signal['price'] + sl_distance
-                tp = signal['price'] - tp_distance
+            sl, tp = self.risk_manager.calculate_sl_tp(signal['action'], price, atr)
             
-            # Place order
-            order_id = self.mt5.place_order(
+            # Place order (re-priced on requotes, SL/TP shifted with the entry)
+            fill = self.mt5.orders.send(
                 signal['symbol'],
                 signal['action'],
                 volume,
                 sl=sl,
                 tp=tp,
-                comment=f"Bot-{signal['confidence']}%"
+                comment=f"Bot-{signal['confidence']}%",
+                snapshot=snapshot
             )
-            
-            if order_id:
-                self.trades_executed += 1
-                logger.info(f"\n✅ TRADE EXECUTED ✅")
-                logger.info(f"  Order ID: {order_id}")
-                logger.info(f"  Action: {signal['action'].upper()}")
-                logger.info(f"  Volume: {volume}")
-                logger.info(f"  Symbol: {signal['symbol']}")
-                logger.info(f"  SL: {sl:.5f}")
-                logger.info(f"  TP: {tp:.5f}")
-            else:
-                logger.error(f"❌ TRADE FAILED: {signal['symbol']}")
+            return self.record_fill(signal, fill)
         
         except Exception as e:
-            logger.error(f"Error executing trade: {e}")
+            logger.error("Error executing trade: %s", e)
+            return None
     
-    def save_signals(self, signals: List[Dict], account_info: Dict, positions: List[Dict]):
-        """Save signals to JSON file for dashboard"""
+    def record_fill(self, signal: Dict, fill: Optional[Dict]) -> Optional[int]:
+        """Count and log an order's outcome; returns the order id"""
+        if not fill or not fill['order']:
+            logger.error("❌ TRADE FAILED: %s", signal['symbol'],
+                         extra={'event': 'trade_failed', 'symbol': signal['symbol']})
+            return None
+        
+        self.trades_executed += 1
+        logger.info(
+            "\n✅ TRADE EXECUTED ✅\n  Order ID: %s\n  Action: %s\n  Volume: %s\n  Symbol: %s\n"
+            "  Price: %.5f (slippage %+.1f pts)\n  SL: %.5f\n  TP: %.5f\n  Latency: %.0fms (%d attempt(s))",
+            fill['order'], signal['action'].upper(), fill['volume'], signal['symbol'], fill['price'],
+            fill['slippage_points'], fill['sl'], fill['tp'], fill['latency_ms'], fill['attempts'],
+            extra=dict(fill, event='trade')
+        )
+        return fill['order']
+    
+    def exposure(self, positions: List[Dict]) -> Optional[Dict]:
+        """position_exposure of `positions` (None without a CorrelationTracker)"""
+        if self.correlations is None:
+            return None
+        return position_exposure(positions, self.mt5.symbols, self.correlations,
+                                 self.config.get('crypto_benchmark'))
+    
+    def save_signals(self, signals: List[Dict], account_info: Dict, positions: List[Dict],
+                     exposure: Optional[Dict] = None):
+        """Save signals to JSON file for dashboard (`exposure` is computed here unless given)"""
         try:
             data = {
                 'timestamp': datetime.now().isoformat(),
@@ -711,27 +3411,303 @@ class TradingBot:
                     'trades_executed': self.trades_executed
                 }
             }
+            if exposure is None:
+                exposure = self.exposure(positions)
+            if exposure is not None:
+                data['exposure'] = exposure
             
-            # Save latest
-            with open('signals/latest.json', 'w') as f:
-                json.dump(data, f, indent=2)
+            with STAGE_SECONDS.time('output'):
+                # Save latest (atomic replace, so the dashboard never reads a partial file)
+                try:
+                    publish_json('signals/latest.json', data)
+                except Exception as e:
+                    logger.error("Error publishing latest signals: %s", e)
+                
+                # Append to the journal (history), even if latest.json stayed locked
+                try:
+                    self.journal.append(self.cycles, signals, account_info, positions, data['stats'])
+                except Exception as e:
+                    logger.error("Error journaling signals: %s", e)
             
-            # Save timestamped
-            filename = f"signals/signals_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
+            if METRICS.enabled and self.config.get('metrics_file'):
+                METRICS.write(self.config['metrics_file'])
                 
         except Exception as e:
-            logger.error(f"Error saving signals: {e}")
+            logger.error("Error saving signals: %s", e)
     
     def stop(self):
         """Stop the trading bot"""
         self.running = False
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.positions is not None:
+            self.positions.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.journal.close()
+        self.mt5.orders.close()
+        if self.mt5.store is not None:
+            self.mt5.store.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
         self.mt5.disconnect()
         logger.info("=" * 80)
         logger.info(f"Bot stopped. Cycles: {self.cycles}, Signals: {self.signals_generated}, Trades: {self.trades_executed}")
         logger.info("=" * 80)
 
+# ============================================================================
+# ASYNC RUNTIME
+# ============================================================================
+
+class AsyncTradingBot(TradingBot):
+    """TradingBot driven by an asyncio event loop
+
+    Every MT5 call (connect, account, positions, rates, ticks, orders) runs
+    on one dedicated thread so the terminal is only ever used from a single
+    thread, signal computation runs on the worker pool, and dashboard files
+    are written by a background writer.  While one symbol is being scored
+    the next one's bars are already being fetched, and the loop can serve a
+    small HTTP health endpoint.
+    
+    To keep that true, the equity watchdog and position manager get no
+    threads of their own: the loop schedules their passes on the MT5 thread.
+    An equity sample that falls due while a cycle is queued there is taken
+    before the next terminal job rather than after the cycle, so its delay
+    is bounded by the longest single job (typically the order batch or a
+    position manager pass), not by the cycle.  Orders in a batch are
+    sent one after another on the MT5 thread instead of the executor's pool,
+    and the position exposure is computed there before the writer gets it.
+    """
+    
+    def __init__(self, config: Dict):
+        super().__init__(config)
+        self.mt5_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mt5')
+        # Batches (orders, closes) are sent sequentially on the calling (MT5) thread
+        self.mt5.orders.workers = 1
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='symbol')
+        self.last_cycle_time: Optional[float] = None
+        self.started_time = time.time()
+        self.next_equity_check = 0.0  # monotonic time the next watchdog sample is due
+    
+    def start(self):
+        """Start the trading bot"""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("Bot stopped by user")
+        finally:
+            self.stop()
+    
+    async def call_mt5(self, func, *args):
+        """Run a blocking MT5 call on the MT5 thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.mt5_executor, partial(self.run_on_mt5, func, *args))
+    
+    def run_on_mt5(self, func, *args):
+        """MT5 thread: take an overdue equity sample, then run the job"""
+        self.check_equity()
+        return func(*args)
+    
+    def check_equity(self):
+        """MT5 thread: sample equity if the watchdog's interval is up"""
+        now = time.monotonic()
+        if self.watchdog is None or now < self.next_equity_check:
+            return
+        self.next_equity_check = now + self.watchdog.interval
+        try:
+            self.watchdog.check()
+        except Exception as e:
+            logger.error("Equity watchdog error: %s", e)
+    
+    async def compute(self, func, *args):
+        """Run CPU-bound analysis on the worker pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+    
+    def start_monitors(self):
+        """The loop runs the monitors on the MT5 thread (see run)"""
+    
+    async def monitor(self, name: str, func, interval: float):
+        """Call `func` on the MT5 thread every `interval` seconds while running"""
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                await self.call_mt5(func)
+            except Exception as e:
+                logger.error("%s error: %s", name, e)
+    
+    async def watch_equity(self):
+        """Keep a watchdog sample queued on the MT5 thread whenever one is due"""
+        while self.running:
+            await asyncio.sleep(max(self.next_equity_check - time.monotonic(), 0))
+            try:
+                await self.call_mt5(self.check_equity)
+            except Exception as e:
+                logger.error("Equity watchdog error: %s", e)
+    
+    async def run(self):
+        """Main loop: wait for the next cycle, run it, repeat"""
+        if not await self.call_mt5(self.startup):
+            return
+        
+        self.running = True
+        monitors = []
+        if self.watchdog is not None:
+            monitors.append(asyncio.ensure_future(self.watch_equity()))
+        if self.positions is not None:
+            monitors.append(asyncio.ensure_future(
+                self.monitor("Position manager", self.positions.manage, self.positions.interval)))
+        server = None
+        if self.config.get('health_port'):
+            server = await asyncio.start_server(
+                self.handle_health,
+                self.config.get('health_host', '127.0.0.1'),
+                self.config['health_port']
+            )
+            logger.info(f"Health endpoint on http://{self.config.get('health_host', '127.0.0.1')}:"
+                        f"{self.config['health_port']}/")
+        
+        try:
+            while self.running:
+                if self.scheduler is not None:
+                    due = await self.call_mt5(self.scheduler.poll)
+                    if due:
+                        await self.run_cycle_async([s for s in self.config['symbols'] if s in due])
+                    else:
+                        await asyncio.sleep(self.scheduler.delay())
+                else:
+                    await self.run_cycle_async()
+                    await asyncio.sleep(self.config['signal_interval'])
+        finally:
+            for task in monitors:
+                task.cancel()
+            await asyncio.gather(*monitors, return_exceptions=True)
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+    
+    async def run_cycle_async(self, symbols: Optional[List[str]] = None):
+        """Run one trading cycle (same steps as run_cycle)"""
+        if symbols is None:
+            symbols = self.config['symbols']
+        with STAGE_SECONDS.time('cycle'):
+            try:
+                self.begin_cycle()
+            
+                snapshot = await self.call_mt5(self.take_snapshot, symbols)
+                account_info = snapshot.account
+                if account_info is None:
+                    logger.error("Failed to get account info")
+                    return
+                open_positions = snapshot.positions
+                await self.call_mt5(self.refresh_position_atr, open_positions)
+            
+                if not self.trading_allowed(account_info, open_positions):
+                    return
+            
+                # Allocated orders go out together after the last signal;
+                # sequential ones one at a time in config order
+                all_signals = []
+                candidates = []
+                cycle_positions = list(open_positions)
+                for task in self.analyze_symbols_async(symbols):
+                    signal = await task
+                    if signal:
+                        all_signals.append(signal)
+                        if self.allocator is None:
+                            await self.call_mt5(self.handle_signal, signal, account_info, cycle_positions, snapshot)
+                        elif self.announce_signal(signal):
+                            candidates.append(signal)
+                if self.correlations is not None:
+                    self.correlations.advance()
+                if candidates:
+                    await self.call_mt5(self.place_orders, candidates, account_info, open_positions, snapshot)
+            
+                # Dashboard files are written in the background (the exposure
+                # may need symbol specs, so it is valued on the MT5 thread)
+                exposure = await self.call_mt5(self.exposure, open_positions)
+                self.writer.submit(self.save_signals, all_signals, account_info, open_positions, exposure)
+                self.last_cycle_time = time.time()
+            
+                logger.info("Cycle complete. Signals generated: %d, Trades executed: %d",
+                            self.signals_generated, self.trades_executed)
+            
+            except Exception as e:
+                logger.error(f"Error in trading cycle: {e}", exc_info=True)
+    
+    def analyze_symbols_async(self, symbols: List[str]) -> List[asyncio.Future]:
+        """One future per symbol (in order) resolving to its signal"""
+        if self.config.get('indicator_mode') == 'panel':
+            panel = asyncio.ensure_future(self.analyze_panel_async(symbols))
+            return [asyncio.ensure_future(self._panel_item(panel, i)) for i in range(len(symbols))]
+        return [asyncio.ensure_future(self.analyze_symbol_async(symbol)) for symbol in symbols]
+    
+    @staticmethod
+    async def _panel_item(panel: asyncio.Future, index: int) -> Optional[Dict]:
+        return (await panel)[index]
+    
+    async def analyze_panel_async(self, symbols: List[str]) -> List[Optional[Dict]]:
+        # One job per symbol so a due equity sample can go in between
+        data = {}
+        for symbol in symbols:
+            data.update(await self.call_mt5(self.fetch_panel, [symbol]))
+        return await self.compute(self.score_panel, symbols, data)
+    
+    async def analyze_symbol_async(self, symbol: str) -> Optional[Dict]:
+        try:
+            df = await self.call_mt5(self.fetch_symbol, symbol)
+            return await self.compute(self.score_symbol, symbol, df)
+        except Exception as e:
+            logger.error("Error processing %s: %s", symbol, e)
+            return None
+    
+    def health(self) -> Dict:
+        """Status served by the health endpoint"""
+        if self.scheduler is not None:
+            expected = timeframe_seconds(self.config['timeframe'])
+        else:
+            expected = self.config['signal_interval']
+        last = self.last_cycle_time or self.started_time
+        age = time.time() - last
+        healthy = self.running and self.mt5.connected and age < max(3 * expected, 60)
+        return {
+            'status': 'ok' if healthy else 'stale',
+            'connected': self.mt5.connected,
+            'cycles': self.cycles,
+            'signals_generated': self.signals_generated,
+            'trades_executed': self.trades_executed,
+            'last_cycle': datetime.fromtimestamp(self.last_cycle_time).isoformat() if self.last_cycle_time else None,
+            'seconds_since_cycle': round(age, 1)
+        }
+    
+    async def handle_health(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer any HTTP request with the health JSON (503 when stale)"""
+        try:
+            await asyncio.wait_for(reader.readline(), timeout=5)
+            health = self.health()
+            body = json.dumps(health).encode()
+            status = '200 OK' if health['status'] == 'ok' else '503 Service Unavailable'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    def stop(self):
+        """Stop the trading bot"""
+        self.running = False
+        self.writer.shutdown(wait=True)
+        # Disconnect from the MT5 thread, like every other terminal call
+        self.mt5_executor.submit(TradingBot.stop, self).result()
+        self.mt5_executor.shutdown(wait=True)
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -739,13 +3715,16 @@ class TradingBot:
 def main():
     """Main entry point"""
     # Check if MT5 password is set
-    if CONFIG['mt5_password'] == 'YOUR_PASSWORD_HERE':
+    if CONFIG['mt5_password'] == 'YOUR_PASSWORD_HERE' and CONFIG.get('terminal') != 'simulator':
         print("ERROR: Please set your MT5 password in the CONFIG section!")
         print("Edit this file and change 'YOUR_PASSWORD_HERE' to your actual password")
         return
     
     # Create and start bot
-    bot = TradingBot(CONFIG)
+    if CONFIG.get('runtime') == 'asyncio':
+        bot = AsyncTradingBot(CONFIG)
+    else:
+        bot = TradingBot(CONFIG)
     bot.start()
 
 if __name__ == "__main__":
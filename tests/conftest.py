@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The bot modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_bars():
+    """Factory for random-walk OHLCV frames: make_bars(n, seed=0)"""
+    def make(n: int, seed: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        close = 1.1 + np.cumsum(rng.normal(0, 0.001, n))
+        spread = np.abs(rng.normal(0, 0.0005, n))
+        return pd.DataFrame({
+            'open': np.concatenate(([close[0]], close[:-1])),
+            'high': close + spread,
+            'low': close - spread,
+            'close': close,
+            'tick_volume': rng.integers(50, 500, n).astype(np.float64),
+        })
+    return make
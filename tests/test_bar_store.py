@@ -0,0 +1,168 @@
+"""BarSeries appends, rewrites, gaps and recovery from a crash part way through a write"""
+
+import os
+
+import numpy as np
+import pytest
+
+import bar_store
+import standalone_trading_bot_v2 as v2
+
+PERIOD = 300
+# Friday 2024-01-05 00:00 UTC
+FRIDAY = int(np.datetime64('2024-01-05T00:00', 's').astype(np.int64))
+
+
+def bars(start, n, first_close=0.0):
+    rates = np.zeros(n, dtype=bar_store.RATES_DTYPE)
+    rates['time'] = start + PERIOD * np.arange(n)
+    rates['close'] = first_close + np.arange(n)
+    rates['open'] = rates['high'] = rates['low'] = rates['close']
+    return rates
+
+
+def series(tmp_path):
+    return bar_store.BarSeries(str(tmp_path / 'EURUSD_M5.bars'), PERIOD)
+
+
+def reopen(s):
+    s.close()
+    return bar_store.BarSeries(s.path, PERIOD)
+
+
+def test_append_overwrites_the_forming_bar(tmp_path):
+    s = series(tmp_path)
+    assert s.merge(bars(FRIDAY, 10)) == 10
+    update = bars(FRIDAY + 9 * PERIOD, 3, first_close=100.0)
+    assert s.merge(update) == 2
+    s = reopen(s)
+    assert s.count == 12
+    assert s.view()['close'].tolist() == list(range(9)) + [100.0, 101.0, 102.0]
+    assert (s.first_time, s.last_time) == (FRIDAY, FRIDAY + 11 * PERIOD)
+    s.close()
+
+
+def test_older_bars_are_prepended(tmp_path):
+    s = series(tmp_path)
+    s.merge(bars(FRIDAY + 5 * PERIOD, 5, first_close=5.0))
+    assert s.merge(bars(FRIDAY, 7)) == 5
+    assert s.view()['close'].tolist() == list(range(10))
+    assert not os.path.exists(s.path + s.REWRITE_SUFFIX)
+    s = reopen(s)
+    assert s.count == 10 and s.first_time == FRIDAY
+    s.close()
+
+
+def test_weekend_closure_is_not_a_gap(tmp_path):
+    s = series(tmp_path)
+    close = FRIDAY + 22 * 3600 - PERIOD  # last bar Friday 21:55
+    s.merge(bars(close - 9 * PERIOD, 10))
+    sunday_open = FRIDAY + 2 * 86400 + 22 * 3600
+    assert not s.hole_before(sunday_open)
+    s.merge(bars(sunday_open, 5))
+    assert s.gaps() == [] and s.check()['gaps'] == 0
+
+    # A missing hour on the Monday is a gap
+    monday = sunday_open + 5 * PERIOD + 3600
+    assert s.hole_before(monday)
+    s.merge(bars(monday, 2))
+    assert s.gaps() == [(sunday_open + 4 * PERIOD, monday)]
+    s.close()
+
+
+def test_store_bars_backfills_the_hole(tmp_path, monkeypatch):
+    history = bars(FRIDAY, 100)
+    store = bar_store.BarStore(str(tmp_path))
+    connection = v2.MT5Connection(0, '', '', store=store)
+    requests = []
+
+    def call(name, symbol, timeframe, start, count):
+        requests.append(count)
+        return history[-count:]
+
+    monkeypatch.setattr(connection, 'call', call)
+    connection.store_bars('EURUSD', 5, history[:50])
+    connection.store_bars('EURUSD', 5, history[-10:])  # restart after missing 40 bars
+    s = store.series('EURUSD', PERIOD)
+    assert requests == [40, 160]
+    assert s.count == 100 and s.gaps() == []
+    np.testing.assert_array_equal(s.view(), history)
+    store.close()
+
+
+class Crash(Exception):
+    pass
+
+
+def test_torn_forming_bar_write_keeps_the_committed_bars(tmp_path, monkeypatch):
+    s = series(tmp_path)
+    s.merge(bars(FRIDAY, 10))
+
+    def torn_write(index, rates):
+        s.file.seek(bar_store.HEADER_DTYPE.itemsize + index * bar_store.RATES_DTYPE.itemsize)
+        s.file.write(rates.tobytes()[:20])
+        s.file.flush()
+        raise Crash
+
+    monkeypatch.setattr(s, 'write', torn_write)
+    with pytest.raises(Crash):
+        s.merge(bars(FRIDAY + 9 * PERIOD, 2, first_close=100.0))
+    monkeypatch.undo()
+
+    # Only the forming bar being overwritten is lost, and the next fetch restores it
+    s = reopen(s)
+    assert s.count == 9 and s.last_time == FRIDAY + 8 * PERIOD
+    assert s.view()['close'].tolist() == list(range(9))
+    s.merge(bars(FRIDAY + 8 * PERIOD, 3, first_close=8.0))
+    assert s.view()['close'].tolist() == list(range(11))
+    s.close()
+
+
+def test_truncated_append_is_dropped_on_open(tmp_path):
+    s = series(tmp_path)
+    s.merge(bars(FRIDAY, 10))
+    s.close()
+    with open(s.path, 'r+b') as f:
+        f.truncate(os.path.getsize(s.path) - bar_store.RATES_DTYPE.itemsize // 2)
+    s = bar_store.BarSeries(s.path, PERIOD)
+    assert s.count == 9 and s.last_time == FRIDAY + 8 * PERIOD
+    assert os.path.getsize(s.path) == bar_store.HEADER_DTYPE.itemsize + 9 * bar_store.RATES_DTYPE.itemsize
+    s.close()
+
+
+def test_interrupted_rewrite_is_finished_on_open(tmp_path, monkeypatch):
+    s = series(tmp_path)
+    s.merge(bars(FRIDAY + 5 * PERIOD, 5, first_close=5.0))
+
+    def crash_while_copying(self):
+        self.file.seek(bar_store.HEADER_DTYPE.itemsize)
+        self.file.write(b'\xff' * 100)
+        self.file.flush()
+        raise Crash
+
+    monkeypatch.setattr(bar_store.BarSeries, 'recover', crash_while_copying)
+    with pytest.raises(Crash):
+        s.merge(bars(FRIDAY, 6))
+    monkeypatch.undo()
+
+    s = reopen(s)
+    assert not os.path.exists(s.path + s.REWRITE_SUFFIX)
+    assert s.count == 10
+    assert s.view()['close'].tolist() == list(range(10))
+    s.close()
+
+
+def test_incomplete_rewrite_leaves_the_series_untouched(tmp_path):
+    s = series(tmp_path)
+    s.merge(bars(FRIDAY, 10))
+    s.close()
+    header = s.header.copy()
+    header['count'] = 20
+    with open(s.path + s.REWRITE_SUFFIX, 'wb') as f:
+        f.write(header.tobytes() + bars(FRIDAY - 10 * PERIOD, 15).tobytes())
+
+    s = bar_store.BarSeries(s.path, PERIOD)
+    assert not os.path.exists(s.path + s.REWRITE_SUFFIX)
+    assert s.count == 10
+    assert s.view()['close'].tolist() == list(range(10))
+    s.close()
@@ -0,0 +1,46 @@
+"""Records handed to the logging queue must not change before they are written"""
+
+import logging
+import queue
+
+from bot_logging import JsonFormatter, QueueHandler
+
+
+def enqueue(msg, *args, **extra):
+    handler = QueueHandler(queue.Queue())
+    logger = logging.getLogger('test_bot_logging')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.warning(msg, *args, extra=extra)
+    finally:
+        logger.removeHandler(handler)
+    return handler.queue.get_nowait()
+
+
+def test_mutable_args_are_formatted_at_the_call():
+    position = {'symbol': 'EURUSD', 'sl': 1.1}
+    record = enqueue("Moving stop for %s", position)
+    position['sl'] = 1.2
+    assert record.getMessage() == "Moving stop for {'symbol': 'EURUSD', 'sl': 1.1}"
+    assert record.args is None
+
+
+def test_mapping_args_are_formatted_at_the_call():
+    signal = {'symbol': 'EURUSD', 'reasons': ['RSI low']}
+    record = enqueue("%(symbol)s: %(reasons)s", signal)
+    signal['reasons'].append('MACD bullish')
+    assert record.getMessage() == "EURUSD: ['RSI low']"
+
+
+def test_plain_args_are_left_to_the_listener():
+    record = enqueue("Order placed: %s %.2f @ %.5f", 'BUY', 0.1, 1.08512)
+    assert record.args == ('BUY', 0.1, 1.08512)
+    assert record.getMessage() == "Order placed: BUY 0.10 @ 1.08512"
+
+
+def test_json_keeps_extra_fields():
+    record = enqueue("Halting: %s", 'daily loss', event='halt', equity=9500.0)
+    text = JsonFormatter().format(record)
+    assert '"message": "Halting: daily loss"' in text
+    assert '"event": "halt"' in text and '"equity": 9500.0' in text
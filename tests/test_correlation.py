@@ -0,0 +1,67 @@
+"""CorrelationTracker pairwise statistics, with and without missing bars"""
+
+import numpy as np
+import pandas as pd
+
+from standalone_trading_bot_v2 import CorrelationTracker
+
+SYMBOLS = ['EURUSD', 'GBPUSD', 'AUDUSD', 'NZDUSD']
+
+
+def correlated_returns(bars=300, seed=0):
+    """EURUSD/GBPUSD/AUDUSD share a factor, NZDUSD is independent"""
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 1e-3, (bars, 1))
+    returns = rng.normal(0, 3e-4, (bars, 4)) + factor * np.array([1, 1, 1, 0])
+    return returns
+
+
+def closes_frame(returns, times):
+    return pd.DataFrame({'time': times, 'close': 1.1 * np.exp(np.cumsum(returns))})
+
+
+def test_incremental_matches_pairwise_batch():
+    returns = correlated_returns()
+    returns[::7, 1] = np.nan
+    returns[:40, 3] = np.nan
+    tracker = CorrelationTracker(SYMBOLS, window=100)
+    for row in returns:
+        tracker.push(row)
+    expected = pd.DataFrame(returns[-100:]).cov().to_numpy()
+    np.testing.assert_allclose(tracker.covariance(), expected, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(tracker.correlation(), pd.DataFrame(returns[-100:]).corr().to_numpy(), rtol=1e-9)
+
+    loaded = CorrelationTracker(SYMBOLS, window=100)
+    loaded.load(returns)
+    np.testing.assert_allclose(loaded.correlation(), tracker.correlation(), rtol=1e-9)
+
+
+def test_missing_bars_do_not_bias_towards_zero():
+    """A symbol that skips bars correlates as strongly as on its shared bars"""
+    returns = correlated_returns(bars=151)
+    returns[:, 1] = returns[:, 0] + np.random.default_rng(1).normal(0, 1e-4, len(returns))
+    times = np.arange(len(returns)) * 300
+    skips = np.arange(len(returns)) % 3 == 1
+
+    tracker = CorrelationTracker(SYMBOLS[:2], window=150)
+    tracker.observe('EURUSD', closes_frame(returns[:, 0], times))
+    gbp = closes_frame(returns[:, 1], times)
+    tracker.observe('GBPUSD', gbp[~skips])
+    tracker.advance()
+    assert tracker.correlation()[0, 1] > 0.95
+
+    # The gap's move isn't compared with a one-bar return either
+    both = ~skips[1:-1] & ~skips[:-2]
+    assert tracker.pairs[0, 1] == np.count_nonzero(both)
+
+
+def test_untracked_or_sparse_pairs_count_as_uncorrelated():
+    tracker = CorrelationTracker(SYMBOLS, window=100)
+    returns = correlated_returns(bars=100)
+    returns[:-5, 2] = np.nan  # AUDUSD only has 5 returns
+    returns[:, 3] = np.nan
+    tracker.load(returns)
+    corr = tracker.correlation()
+    assert corr[0, 1] > 0.8
+    assert corr[0, 2] == 0 and corr[0, 3] == 0
+    assert np.all(np.diag(corr) == 1)
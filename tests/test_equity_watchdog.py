@@ -0,0 +1,138 @@
+"""EquityWatchdog halts and flattening, and its priority on the asyncio MT5 thread"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import standalone_trading_bot_v2 as v2
+
+MAGIC = 234000
+
+
+class FakeConnection:
+    """Account, positions and closes the watchdog sees; `survive` positions refuse to close"""
+
+    def __init__(self, equity=10000.0, positions=(), survive=0):
+        self.account = {'balance': 10000.0, 'equity': equity}
+        self.positions = list(positions)
+        self.survive = survive
+        self.position_calls = 0
+        self.closed = []
+        self.orders = SimpleNamespace(magic=MAGIC, close_positions=self.close_positions)
+
+    def get_account_info(self):
+        return dict(self.account)
+
+    def get_open_positions(self):
+        self.position_calls += 1
+        return list(self.positions)
+
+    def close_positions(self, positions, comment=''):
+        fills = []
+        for position in positions:
+            if self.survive:
+                self.survive -= 1
+                fills.append(None)
+            else:
+                self.positions.remove(position)
+                self.closed.append(position['ticket'])
+                fills.append({'ticket': position['ticket']})
+        return fills
+
+
+def watchdog(connection, **kw):
+    risk_manager = v2.RiskManager(0.01, 0.05, 5)
+    return v2.EquityWatchdog(connection, risk_manager, **kw)
+
+
+def test_watchdog_and_flatten_are_opt_in():
+    assert not v2.CONFIG['equity_watchdog']
+    assert not v2.CONFIG['flatten_on_breach']
+    assert not watchdog(FakeConnection()).flatten
+
+
+def test_breach_flattens_own_positions_once():
+    connection = FakeConnection(positions=[
+        {'ticket': 1, 'magic': MAGIC}, {'ticket': 2, 'magic': 7}, {'ticket': 3, 'magic': MAGIC},
+    ])
+    dog = watchdog(connection, flatten=True)
+    assert dog.check() is None
+    connection.account['equity'] = 9000.0
+
+    assert 'daily loss' in dog.check()
+    assert connection.closed == [1, 3]
+    assert dog.flattened
+    calls = connection.position_calls
+    for _ in range(5):
+        assert dog.check()
+    assert connection.position_calls == calls  # latched until the next day
+    assert connection.closed == [1, 3]
+
+
+def test_failed_flatten_backs_off_then_latches():
+    connection = FakeConnection(positions=[{'ticket': 1, 'magic': MAGIC}], survive=1)
+    dog = watchdog(connection, flatten=True)
+    dog.check()
+    connection.account['equity'] = 9000.0
+
+    dog.check()
+    assert connection.closed == [] and dog.flatten_failures == 1
+    assert dog.next_flatten > time.monotonic()
+    dog.check()  # still backing off
+    assert connection.closed == []
+
+    dog.next_flatten = 0.0
+    dog.check()
+    assert connection.closed == [1] and dog.flattened
+    calls = connection.position_calls
+    dog.next_flatten = 0.0
+    dog.check()
+    assert connection.position_calls == calls
+
+
+def test_without_flatten_only_halts():
+    connection = FakeConnection(positions=[{'ticket': 1, 'magic': MAGIC}])
+    dog = watchdog(connection)
+    dog.check()
+    connection.account['equity'] = 9000.0
+    assert dog.check()
+    assert connection.position_calls == 0
+
+
+def test_async_sample_does_not_wait_for_the_cycle(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    config = dict(v2.CONFIG, terminal='simulator', simulator={'speed': None, 'latency': 0.03},
+                  symbols=['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCAD', 'NZDUSD'],
+                  runtime='asyncio', equity_watchdog=True, watchdog_interval=0.02,
+                  manage_positions=False, bar_store=None, min_confidence=101, verbose_mode=False)
+    bot = v2.AsyncTradingBot(config)
+    samples = []
+    check = bot.watchdog.check
+
+    def timed_check():
+        samples.append(time.monotonic())
+        return check()
+
+    bot.watchdog.check = timed_check
+
+    async def cycle():
+        assert await bot.call_mt5(bot.startup)
+        bot.running = True
+        watcher = asyncio.ensure_future(bot.watch_equity())
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await bot.run_cycle_async()
+        finished = time.monotonic()
+        bot.running = False
+        await watcher
+        return started, finished
+
+    try:
+        started, finished = asyncio.run(cycle())
+    finally:
+        bot.stop()
+    during = [t for t in samples if started <= t <= finished]
+    assert finished - started > 0.3
+    assert len(during) >= 3
+    gaps = [b - a for a, b in zip([started] + during, during + [finished])]
+    assert max(gaps) < (finished - started) / 2
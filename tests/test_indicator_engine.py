@@ -0,0 +1,39 @@
+"""IndicatorEngine must match calculate_indicators over each window it is given"""
+
+import numpy as np
+import pytest
+
+from standalone_trading_bot_v2 import IndicatorEngine, TechnicalAnalyzer
+
+
+@pytest.mark.parametrize('window', [60, 100, 300])
+@pytest.mark.parametrize('forming', [False, True])
+def test_sliding_window_matches_batch(make_bars, window, forming):
+    bars = make_bars(1200, seed=window)
+    bars['time'] = np.arange(len(bars)) * 300
+    engine = IndicatorEngine(long_window=min(200, window))
+    for end in range(window, len(bars), 29):
+        frame = bars.iloc[end - window:end]
+        prev, last = engine.update(frame, forming=forming)
+        full = TechnicalAnalyzer.calculate_indicators(frame.copy())
+        # The engine caps the long SMA at its window like the bot does
+        full['sma_200'] = full['close'].rolling(min(200, window)).mean()
+        for row, expected in ((prev, full.iloc[-2]), (last, full.iloc[-1])):
+            for key in IndicatorEngine.COLUMNS:
+                np.testing.assert_allclose(row[key], expected[key], rtol=1e-9, atol=1e-12,
+                                           equal_nan=True, err_msg=f"{key} at bar {end}")
+
+
+@pytest.mark.parametrize('window', [120, 200])
+def test_window_shorter_than_long_sma(make_bars, window):
+    """Short histories fall back to the batch path's whole-frame SMA 200"""
+    bars = make_bars(600, seed=window)
+    bars['time'] = np.arange(len(bars)) * 300
+    engine = IndicatorEngine(long_window=200)
+    for end in range(window, len(bars), 37):
+        frame = bars.iloc[end - window:end]
+        prev, last = engine.update(frame, forming=False)
+        full = TechnicalAnalyzer.calculate_indicators(frame.copy())
+        for row, expected in ((prev, full.iloc[-2]), (last, full.iloc[-1])):
+            np.testing.assert_allclose(row['sma_200'], expected['sma_200'], rtol=1e-9,
+                                       equal_nan=True, err_msg=f"sma_200 at bar {end}")
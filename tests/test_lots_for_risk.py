@@ -0,0 +1,70 @@
+"""lots_for_risk must never size a trade above its risk budget"""
+
+import numpy as np
+import pytest
+
+from standalone_trading_bot_v2 import RiskManager, lots_for_risk
+
+# EURUSD-like: 1 lot moves $10 per pip (0.0001)
+EURUSD = {'tick_value': 1.0, 'tick_size': 0.00001, 'volume_min': 0.01, 'volume_step': 0.01, 'volume_max': 100.0}
+
+
+def test_rounds_down_to_the_volume_step():
+    # $200 over a 20 pip stop is 1 lot; $199 must not round up to it
+    assert lots_for_risk(200.0, 0.0020, EURUSD) == pytest.approx(1.0)
+    assert lots_for_risk(199.0, 0.0020, EURUSD) == pytest.approx(0.99)
+    assert lots_for_risk(30.0, 0.0100, EURUSD) == pytest.approx(0.03)
+
+
+def test_below_minimum_volume_is_zero():
+    # 0.01 lots over a 100 pip stop risk $10; $5 can't afford it
+    assert lots_for_risk(5.0, 0.0100, EURUSD) == 0.0
+    assert lots_for_risk(10.0, 0.0100, EURUSD) == pytest.approx(0.01)
+
+
+@pytest.mark.parametrize('sl_distance, spec', [
+    (0.0, EURUSD),
+    (np.nan, EURUSD),
+    (-0.001, EURUSD),
+    (0.0020, dict(EURUSD, tick_value=np.nan)),
+    (0.0020, dict(EURUSD, tick_size=0.0)),
+])
+def test_invalid_input_is_zero(sl_distance, spec):
+    assert lots_for_risk(200.0, sl_distance, spec) == 0.0
+
+
+def test_capped_at_maximum_volume():
+    assert lots_for_risk(1e9, 0.0020, EURUSD) == pytest.approx(100.0)
+
+
+def test_batch_matches_scalars():
+    risk = np.array([200.0, 5.0, 1e9, 200.0])
+    distance = np.array([0.0020, 0.0100, 0.0020, 0.0])
+    specs = {k: np.full(4, v) for k, v in EURUSD.items()}
+    expected = [lots_for_risk(r, d, EURUSD) for r, d in zip(risk, distance)]
+    np.testing.assert_allclose(lots_for_risk(risk, distance, specs), expected)
+
+
+def test_position_size_skips_unaffordable_trades():
+    rm = RiskManager(risk_per_trade=0.01, max_daily_loss=0.05, max_open_trades=5, sl_atr_multiplier=2.0)
+    # $1000 * 1% = $10 over a 2 * 0.0050 stop: exactly 0.01 lots; half the balance can't afford it
+    assert rm.calculate_position_size(1000.0, 1.1, 0.0050, spec=EURUSD) == pytest.approx(0.01)
+    assert rm.calculate_position_size(500.0, 1.1, 0.0050, spec=EURUSD) == 0.0
+
+
+def test_execute_trade_skips_unaffordable_trades(tmp_path, monkeypatch, caplog):
+    import mt5_simulator as sim
+    import standalone_trading_bot_v2 as v2
+
+    monkeypatch.chdir(tmp_path)
+    bot = v2.TradingBot(dict(v2.CONFIG, terminal='simulator', simulator={'speed': None, 'balance': 100},
+                             equity_watchdog=False, bar_store=None))
+    assert bot.mt5.connect()
+    sent = []
+    monkeypatch.setattr(bot.mt5.orders, 'send', lambda *a, **kw: sent.append(a))
+    signal = {'symbol': 'EURUSD', 'action': 'buy', 'confidence': 80,
+              'price': sim.symbol_info_tick('EURUSD').ask, 'indicators': {'atr': 0.05}}
+    assert bot.execute_trade(signal, bot.mt5.get_account_info()) is None
+    assert sent == []
+    assert 'below the minimum volume' in caplog.text
+    bot.mt5.disconnect()
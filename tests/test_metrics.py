@@ -0,0 +1,82 @@
+"""Prometheus text rendering of the metrics registry"""
+
+import urllib.request
+
+from metrics import Metrics, MetricsServer
+
+
+def registry() -> Metrics:
+    metrics = Metrics(prefix='test_')
+    metrics.enabled = True
+    return metrics
+
+
+def samples(text: str) -> dict:
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = registry()
+    latency = metrics.histogram('call_seconds', 'Call latency', ('call',), buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.7, 2.0):
+        latency.observe(value, 'order_send')
+    text = metrics.render()
+
+    assert '# HELP test_call_seconds Call latency\n# TYPE test_call_seconds histogram\n' in text
+    values = samples(text)
+    # Bounds are inclusive, like Prometheus' le
+    assert values['test_call_seconds_bucket{call="order_send",le="0.1"}'] == '2'
+    assert values['test_call_seconds_bucket{call="order_send",le="0.5"}'] == '3'
+    assert values['test_call_seconds_bucket{call="order_send",le="1.0"}'] == '4'
+    assert values['test_call_seconds_bucket{call="order_send",le="+Inf"}'] == '5'
+    assert values['test_call_seconds_count{call="order_send"}'] == '5'
+    assert float(values['test_call_seconds_sum{call="order_send"}']) == 3.15
+
+
+def test_label_sets_render_separately():
+    metrics = registry()
+    latency = metrics.histogram('stage_seconds', 'Stage latency', ('stage', 'symbol'), buckets=(1.0,))
+    latency.observe(0.5, 'indicators', 'EURUSD')
+    latency.observe(1.5, 'indicators', 'BTCUSD')
+    values = samples(metrics.render())
+    assert values['test_stage_seconds_count{stage="indicators",symbol="EURUSD"}'] == '1'
+    assert values['test_stage_seconds_bucket{stage="indicators",symbol="BTCUSD",le="1.0"}'] == '0'
+    assert values['test_stage_seconds_bucket{stage="indicators",symbol="BTCUSD",le="+Inf"}'] == '1'
+
+
+def test_counter_and_escaping():
+    metrics = registry()
+    orders = metrics.counter('orders', 'Orders sent', ('retcode',))
+    orders.inc('10009')
+    orders.inc('10009', amount=2)
+    orders.inc('say "hi"\n')
+    values = samples(metrics.render())
+    assert values['test_orders_total{retcode="10009"}'] == '3'
+    assert values['test_orders_total{retcode="say \\"hi\\"\\n"}'] == '1'
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics(prefix='test_')
+    latency = metrics.histogram('call_seconds', 'Call latency')
+    latency.observe(0.1)
+    with latency.time():
+        pass
+    metrics.counter('orders', 'Orders sent').inc()
+    assert samples(metrics.render()) == {}
+
+
+def test_file_and_http_output(tmp_path):
+    metrics = registry()
+    metrics.counter('cycles', 'Cycles run').inc()
+    path = tmp_path / 'metrics.prom'
+    metrics.write(str(path))
+    assert path.read_text() == metrics.render()
+
+    server = MetricsServer(metrics, port=0)
+    server.start()
+    try:
+        host, port = server.address
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics', timeout=5) as response:
+            assert response.read().decode() == metrics.render()
+    finally:
+        server.stop()
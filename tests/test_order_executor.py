@@ -0,0 +1,96 @@
+"""OrderExecutor retries against the terminal simulator"""
+
+import pytest
+
+import mt5_simulator as sim
+import standalone_trading_bot_v2 as v2
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    v2.select_terminal('simulator', {'speed': None})
+    connection = v2.MT5Connection(0, '', '')
+    assert connection.connect()
+    connection.orders.retry_delay = 0.01
+    sleeps = []
+    monkeypatch.setattr(v2.time, 'sleep', sleeps.append)
+    connection.sleeps = sleeps
+    yield connection
+    connection.disconnect()
+
+
+def script(monkeypatch, *retcodes):
+    """Answer order_send with `retcodes` (requotes quote 1 pip higher), then the simulator"""
+    replies = list(retcodes)
+    requests = []
+
+    def order_send(request):
+        requests.append(dict(request))
+        if not replies:
+            return sim.terminal().order_send(request)
+        tick = sim.symbol_info_tick(request['symbol'])
+        return sim.OrderSendResult(retcode=replies.pop(0), deal=0, order=0, volume=0.0, price=0.0,
+                                   bid=tick.bid + 0.0001, ask=tick.ask + 0.0001, comment='scripted',
+                                   request_id=0, request=request)
+
+    monkeypatch.setattr(sim, 'order_send', order_send)
+    return requests
+
+
+def test_requotes_reprice_and_back_off(connection, monkeypatch):
+    requests = script(monkeypatch, sim.TRADE_RETCODE_REQUOTE, sim.TRADE_RETCODE_REQUOTE)
+    ask = sim.symbol_info_tick('EURUSD').ask
+    fill = connection.orders.send('EURUSD', 'buy', 0.1, sl=ask - 0.002, tp=ask + 0.003)
+    assert fill is not None and fill['attempts'] == 3
+    # The first retry already waits
+    assert connection.sleeps == [pytest.approx(0.01), pytest.approx(0.02)]
+    # Re-priced at the requote's ask, stop distances kept
+    assert requests[1]['price'] == pytest.approx(ask + 0.0001)
+    assert requests[1]['sl'] == pytest.approx(ask + 0.0001 - 0.002)
+    assert requests[1]['tp'] == pytest.approx(ask + 0.0001 + 0.003)
+
+
+def test_requotes_give_up_after_max_retries(connection, monkeypatch):
+    connection.orders.max_retries = 2
+    requests = script(monkeypatch, *[sim.TRADE_RETCODE_REQUOTE] * 5)
+    assert connection.orders.send('EURUSD', 'buy', 0.1) is None
+    assert len(requests) == 3
+    assert len(connection.sleeps) == 2
+
+
+def test_rejects_are_not_retried(connection, monkeypatch):
+    requests = script(monkeypatch, sim.TRADE_RETCODE_REJECT)
+    assert connection.orders.send('EURUSD', 'buy', 0.1) is None
+    assert len(requests) == 1 and connection.sleeps == []
+
+
+def test_filling_mode_falls_through_after_retries_run_out(connection, monkeypatch):
+    connection.orders.max_retries = 1
+    requests = script(monkeypatch, sim.TRADE_RETCODE_REQUOTE, sim.TRADE_RETCODE_INVALID_FILL)
+    fill = connection.orders.send('EURUSD', 'sell', 0.1)
+    assert fill is not None and fill['attempts'] == 3
+    assert [r['type_filling'] for r in requests] == [sim.ORDER_FILLING_IOC, sim.ORDER_FILLING_IOC,
+                                                     sim.ORDER_FILLING_FOK]
+    assert len(connection.sleeps) == 1
+
+
+@pytest.mark.parametrize('flags, mode', [
+    (sim.SYMBOL_FILLING_FOK | sim.SYMBOL_FILLING_IOC, sim.ORDER_FILLING_IOC),
+    (sim.SYMBOL_FILLING_FOK, sim.ORDER_FILLING_FOK),
+    (0, sim.ORDER_FILLING_RETURN),
+])
+def test_filling_mode_follows_the_symbol(connection, monkeypatch, flags, mode):
+    sim.terminal().infos['EURUSD'] = sim.symbol_info('EURUSD')._replace(filling_mode=flags)
+    requests = script(monkeypatch)
+    fill = connection.orders.send('EURUSD', 'buy', 0.1)
+    assert fill is not None and fill['attempts'] == 1
+    assert requests[0]['type_filling'] == mode
+
+
+def test_unsupported_filling_mode_falls_through(connection, monkeypatch):
+    # The symbol claims IOC but the terminal only fills FOK
+    requests = script(monkeypatch, sim.TRADE_RETCODE_INVALID_FILL)
+    fill = connection.orders.send('EURUSD', 'buy', 0.1)
+    assert fill is not None
+    assert [r['type_filling'] for r in requests] == [sim.ORDER_FILLING_IOC, sim.ORDER_FILLING_FOK]
+    assert connection.sleeps == []
@@ -0,0 +1,27 @@
+"""PanelAnalyzer rows must match calculate_indicators run on each symbol alone"""
+
+import numpy as np
+import pytest
+
+from standalone_trading_bot_v2 import PanelAnalyzer, TechnicalAnalyzer
+
+
+@pytest.mark.parametrize('lengths', [(300, 300, 300), (300, 120, 60), (60, 250, 199), (500, 201, 50)])
+def test_panel_matches_per_symbol(make_bars, lengths):
+    lookback = 300
+    frames = [make_bars(n, seed=i) for i, n in enumerate(lengths)]
+    ind = PanelAnalyzer.calculate_indicators(PanelAnalyzer.stack(frames, lookback))
+    for i, frame in enumerate(frames):
+        full = TechnicalAnalyzer.calculate_indicators(frame.iloc[-lookback:].copy())
+        for bar in (-2, -1):
+            row = PanelAnalyzer.row(ind, i, bar)
+            for key, value in row.items():
+                np.testing.assert_allclose(value, full.iloc[bar][key], rtol=1e-9, atol=1e-12, equal_nan=True,
+                                           err_msg=f"{key} for a {lengths[i]}-bar symbol")
+
+
+def test_short_symbol_is_padded(make_bars):
+    panel = PanelAnalyzer.stack([make_bars(100), make_bars(40, seed=1)])
+    assert panel['close'].shape == (2, 100)
+    assert np.isnan(panel['close'][1, :60]).all()
+    assert not np.isnan(panel['close'][0]).any()
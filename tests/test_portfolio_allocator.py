@@ -0,0 +1,137 @@
+"""PortfolioAllocator ranking, slots, total-risk budget and correlation gate"""
+
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from standalone_trading_bot_v2 import CorrelationTracker, PortfolioAllocator, RiskManager, SymbolRegistry
+
+SYMBOLS = ('EURUSD', 'GBPUSD', 'AUDUSD', 'NZDUSD', 'USDCAD')
+ACCOUNT = {'balance': 10000.0, 'equity': 10000.0}
+
+
+def registry() -> SymbolRegistry:
+    """Every symbol EURUSD-like: 1 lot moves $1 per 0.00001"""
+    symbols = SymbolRegistry(SimpleNamespace(connected=False))
+    info = SimpleNamespace(trade_tick_value=1.0, trade_tick_size=0.00001, volume_min=0.01,
+                           volume_step=0.01, volume_max=100.0)
+    symbols.specs = {symbol: (time.monotonic(), info) for symbol in SYMBOLS}
+    return symbols
+
+
+def allocator(max_open_trades=5, max_total_risk=0.06, **kwargs) -> PortfolioAllocator:
+    # 1% risk on a 2 x 0.0010 ATR stop: $100 at 0.5 lots per trade
+    rm = RiskManager(risk_per_trade=0.01, max_daily_loss=0.05, max_open_trades=max_open_trades,
+                     sl_atr_multiplier=2.0, tp_atr_multiplier=3.0)
+    return PortfolioAllocator(rm, registry(), max_total_risk=max_total_risk, verbose=False, **kwargs)
+
+
+def candidate(symbol, confidence, atr=0.0010, action='buy'):
+    return {'symbol': symbol, 'action': action, 'confidence': confidence, 'price': 1.1,
+            'indicators': {'atr': atr}}
+
+
+def allocate(alloc, candidates, positions=(), spreads=None):
+    prices = np.full(len(candidates), 1.1)
+    spreads = np.zeros(len(candidates)) if spreads is None else np.asarray(spreads)
+    return alloc.allocate(candidates, ACCOUNT, list(positions), prices, spreads)
+
+
+def test_ranked_by_confidence_then_reward_risk():
+    candidates = [candidate('EURUSD', 60), candidate('GBPUSD', 80), candidate('AUDUSD', 70),
+                  candidate('NZDUSD', 70)]
+    # Same confidence: the wider AUDUSD spread eats more of its reward/risk
+    orders = allocate(allocator(), candidates, spreads=[0, 0, 0.0002, 0.0001])
+    assert [o['symbol'] for _, o in orders] == ['GBPUSD', 'NZDUSD', 'AUDUSD', 'EURUSD']
+    for _, order in orders:
+        assert order['volume'] == pytest.approx(0.5)
+        assert order['sl'] == pytest.approx(1.1 - 0.002)
+        assert order['tp'] == pytest.approx(1.1 + 0.003)
+
+
+def test_open_trade_slots():
+    positions = [{'symbol': 'USDCAD', 'type': 'buy', 'volume': 0.5, 'price_open': 1.1, 'sl': 1.098}] * 3
+    orders = allocate(allocator(max_open_trades=5), [candidate(s, 70 - i) for i, s in enumerate(SYMBOLS[:4])],
+                      positions)
+    assert [o['symbol'] for _, o in orders] == ['EURUSD', 'GBPUSD']
+
+
+def test_budget_takes_the_best_prefix():
+    # $250 budget: two $100 trades fit, and once the third is over budget the
+    # fourth is not taken in its place even though its volume cap makes it $20
+    alloc = allocator(max_total_risk=0.025)
+    stamp, info = alloc.symbols.specs['NZDUSD']
+    alloc.symbols.specs['NZDUSD'] = (stamp, SimpleNamespace(**dict(vars(info), volume_max=0.1)))
+    candidates = [candidate('EURUSD', 90), candidate('GBPUSD', 80), candidate('AUDUSD', 70),
+                  candidate('NZDUSD', 60)]
+    orders = allocate(alloc, candidates)
+    assert [o['symbol'] for _, o in orders] == ['EURUSD', 'GBPUSD']
+    # On its own it fits
+    assert [o['volume'] for _, o in allocate(alloc, candidates[3:])] == [pytest.approx(0.1)]
+
+
+def test_budget_counts_open_risk():
+    with_stop = {'symbol': 'USDCAD', 'type': 'buy', 'volume': 0.5, 'price_open': 1.1, 'sl': 1.098}
+    no_stop = dict(with_stop, sl=0)
+    candidates = [candidate('EURUSD', 90), candidate('GBPUSD', 80), candidate('AUDUSD', 70)]
+    # $305 budget less $100 at the stop leaves two trades
+    assert len(allocate(allocator(max_total_risk=0.0305), candidates, [with_stop])) == 2
+    # Without a stop a position counts as one risk_per_trade ($100) too
+    assert len(allocate(allocator(max_total_risk=0.0305), candidates, [no_stop])) == 2
+    assert len(allocate(allocator(max_total_risk=0.0305), candidates, [with_stop, no_stop])) == 1
+
+
+def test_max_positions_per_symbol():
+    held = {'symbol': 'EURUSD', 'type': 'buy', 'volume': 0.5, 'price_open': 1.1, 'sl': 1.098}
+    candidates = [candidate('EURUSD', 90), candidate('EURUSD', 85, action='sell'), candidate('GBPUSD', 80)]
+    assert [o['symbol'] for _, o in allocate(allocator(), candidates, [held])] == ['GBPUSD']
+    orders = allocate(allocator(max_per_symbol=2), candidates, [held])
+    assert [(o['symbol'], o['side']) for _, o in orders] == [('EURUSD', 'buy'), ('GBPUSD', 'buy')]
+
+
+def test_unaffordable_candidate_is_skipped():
+    # Tiny stop budget: $100 over a 2 x 0.5 stop is below 0.01 lots
+    orders = allocate(allocator(), [candidate('EURUSD', 90, atr=0.5), candidate('GBPUSD', 80)])
+    assert [o['symbol'] for _, o in orders] == ['GBPUSD']
+
+
+def correlated_returns(bars=300, seed=0):
+    """EURUSD/GBPUSD/AUDUSD share a factor, NZDUSD is independent"""
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 1e-3, (bars, 1))
+    return rng.normal(0, 3e-4, (bars, 4)) + factor * np.array([1, 1, 1, 0])
+
+
+def gate(returns):
+    alloc = allocator(correlations=CorrelationTracker(list(SYMBOLS[:4]), window=100))
+    alloc.correlations.load(returns)
+    return alloc
+
+
+def test_correlated_candidates_are_rejected_or_scaled():
+    alloc = gate(correlated_returns())
+    candidates = [candidate('EURUSD', 90), candidate('GBPUSD', 80), candidate('NZDUSD', 70)]
+    assert [o['symbol'] for _, o in allocate(alloc, candidates)] == ['EURUSD', 'NZDUSD']
+
+    # Between correlation_soft and correlation_limit the size shrinks
+    alloc.correlation_soft, alloc.correlation_limit = 0.5, 0.99
+    orders = dict((o['symbol'], o['volume']) for _, o in allocate(alloc, candidates))
+    assert 0 < orders['GBPUSD'] < orders['EURUSD'] == pytest.approx(0.5)
+
+
+def test_hedges_and_open_positions():
+    alloc = gate(correlated_returns())
+    held = {'symbol': 'EURUSD', 'type': 'sell', 'volume': 0.5, 'price_open': 1.1, 'sl': 1.102}
+    # Selling GBPUSD repeats the open bet, buying it hedges it
+    assert allocate(alloc, [candidate('GBPUSD', 80, action='sell')], [held]) == []
+    assert [o['symbol'] for _, o in allocate(alloc, [candidate('GBPUSD', 80)], [held])] == ['GBPUSD']
+
+
+def test_missing_bars_still_gate():
+    returns = correlated_returns()
+    returns[::2, 1] = np.nan  # GBPUSD has every other bar
+    alloc = gate(returns)
+    candidates = [candidate('EURUSD', 90), candidate('GBPUSD', 80)]
+    assert [o['symbol'] for _, o in allocate(alloc, candidates)] == ['EURUSD']
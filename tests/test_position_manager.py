@@ -0,0 +1,45 @@
+"""PositionManager stops keep trailing when the trading limits stop the cycle"""
+
+import pytest
+
+import mt5_simulator as sim
+import standalone_trading_bot_v2 as v2
+
+
+def test_position_management_is_opt_in():
+    assert not v2.CONFIG['manage_positions']
+
+
+@pytest.mark.parametrize('bar_cache', [True, False])
+def test_stop_trails_while_the_book_is_full(monkeypatch, tmp_path, bar_cache):
+    monkeypatch.chdir(tmp_path)
+    config = dict(v2.CONFIG, terminal='simulator', simulator={'speed': None}, symbols=['EURUSD'],
+                  max_open_trades=1, manage_positions=True, partial_close_atr=None,
+                  bar_cache=bar_cache, bar_store=None, worker_threads=0, verbose_mode=False)
+    bot = v2.TradingBot(config)
+    assert bot.mt5.connect()
+    bot.mt5.symbols.load(config['symbols'])
+    try:
+        result = sim.order_send({
+            'action': sim.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+            'type': sim.ORDER_TYPE_BUY, 'magic': bot.mt5.orders.magic,
+        })
+        atr = v2.TechnicalAnalyzer.calculate_atr(sim.copy_rates_from_pos('EURUSD', config['timeframe'], 0, 15))
+        # Price has since run 5 ATR in the position's favour
+        position = sim.terminal().positions[result.order]
+        position['price_open'] -= 5 * atr
+        position['sl'] = position['price_open'] - 2 * atr
+        old_sl = position['sl']
+
+        assert bot.positions.manage() == (0, 0)  # no ATR known yet (e.g. after a restart)
+        bot.run_cycle()
+        assert not bot.risk_manager.can_trade(bot.mt5.get_account_info(), bot.mt5.get_open_positions())[0]
+        assert bot.positions.atr['EURUSD'] == pytest.approx(atr)
+
+        moved, _ = bot.positions.manage()
+        assert moved == 1
+        new_sl = sim.terminal().positions[result.order]['sl']
+        assert new_sl > old_sl
+        assert new_sl == pytest.approx(sim.symbol_info_tick('EURUSD').bid - 1.5 * atr, abs=1e-4)
+    finally:
+        bot.mt5.disconnect()
@@ -0,0 +1,94 @@
+"""SignalJournal records must read back the same before and after compaction"""
+
+import os
+
+import pandas as pd
+
+from signal_journal import JournalReader, SignalJournal, compact_day, publish_json
+
+DAY = 1760832000.0  # 2025-10-19 00:00 UTC
+
+
+def signal(symbol, action, confidence):
+    return {
+        'symbol': symbol, 'action': action, 'confidence': confidence, 'price': 1.1,
+        'scores': {'buy_score': confidence if action == 'buy' else 10,
+                   'sell_score': confidence if action == 'sell' else 10},
+        'reason': ['RSI low (28.0)', 'MACD bullish crossover'] if action != 'hold' else [],
+    }
+
+
+def write_days(directory, compact):
+    journal = SignalJournal(directory, compact=compact)
+    account = {'balance': 10000.0, 'equity': 10010.0, 'profit': 10.0}
+    positions = [{'symbol': 'EURUSD', 'type': 'buy', 'volume': 0.1}]
+    for day in range(3):
+        for cycle in range(4):
+            t = DAY + day * 86400 + cycle * 300
+            signals = [signal('EURUSD', 'buy', 70 + cycle), signal('GBPUSD', 'hold', 40),
+                       signal('BTCUSD', 'sell', 65)]
+            journal.append(day * 4 + cycle, signals, account, positions, {'trades_executed': cycle}, t=t)
+    journal.close()
+
+
+def test_round_trip_through_compaction(tmp_path):
+    plain, compacted = str(tmp_path / 'plain'), str(tmp_path / 'compacted')
+    write_days(plain, compact=False)
+    write_days(compacted, compact=True)
+
+    # Every day but the last was compacted when the next one was opened
+    assert sorted(os.listdir(compacted)) == ['2025-10-19.npz', '2025-10-20.npz', '2025-10-21.jsonl']
+
+    expected, actual = JournalReader(plain), JournalReader(compacted)
+    assert list(actual.signals()) == list(expected.signals())
+    # Compacted scores come back as floats
+    pd.testing.assert_frame_equal(actual.frame(), expected.frame(), check_dtype=False)
+    assert actual.frame('EURUSD', start='2025-10-20', actions=['buy'])['confidence'].tolist() == [70, 71, 72, 73] * 2
+
+    cycles = list(actual.cycles())
+    assert [c['cycle'] for c in cycles] == list(range(12))
+    assert cycles[0]['equity'] == 10010.0 and cycles[0]['open_positions'] == 1
+
+
+def test_compaction_merges_into_existing_day(tmp_path):
+    directory = str(tmp_path)
+    journal = SignalJournal(directory)
+    journal.append(0, [signal('EURUSD', 'buy', 70)], {}, [], {}, t=DAY)
+    journal.close()
+    compact_day(directory, '2025-10-19')
+    journal = SignalJournal(directory)
+    journal.append(1, [signal('EURUSD', 'sell', 80)], {}, [], {}, t=DAY + 60)
+    journal.close()
+    compact_day(directory, '2025-10-19')
+
+    assert os.listdir(directory) == ['2025-10-19.npz']
+    assert [s['action'] for s in JournalReader(directory).signals()] == ['buy', 'sell']
+    assert JournalReader(directory).frame()['reasons'].tolist() == ['RSI low (28.0) | MACD bullish crossover'] * 2
+
+
+def test_publish_syncs_before_replace(tmp_path, monkeypatch):
+    calls = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, 'fsync', lambda fd: calls.append('fsync'))
+    monkeypatch.setattr(os, 'replace', lambda src, dst: (calls.append('replace'), real_replace(src, dst)))
+    path = str(tmp_path / 'latest.json')
+    publish_json(path, {'cycle': 1, 'signals': []})
+    assert calls == ['fsync', 'replace']
+    with open(path) as f:
+        assert f.read() == '{"cycle":1,"signals":[]}'
+    assert os.listdir(tmp_path) == ['latest.json']
+
+
+def test_locked_latest_json_still_journals(tmp_path, monkeypatch):
+    import standalone_trading_bot_v2 as v2
+
+    def locked(path, data, retries=5):
+        raise PermissionError(path)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(v2, 'publish_json', locked)
+    bot = v2.TradingBot(dict(v2.CONFIG, terminal='simulator', simulator={'speed': None},
+                             equity_watchdog=False, bar_store=None))
+    bot.save_signals([signal('EURUSD', 'buy', 70)], {'balance': 10000.0}, [], exposure={})
+    bot.journal.close()
+    assert [s['symbol'] for s in JournalReader('signals/journal').signals()] == ['EURUSD']
@@ -0,0 +1,34 @@
+"""calculate_tail_indicators must match the last two rows of calculate_indicators"""
+
+import numpy as np
+import pytest
+
+from standalone_trading_bot_v2 import TechnicalAnalyzer
+
+
+@pytest.mark.parametrize('bars', [2, 3, 4, 14, 15, 16, 17, 20, 30, 49, 50, 51, 120, 199, 200, 201, 500])
+def test_tail_matches_full_columns(make_bars, bars):
+    df = make_bars(bars, seed=bars)
+    full = TechnicalAnalyzer.calculate_indicators(df.copy())
+    prev, last = TechnicalAnalyzer.calculate_tail_indicators(df)
+    for row, expected in ((prev, full.iloc[-2]), (last, full.iloc[-1])):
+        for key, value in row.items():
+            np.testing.assert_allclose(value, expected[key], rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=key)
+        assert set(full.columns) - set(row) <= {'open'}
+
+
+def test_flat_prices(make_bars):
+    """Zero ranges give the same NaN/inf as the pandas division"""
+    df = make_bars(60)
+    df[['high', 'low', 'close']] = 1.0
+    full = TechnicalAnalyzer.calculate_indicators(df.copy())
+    _, last = TechnicalAnalyzer.calculate_tail_indicators(df)
+    for key in ('rsi', 'stoch_k', 'stoch_d', 'bb_upper', 'atr'):
+        np.testing.assert_allclose(last[key], full.iloc[-1][key], equal_nan=True, err_msg=key)
+
+
+def test_frame_left_untouched(make_bars):
+    df = make_bars(250)
+    columns = list(df.columns)
+    TechnicalAnalyzer.calculate_tail_indicators(df)
+    assert list(df.columns) == columns